@@ -1,16 +1,33 @@
 # Arquivo principal para execução do dashboard
+import time
 import streamlit as st
-import pandas as pd
 from supabase import create_client, Client
-from src.utils import detectar_coluna, converter_tipos
-from src.metrics import calcular_metricas
+from src.ingest import (
+    carregar_upload, carregar_upload_em_blocos, deve_usar_streaming,
+    LIMITE_STREAMING_MB, EXTENSOES_ACEITAS
+)
+from src.metrics import montar_metricas, metricas_em_cache, obter_cache_metricas
+from src.figures import estatisticas_figuras
+from src.timeseries import PONTOS_MAXIMOS_SERIE, LIMITE_PONTOS_WEBGL
+from src.filters import preparar_base, opcoes_filtros, filtrar_base
+from src.parallel import carregar_varios, resumo_leitura
+from src.engines import (
+    MOTORES_CALCULO, LIMITE_LINHAS_MOTOR, motor_disponivel, escolher_motor_calculo, carregar_com_motor, comparar_motores_calculo
+)
+from src.datasets import (
+    listar_conjuntos, carregar_conjunto, novo_conjunto, ja_anexado, parciais_para_anexo, datas_parciais,
+    datas_sobrepostas, anexar, anexar_sem_repetidas, hash_conjunto, resumo_arquivos
+)
+from src.excel import MOTORES_XLSX, comparar_motores_xlsx
+from src.sketches import PRECISAO_HLL
 from src.visuals import (
     show_metric_cards,
     show_geotemporal_analysis,
     show_client_product_analysis,
     show_commercial_financial_analysis,
     show_temporal_segmentation_analysis,
-    show_report
+    show_report,
+    show_filter_panel
 )
 from src.plans import show_pricing
 from src.formulas import show_formulas_catalog
@@ -110,7 +127,7 @@ with st.sidebar:
     st.header("Informações")
     st.markdown("""
         ### Como usar
-        1. Faça upload do arquivo CSV ou Excel (xlsx)
+        1. Faça upload do arquivo CSV, Excel (xlsx), Parquet ou Arrow/Feather
         2. Aguarde a análise automática
         3. Receba insights estratégicos
         
@@ -143,6 +160,47 @@ with st.sidebar:
         Ligação - (75) 99941-5339
     """)
     
+# Seções do dashboard, cada uma montada só a partir das métricas já calculadas
+def secao_visao_geral(metricas, colunas):
+    show_metric_cards(
+        metricas.get('total_vendas'), metricas.get('vendas_por_dia'), metricas.get('numero_dias'), metricas.get('total_estados'),
+        metricas.get('total_clientes'), metricas.get('total_produtos'), metricas.get('total_vendedores'),
+        metricas.get('receita_bruta'), metricas.get('receita_liquida'), metricas.get('total_impostos'), metricas.get('lucro_bruto'), metricas.get('lucro_liquido'),
+        metricas.get('erro_distintos')
+    )
+
+def secao_geotemporal(metricas, colunas):
+    show_geotemporal_analysis(
+        metricas['top_estados'], metricas['df_semanal'], metricas['vendas_por_estado'],
+        colunas['col_estado'], colunas['col_vendas'], colunas['col_data'], metricas.get('vendas_por_periodo'),
+        st.session_state.get("pontos_serie", PONTOS_MAXIMOS_SERIE)
+    )
+
+def secao_clientes_produtos(metricas, colunas):
+    show_client_product_analysis(
+        metricas['top_clientes'], metricas['top_produtos'], metricas['vendas_por_categoria'],
+        metricas.get('topk_aproximado'), metricas.get('erro_topk')
+    )
+
+def secao_comercial_financeiro(metricas, colunas):
+    show_commercial_financial_analysis(
+        metricas.get('top_vendedores'), metricas.get('vendas_por_canal'), metricas.get('vendas_por_pagamento')
+    )
+
+def secao_temporal_segmentacao(metricas, colunas):
+    show_temporal_segmentation_analysis(
+        metricas.get('vendas_por_mes'), metricas.get('vendas_por_dia_semana'), metricas.get('vendas_por_segmento'),
+        metricas.get('vendas_por_hora')
+    )
+
+SECOES = {
+    "Visão Geral": secao_visao_geral,
+    "Geográfica/Temporal": secao_geotemporal,
+    "Clientes/Produtos": secao_clientes_produtos,
+    "Comercial/Financeiro": secao_comercial_financeiro,
+    "Temporal/Segmentação": secao_temporal_segmentacao,
+    #"Relatório"
+}
 
 if not login_gate():
     st.stop()
@@ -150,66 +208,222 @@ if not login_gate():
 st.title("Analytics BI Pro")
 st.markdown("### Sistema Inteligente de Análise de Vendas")
 
-csv_file = st.file_uploader("Selecione o arquivo de vendas (CSV ou Excel)", type=["csv", "xlsx"])
-if not csv_file:
+with st.sidebar:
+    st.header("Processamento")
+    modo_streaming = st.toggle(
+        "Leitura em blocos (streaming)",
+        value=False,
+        help=f"Lê o arquivo em blocos e guarda apenas os agregados. Ativado automaticamente para CSVs acima de {LIMITE_STREAMING_MB} MB."
+    )
+    motor_xlsx = st.selectbox(
+        "Leitor de Excel (xlsx)",
+        MOTORES_XLSX,
+        help="auto: openpyxl para planilhas pequenas; calamine (se instalado) ou openpyxl em modo somente leitura para as grandes."
+    )
+    motor_calculo = st.selectbox(
+        "Motor de cálculo",
+        MOTORES_CALCULO,
+        help=f"duckdb: agrega CSV/Parquet/Arrow direto em SQL, em paralelo e sem montar o DataFrame. "
+             f"polars: leitura, tipagem e agregações em um único plano lazy multi-thread. "
+             f"auto: duckdb ou polars (o primeiro instalado) para arquivos a partir de {LIMITE_LINHAS_MOTOR / 1e6:g} milhões de linhas."
+    )
+    if not motor_disponivel(motor_calculo) and motor_calculo != "auto":
+        st.caption(f"{motor_calculo} não instalado: usando pandas.")
+    distintos_exatos = st.toggle(
+        "Contagens exatas de distintos",
+        value=True,
+        help="Desative para estimar os totais de clientes, produtos, vendedores e estados com HyperLogLog (memória fixa, combinável entre blocos)."
+    )
+    topk_aproximado = st.toggle(
+        "Top-K aproximado (memória limitada)",
+        value=False,
+        help="Usa um sketch Space-Saving para os rankings de clientes, produtos e vendedores em vez de agrupar todas as chaves."
+    )
+    precisao_hll = None
+    if not distintos_exatos:
+        precisao_hll = st.select_slider(
+            "Precisão do HyperLogLog",
+            options=list(range(10, 17)),
+            value=PRECISAO_HLL,
+            format_func=lambda p: f"2^{p} (±{1.04 / 2 ** (p / 2):.1%})",
+            help="Mais registradores reduzem o erro e aumentam a memória do sketch (2^p bytes)."
+        )
+    st.header("Conjunto de dados")
+    modo_conjunto = st.toggle(
+        "Anexar a um conjunto",
+        value=False,
+        help="Cada upload é somado aos agregados guardados do conjunto: só o arquivo novo é processado, sem reenviar o histórico."
+    )
+    nome_conjunto = None
+    if modo_conjunto:
+        existentes = listar_conjuntos()
+        escolha = st.selectbox("Conjunto", existentes + ["Novo conjunto"])
+        nome_conjunto = st.text_input("Nome do novo conjunto", value="vendas") if escolha == "Novo conjunto" else escolha
+    st.header("Exibição")
+    navegacao_leve = st.toggle(
+        "Montar só a seção ativa",
+        value=True,
+        help="Executa apenas a seção escolhida: gráficos e tabelas das demais não são montados nem enviados ao navegador a cada interação. "
+             "Desative para as abas clássicas, que montam as cinco seções em todo rerun."
+    )
+    st.number_input(
+        "Pontos por série temporal",
+        min_value=100,
+        max_value=20_000,
+        value=PONTOS_MAXIMOS_SERIE,
+        step=100,
+        key="pontos_serie",
+        help="Séries mais longas são reduzidas por LTTB (mantém picos e vales) antes de ir ao navegador; "
+             f"acima de {LIMITE_PONTOS_WEBGL:,} pontos o gráfico usa WebGL."
+    )
+
+arquivos = st.file_uploader(
+    "Selecione o(s) arquivo(s) de vendas (CSV, Excel, Parquet ou Arrow/Feather)", type=EXTENSOES_ACEITAS, accept_multiple_files=True
+)
+if not arquivos:
     st.warning("Aguardando upload do arquivo...")
     st.stop()
 else:
-    st.success("Arquivo carregado com sucesso!")
-    filename = csv_file.name.lower()
-    if filename.endswith(".csv"):
-        df = pd.read_csv(csv_file)
+    st.success("Arquivo carregado com sucesso!" if len(arquivos) == 1 else f"{len(arquivos)} arquivos carregados com sucesso!")
+    csv_file = arquivos[0]
+    nome_upload = csv_file.name if len(arquivos) == 1 else f"{len(arquivos)} arquivos ({csv_file.name}, ...)"
+    conjunto = carregar_conjunto(nome_conjunto) if nome_conjunto else None
+    if conjunto is not None:
+        # O conjunto mantém as opções de cálculo com que foi criado, para que os agregados sejam combináveis
+        topk_aproximado = conjunto["opcoes"]["topk_aproximado"]
+        precisao_hll = conjunto["opcoes"]["precisao_hll"]
+    carga = None
+    if len(arquivos) > 1:
+        with st.spinner(f"Lendo {len(arquivos)} arquivos em paralelo..."):
+            carga = carregar_varios(arquivos, motor_xlsx, topk_aproximado, precisao_hll)
+    elif not topk_aproximado and precisao_hll is None and escolher_motor_calculo(csv_file, motor_calculo) != "pandas":
+        # DuckDB e Polars calculam só agregados exatos; Top-K aproximado e HyperLogLog seguem no pandas
+        motor = escolher_motor_calculo(csv_file, motor_calculo)
+        with st.spinner(f"Agregando arquivo com {motor}..."):
+            carga, falha = carregar_com_motor(csv_file, motor)
+        if falha:
+            st.caption(f"{falha} Calculando com pandas.")
+    if carga is None and (modo_streaming or deve_usar_streaming(csv_file)):
+        with st.spinner("Processando arquivo em blocos..."):
+            carga = carregar_upload_em_blocos(csv_file, aproximado=topk_aproximado, precisao_hll=precisao_hll)
+    elif carga is None:
+        carga = carregar_upload(csv_file, motor_xlsx)
+    df = carga["df"]
+    colunas = carga["colunas"]
+    if carga["cache"]:
+        st.caption("Arquivo já processado anteriormente: dados reaproveitados do cache.")
+    elif "arquivos" in carga:
+        st.caption(f"{len(carga['arquivos'])} arquivos lidos em paralelo em {carga['tempo_leitura']:.2f} s.")
+    elif carga.get("motor_calculo"):
+        st.caption(f"Arquivo agregado com {carga['motor_calculo']} em {carga['tempo_leitura']:.2f} s.")
+    elif df is None:
+        st.caption(f"Arquivo processado em streaming: {carga['blocos']} blocos em {carga['tempo_leitura']:.2f} s.")
+    elif carga["origem"] == "disco":
+        st.caption(f"Dados reaproveitados do cache em disco (Parquet) em {carga['tempo_leitura']:.2f} s.")
+    elif carga["motor_xlsx"]:
+        st.caption(f"Planilha lida com {carga['motor_xlsx']} em {carga['tempo_leitura']:.2f} s.")
     else:
-        df = pd.read_excel(csv_file, engine="openpyxl")
-    df.columns = df.columns.str.strip()
-    # Detecta colunas principais
-    colunas = {
-        'col_data': detectar_coluna(df, ["dia", "data", "date", "dt", "data_venda", "data venda", "data_compra"]),
-        'col_vendas': detectar_coluna(df, ["vendas", "valor", "valor_venda", "faturamento", "receita", "total", "sales", "amount", "receita_bruta"]),
-        'col_estado': detectar_coluna(df, ["estado", "uf", "regiao"]),
-        'col_dia_semana': detectar_coluna(df, ["dia_semana"]),
-        'col_cliente': detectar_coluna(df, ["cliente", "nome_cliente"]),
-        'col_produto': detectar_coluna(df, ["produto", "nome_produto"]),
-        'col_vendedor': detectar_coluna(df, ["vendedor"]),
-        'col_canal_venda': detectar_coluna(df, ["canal", "canal_venda"]),
-        'col_categoria_produto': detectar_coluna(df, ["categoria", "categoria_produto"]),
-        'col_mes': detectar_coluna(df, ["mes", "mês"]),
-        'col_receita_bruta': detectar_coluna(df, ["receita_bruta"]),
-        'col_receita_liquida': detectar_coluna(df, ["receita_liquida"]),
-        'col_impostos': detectar_coluna(df, ["impostos", "total_impostos"]),
-    'col_lucro_bruto': detectar_coluna(df, ["lucro_bruto"]),
-    'col_lucro_liquido': detectar_coluna(df, ["lucro_liquido"]),
-    'col_forma_pagamento': detectar_coluna(df, ["forma_pagamento"]),
-    'col_segmento': detectar_coluna(df, ["segmento"])
-    }
-    df = converter_tipos(df, colunas['col_data'], colunas['col_vendas'])
-    metricas = calcular_metricas(df, colunas)
-    tabs = st.tabs([
-        "Visão Geral", "Geográfica/Temporal", "Clientes/Produtos", "Comercial/Financeiro", "Temporal/Segmentação", #"Relatório"
-    ])
-    with tabs[0]:
-        show_metric_cards(
-            metricas.get('total_vendas'), metricas.get('vendas_por_dia'), metricas.get('numero_dias'), metricas.get('total_estados'),
-            metricas.get('total_clientes'), metricas.get('total_produtos'), metricas.get('total_vendedores'),
-            metricas.get('receita_bruta'), metricas.get('receita_liquida'), metricas.get('total_impostos'), metricas.get('lucro_bruto'), metricas.get('lucro_liquido')
-        )
-    with tabs[1]:
-        show_geotemporal_analysis(
-            metricas['top_estados'], metricas['df_semanal'], df,
-            colunas['col_estado'], colunas['col_vendas'], colunas['col_data']
+        st.caption(f"Arquivo processado em {carga['tempo_leitura']:.2f} s.")
+    if "arquivos" in carga:
+        if carga["duplicados"]:
+            st.caption(f"{carga['duplicados']} arquivo(s) com conteúdo repetido foram ignorados.")
+        ausentes = sorted({papel for r in carga["arquivos"] for papel in r["ausentes"]})
+        if ausentes:
+            st.warning("Colunas ausentes em parte dos arquivos (somadas só onde existem): " + ", ".join(ausentes))
+        with st.expander("Leitura por arquivo"):
+            st.dataframe(resumo_leitura(carga), use_container_width=True)
+    if carga.get("origem") in ("arquivo", "colunar") and carga.get("esquema_conhecido"):
+        st.caption("Layout de colunas já conhecido: detecção e inferência de tipos reaproveitadas.")
+    invalidos = {col: n for col, n in carga["valores_invalidos"].items() if n}
+    if invalidos:
+        st.warning(
+            "Valores financeiros que não puderam ser convertidos em número (tratados como vazios): "
+            + ", ".join(f"{col}: {n:,}" for col, n in invalidos.items())
         )
-    with tabs[2]:
-        show_client_product_analysis(
-            metricas['top_clientes'], metricas['top_produtos'], metricas['vendas_por_categoria']
+    if df is not None and carga["memoria_economizada"] > 0:
+        st.caption(
+            f"Dimensões codificadas como categorias: {carga['memoria_economizada'] / 1024**2:,.1f} MB economizados "
+            f"(em uso: {carga['memoria_bytes'] / 1024**2:,.1f} MB)."
         )
-    with tabs[3]:
-        show_commercial_financial_analysis(
-            metricas.get('top_vendedores'), metricas.get('vendas_por_canal'), metricas.get('vendas_por_pagamento')
+    if len(arquivos) == 1 and csv_file.name.lower().endswith(".xlsx"):
+        with st.expander("Comparar leitores de Excel"):
+            if st.button("Medir tempo de leitura"):
+                st.dataframe(comparar_motores_xlsx(csv_file), use_container_width=True)
+    if len(arquivos) == 1 and not csv_file.name.lower().endswith(".xlsx"):
+        with st.expander("Comparar motores de cálculo"):
+            if st.button("Medir tempo de cálculo"):
+                with st.spinner("Calculando com cada motor instalado..."):
+                    st.dataframe(comparar_motores_calculo(csv_file), use_container_width=True)
+    opcoes = {"topk_aproximado": topk_aproximado, "precisao_hll": precisao_hll}
+    if nome_conjunto:
+        if conjunto is None:
+            conjunto = novo_conjunto(nome_conjunto, colunas, opcoes)
+        if not ja_anexado(conjunto, carga["hash"]):
+            try:
+                parciais_novos, df_alinhado = parciais_para_anexo(conjunto, carga)
+            except ValueError as erro:
+                st.error(str(erro))
+                st.stop()
+            sobrepostas = datas_sobrepostas(conjunto, datas_parciais(parciais_novos))
+            if len(sobrepostas) == 0:
+                anexar(conjunto, carga["hash"], nome_upload, parciais_novos)
+            else:
+                st.warning(
+                    f"{len(sobrepostas)} dia(s) deste arquivo ({sobrepostas.min():%d/%m/%Y} a {sobrepostas.max():%d/%m/%Y}) "
+                    "já estão no conjunto; anexar tudo pode contar essas vendas em dobro."
+                )
+                col_descartar, col_anexar = st.columns(2)
+                if df_alinhado is not None and col_descartar.button("Descartar os dias repetidos e anexar"):
+                    anexar_sem_repetidas(conjunto, carga["hash"], nome_upload, df_alinhado, sobrepostas)
+                elif col_anexar.button("Anexar mesmo assim (ex.: outra loja no mesmo dia)"):
+                    anexar(conjunto, carga["hash"], nome_upload, parciais_novos)
+                else:
+                    st.stop()
+        else:
+            st.caption("Este arquivo já faz parte do conjunto.")
+        datas = conjunto["datas"]
+        st.caption(
+            f"Conjunto \"{conjunto['nome']}\": {len(conjunto['arquivos'])} arquivo(s), {conjunto['parciais']['linhas']:,} linhas"
+            + (f", de {datas.min():%d/%m/%Y} a {datas.max():%d/%m/%Y}." if len(datas) else ".")
         )
-    with tabs[4]:
-        show_temporal_segmentation_analysis(
-            metricas.get('vendas_por_mes'), metricas.get('vendas_por_dia_semana'), metricas.get('vendas_por_segmento')
+        with st.expander("Arquivos do conjunto"):
+            st.dataframe(resumo_arquivos(conjunto), use_container_width=True)
+        carga = {**carga, "hash": hash_conjunto(conjunto), "df": None, "parciais": conjunto["parciais"]}
+        df, colunas, opcoes = None, conjunto["colunas"], conjunto["opcoes"]
+    base = preparar_base(carga["hash"], df, colunas, carga.get("parciais"), opcoes)
+    with st.sidebar:
+        filtros = show_filter_panel(opcoes_filtros(base, colunas))
+        if filtros and base["linhas"] is None:
+            st.caption("Em streaming os filtros valem para totais, série temporal e dimensões do cubo; rankings de clientes, produtos e vendedores ficam indisponíveis.")
+    metricas = metricas_em_cache(
+        carga["hash"], colunas, lambda: montar_metricas(filtrar_base(base, colunas, filtros), colunas),
+        filtros=filtros or None, opcoes=opcoes
+    )
+    if filtros:
+        st.info(f"Filtros ativos: {metricas['linhas']:,} de {base['parciais']['linhas']:,} linhas.")
+    with st.sidebar:
+        estatisticas = obter_cache_metricas().estatisticas()
+        st.caption(
+            f"Cache de métricas: {estatisticas['hits']} acertos, {estatisticas['misses']} falhas, "
+            f"{estatisticas['itens']} itens ({estatisticas['uso_bytes'] / 1024**2:,.1f} MB)"
         )
+        if metricas.get('celulas_cubo') is not None:
+            st.caption(f"Cubo pré-agregado: {metricas['celulas_cubo']:,} células para {metricas['linhas']:,} linhas.")
+    inicio_secoes = time.perf_counter()
+    if navegacao_leve:
+        # Só a seção escolhida roda; trocar de seção reaproveita as métricas do cache
+        secao = st.radio("Seção", list(SECOES), horizontal=True, key="secao_ativa", label_visibility="collapsed")
+        SECOES[secao](metricas, colunas)
+    else:
+        for aba, montar_secao in zip(st.tabs(list(SECOES)), SECOES.values()):
+            with aba:
+                montar_secao(metricas, colunas)
+    st.sidebar.caption(f"Dashboard montado em {time.perf_counter() - inicio_secoes:.2f} s.")
+    figuras = estatisticas_figuras()
+    st.sidebar.caption(
+        f"Cache de figuras: {figuras['hits']} acertos, {figuras['misses']} falhas, "
+        f"{figuras['tempo_economizado']:.2f} s de montagem economizados"
+    )
     #with tabs[5]:
     #    show_report(
     #        metricas.get('report'), metricas.get('dados_suficientes'),
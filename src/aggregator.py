@@ -0,0 +1,251 @@
+# Agregados parciais combináveis: permitem calcular as métricas bloco a bloco
+import numpy as np
+import pandas as pd
+from src.cube import (
+    LIMITE_CARDINALIDADE_CUBO, MEDIDA_LINHAS, DIMENSAO_HORA, HORAS_DIA,
+    fatorar, ordenar_por_indice, separar_dia_hora, cabe_no_cubo, materializar_cubo, combinar_cubos, rolar_dimensoes
+)
+from src.sketches import SpaceSaving, HyperLogLog
+from src.utils import COLUNAS_FINANCEIRAS
+
+# Colunas financeiras somadas integralmente
+COLUNAS_SOMA = COLUNAS_FINANCEIRAS
+
+# Dimensões agrupadas pela soma de vendas
+COLUNAS_DIMENSAO = [
+    'col_estado', 'col_cliente', 'col_produto', 'col_vendedor', 'col_canal_venda',
+    'col_categoria_produto', 'col_mes', 'col_dia_semana', 'col_forma_pagamento', 'col_segmento',
+]
+
+# Dimensões de alta cardinalidade que podem usar Top-K aproximado (Space-Saving)
+COLUNAS_TOPK_APROXIMADO = ['col_cliente', 'col_produto', 'col_vendedor']
+# Chaves monitoradas por sketch: quanto maior, menor o erro
+CAPACIDADE_TOPK = 1000
+# Dimensões do filtro global: entram no cubo sempre que a cardinalidade permite;
+# as demais seguem pela cardinalidade enquanto houver espaço
+PRIORIDADE_CUBO = ['col_estado', 'col_canal_venda', 'col_segmento']
+# Dimensões com total de distintos nos cards
+COLUNAS_DISTINTOS = ['col_estado', 'col_cliente', 'col_produto', 'col_vendedor']
+
+def parciais_vazios():
+    return {'linhas': 0, 'somas': {}, 'por_dimensao': {}, 'por_data': None, 'top_k': {}, 'distintos': {}, 'cubo': None}
+
+# Plano de agregação: reúne todos os agregados pedidos e agrupa os papéis pela coluna
+# física, para que cada coluna seja fatorada uma única vez mesmo atendendo a vários papéis
+def planejar_agregados(colunas, nomes_df, aproximado=False, precisao_hll=None):
+    presentes = set(nomes_df)
+    def coluna(papel):
+        col = colunas.get(papel)
+        return col if col and col in presentes else None
+    plano = {
+        'vendas': coluna('col_vendas'),
+        'data': coluna('col_data'),
+        'somas': {papel: coluna(papel) for papel in COLUNAS_SOMA if coluna(papel)},
+        'dimensoes': {},
+        'top_k': {},
+        'distintos': {},
+    }
+    if plano['vendas']:
+        for papel in COLUNAS_DIMENSAO:
+            if not coluna(papel):
+                continue
+            if aproximado and papel in COLUNAS_TOPK_APROXIMADO:
+                plano['top_k'][papel] = coluna(papel)
+            else:
+                plano['dimensoes'].setdefault(coluna(papel), []).append(papel)
+        if precisao_hll:
+            plano['distintos'] = {papel: coluna(papel) for papel in COLUNAS_DISTINTOS if coluna(papel)}
+    return plano
+
+# Dimensões que entram no cubo: por prioridade e depois da menor para a maior cardinalidade,
+# enquanto couberem. `tamanho_data` é a quantidade de dias distintos, vezes 24 com a hora (None sem data).
+def escolher_dimensoes_cubo(plano, cardinalidades, tamanho_data=None):
+    def ordem(col):
+        prioridades = [PRIORIDADE_CUBO.index(p) for p in plano['dimensoes'][col] if p in PRIORIDADE_CUBO]
+        return min(prioridades, default=len(PRIORIDADE_CUBO)), cardinalidades[col]
+    tamanhos = [tamanho_data] if tamanho_data is not None else []
+    escolhidas = []
+    for col in sorted(cardinalidades, key=ordem):
+        prioritaria = ordem(col)[0] < len(PRIORIDADE_CUBO)
+        tamanho = cardinalidades[col]
+        if col != plano['data'] and tamanho <= LIMITE_CARDINALIDADE_CUBO and (prioritaria or cabe_no_cubo(tamanhos, tamanho)):
+            escolhidas.append(col)
+            tamanhos.append(tamanho)
+    return escolhidas
+
+# Soma dos pesos por código (equivale a groupby(...).sum() com observed=True)
+def _somar_por_codigo(codigos, unicos, pesos, nome_indice, nome, tipo):
+    validos = codigos >= 0
+    codigos = codigos[validos]
+    somas = np.bincount(codigos, weights=pesos[validos], minlength=len(unicos))
+    observados = np.bincount(codigos, minlength=len(unicos)) > 0
+    resultado = pd.Series(somas[observados], index=unicos[observados], name=nome)
+    if pd.api.types.is_integer_dtype(tipo):
+        resultado = resultado.astype(tipo)
+    resultado.index.name = nome_indice
+    return ordenar_por_indice(resultado)
+
+# Extrai os agregados parciais de um DataFrame (ou de um bloco dele) executando o plano:
+# a data e as dimensões de baixa cardinalidade formam o cubo; as demais viram um bincount
+# sobre seus códigos, com os pesos de vendas lidos uma única vez
+def extrair_parciais(df, colunas, aproximado=False, precisao_hll=None):
+    plano = planejar_agregados(colunas, df.columns, aproximado, precisao_hll)
+    parciais = parciais_vazios()
+    parciais['linhas'] = len(df)
+    col_vendas = plano['vendas']
+    col_data = plano['data']
+    if col_vendas and not pd.api.types.is_numeric_dtype(df[col_vendas]):
+        for papel, col in plano['somas'].items():
+            parciais['somas'][papel] = df[col].sum()
+        return _extrair_parciais_groupby(df, plano, parciais)
+    fatores = {}
+    dimensoes_cubo = {}
+    horas = None
+    if col_data:
+        datas = df[col_data]
+        if pd.api.types.is_datetime64_any_dtype(datas):
+            datas, horas = separar_dia_hora(datas)
+        codigos, unicos = fatorar(datas)
+        unicos = pd.DatetimeIndex(unicos) if pd.api.types.is_datetime64_any_dtype(unicos) else unicos
+        fatores[col_data] = (codigos, unicos)
+        if horas is not None:
+            fatores[DIMENSAO_HORA] = horas
+            dimensoes_cubo[DIMENSAO_HORA] = ['col_hora']
+    if col_vendas:
+        vendas = df[col_vendas]
+        pesos = np.nan_to_num(vendas.to_numpy(dtype=float))
+        fatorados = {col: fatorar(df[col]) for col in plano['dimensoes']}
+        cardinalidades = {col: len(unicos) for col, (_, unicos) in fatorados.items()}
+        tamanho_data = len(fatores[col_data][1]) * (HORAS_DIA if horas is not None else 1) if col_data else None
+        no_cubo = escolher_dimensoes_cubo(plano, cardinalidades, tamanho_data)
+        for col in no_cubo:
+            fatores[col] = fatorados[col]
+            dimensoes_cubo[col] = plano['dimensoes'][col]
+        for col, (codigos, unicos) in fatorados.items():
+            if col in no_cubo:
+                continue
+            somas = _somar_por_codigo(codigos, unicos, pesos, col, col_vendas, vendas.dtype)
+            for papel in plano['dimensoes'][col]:
+                parciais['por_dimensao'][papel] = somas
+        for papel, col in plano['distintos'].items():
+            parciais['distintos'][papel] = HyperLogLog(precisao_hll).atualizar(df[col])
+        for papel, col in plano['top_k'].items():
+            parciais['top_k'][papel] = SpaceSaving(CAPACIDADE_TOPK).atualizar(df[col], pesos)
+            if papel not in parciais['distintos']:
+                parciais['distintos'][papel] = _distintos(df[col])
+    # Medidas do cubo: contagem de linhas e colunas financeiras numéricas
+    medidas = {MEDIDA_LINHAS: np.ones(len(df))}
+    nomes = {MEDIDA_LINHAS: "count"}
+    tipos = {MEDIDA_LINHAS: "int64"}
+    for papel, col in plano['somas'].items():
+        if pd.api.types.is_numeric_dtype(df[col]):
+            medidas[papel] = np.nan_to_num(df[col].to_numpy(dtype=float, na_value=np.nan))
+            nomes[papel] = col
+            tipos[papel] = str(df[col].dtype)
+        else:
+            parciais['somas'][papel] = df[col].sum()
+    parciais['cubo'] = materializar_cubo(fatores, medidas, dimensoes_cubo, col_data, nomes, tipos)
+    return parciais
+
+# Códigos no menor inteiro com sinal que comporta a cardinalidade (-1 marca vazios)
+def _compactar(codigos, tamanho):
+    for tipo in (np.int8, np.int16, np.int32):
+        if tamanho < np.iinfo(tipo).max:
+            return codigos.astype(tipo, copy=False)
+    return codigos
+
+# Índice de linhas para os filtros: códigos compactos das colunas do cubo e das dimensões
+# que ficaram fora dele, mais os pesos de vendas. Montado uma vez por dataset.
+def indexar_linhas(df, colunas, parciais):
+    cubo = parciais.get('cubo')
+    plano = planejar_agregados(colunas, df.columns)
+    col_vendas = plano['vendas']
+    if cubo is None or not col_vendas:
+        return None
+    def indexar(col):
+        codigos, unicos = fatorar(df[col])
+        return _compactar(codigos, len(unicos)), unicos
+    return {
+        'filtros': {col: indexar(col) for col in ([cubo['data']] if cubo['data'] else []) + list(cubo['dimensoes']) if col != DIMENSAO_HORA},
+        'dimensoes': {col: (*indexar(col), papeis) for col, papeis in plano['dimensoes'].items() if col not in cubo['dimensoes']},
+        'pesos': np.nan_to_num(df[col_vendas].to_numpy(dtype=float)),
+        'nome_vendas': col_vendas,
+        'tipo_vendas': df[col_vendas].dtype,
+    }
+
+# Distribuições das dimensões fora do cubo restritas às linhas da máscara
+# (as posições são extraídas uma vez e reaproveitadas em cada coluna)
+def agregar_linhas(indice, mascara):
+    linhas = np.flatnonzero(mascara)
+    pesos = indice['pesos'].take(linhas)
+    por_dimensao = {}
+    for col, (codigos, unicos, papeis) in indice['dimensoes'].items():
+        somas = _somar_por_codigo(codigos.take(linhas), unicos, pesos, col, indice['nome_vendas'], indice['tipo_vendas'])
+        for papel in papeis:
+            por_dimensao[papel] = somas
+    return por_dimensao
+
+# Valores distintos não nulos (para o total de distintos sem agrupar as vendas)
+def _distintos(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        observados = np.bincount(serie.cat.codes.to_numpy() + 1, minlength=len(serie.cat.categories) + 1)[1:] > 0
+        return pd.Index(serie.cat.categories[observados])
+    return pd.Index(serie.dropna().unique())
+
+# Caminho genérico para vendas não numéricas (mantém a semântica do groupby do pandas)
+def _extrair_parciais_groupby(df, plano, parciais):
+    col_vendas = plano['vendas']
+    for col, papeis in plano['dimensoes'].items():
+        somas = df.groupby(col, observed=True)[col_vendas].sum()
+        if isinstance(somas.index, pd.CategoricalIndex):
+            somas.index = somas.index.astype(somas.index.categories.dtype)
+        for papel in papeis:
+            parciais['por_dimensao'][papel] = somas
+    if plano['data']:
+        parciais['por_data'] = df.groupby(plano['data'])[col_vendas].sum()
+    return parciais
+
+def _somar_series(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a.add(b, fill_value=0)
+
+# Combina dois conjuntos de parciais; o resultado equivale a agregar os dados concatenados
+def combinar_parciais(a, b):
+    resultado = parciais_vazios()
+    resultado['linhas'] = a['linhas'] + b['linhas']
+    for papel in set(a['somas']) | set(b['somas']):
+        if papel in a['somas'] and papel in b['somas']:
+            resultado['somas'][papel] = a['somas'][papel] + b['somas'][papel]
+        else:
+            resultado['somas'][papel] = a['somas'].get(papel, b['somas'].get(papel))
+    resultado['por_data'] = _somar_series(a['por_data'], b['por_data'])
+    # Cubos se unem nas dimensões em comum; as que sobram num dos lados viram distribuições avulsas
+    dimensoes_a, dimensoes_b = a['por_dimensao'], b['por_dimensao']
+    if a['cubo'] is not None and b['cubo'] is not None:
+        resultado['cubo'] = combinar_cubos(a['cubo'], b['cubo'])
+        manter = resultado['cubo']['dimensoes']
+        dimensoes_a = {**dimensoes_a, **rolar_dimensoes(a['cubo'], manter)}
+        dimensoes_b = {**dimensoes_b, **rolar_dimensoes(b['cubo'], manter)}
+    else:
+        resultado['cubo'] = a['cubo'] if a['cubo'] is not None else b['cubo']
+    for papel in set(dimensoes_a) | set(dimensoes_b):
+        resultado['por_dimensao'][papel] = _somar_series(dimensoes_a.get(papel), dimensoes_b.get(papel))
+    for papel in set(a['top_k']) | set(b['top_k']):
+        if papel in a['top_k'] and papel in b['top_k']:
+            resultado['top_k'][papel] = a['top_k'][papel].combinar(b['top_k'][papel])
+        else:
+            resultado['top_k'][papel] = a['top_k'].get(papel, b['top_k'].get(papel))
+    # Distintos exatos (Index) se unem; sketches HyperLogLog se combinam
+    for papel in set(a['distintos']) | set(b['distintos']):
+        if papel in a['distintos'] and papel in b['distintos']:
+            distintos_a, distintos_b = a['distintos'][papel], b['distintos'][papel]
+            if isinstance(distintos_a, HyperLogLog):
+                resultado['distintos'][papel] = distintos_a.combinar(distintos_b)
+            else:
+                resultado['distintos'][papel] = distintos_a.union(distintos_b)
+        else:
+            resultado['distintos'][papel] = a['distintos'].get(papel, b['distintos'].get(papel))
+    return resultado
@@ -0,0 +1,78 @@
+# Cache em memória com despejo LRU e orçamento de memória em bytes
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Hash do conteúdo bruto do arquivo (independe do nome do upload)
+def hash_bytes(dados):
+    return hashlib.blake2b(dados, digest_size=16).hexdigest()
+
+# Estimativa do tamanho em memória de DataFrames, Series, arrays e containers simples
+def tamanho_objeto(obj):
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(tamanho_objeto(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(tamanho_objeto(v) for v in obj)
+    return sys.getsizeof(obj)
+
+class CacheLRU:
+    def __init__(self, orcamento_bytes):
+        self.orcamento_bytes = orcamento_bytes
+        self.uso_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            if chave not in self._itens:
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return self._itens[chave][0]
+
+    def put(self, chave, valor, tamanho=None):
+        tamanho = tamanho_objeto(valor) if tamanho is None else tamanho
+        with self._lock:
+            if chave in self._itens:
+                self.uso_bytes -= self._itens.pop(chave)[1]
+            # Itens maiores que o orçamento inteiro não são guardados
+            if tamanho > self.orcamento_bytes:
+                return False
+            self._itens[chave] = (valor, tamanho)
+            self.uso_bytes += tamanho
+            while self.uso_bytes > self.orcamento_bytes:
+                _, (_, tamanho_removido) = self._itens.popitem(last=False)
+                self.uso_bytes -= tamanho_removido
+            return True
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self.uso_bytes = 0
+
+    def __contains__(self, chave):
+        return chave in self._itens
+
+    def __len__(self):
+        return len(self._itens)
+
+    def estatisticas(self):
+        return {
+            "itens": len(self._itens),
+            "uso_bytes": self.uso_bytes,
+            "orcamento_bytes": self.orcamento_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
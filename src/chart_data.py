@@ -0,0 +1,29 @@
+# Preparação dos agregados antes dos gráficos de fatias (pizza, treemap, barras por categoria):
+# só os maiores valores viram fatias e a cauda longa é somada em um único "Outros"
+import numpy as np
+import pandas as pd
+
+# Fatias desenhadas por gráfico; as demais categorias vão para "Outros"
+LIMITE_FATIAS = 10
+# A partir desta quantidade de valores distintos a coluna provavelmente não é categórica
+LIMITE_CARDINALIDADE = 500
+ROTULO_OUTROS = "Outros"
+
+# Maiores `limite` valores (seleção parcial com argpartition, sem ordenar a série inteira) e a soma do
+# restante em "Outros"; devolve a série pronta para o gráfico e quantas categorias foram agrupadas
+def agrupar_cauda(serie, limite=LIMITE_FATIAS):
+    if serie is None or len(serie) <= limite + 1:
+        return serie, 0
+    valores = np.nan_to_num(serie.to_numpy(dtype=float))
+    maiores = np.argpartition(-valores, limite - 1)[:limite]
+    maiores = maiores[np.argsort(-valores[maiores], kind="stable")]
+    resto = valores.sum() - valores[maiores].sum()
+    topo = serie.iloc[maiores]
+    outros = pd.Series([resto], index=pd.Index([ROTULO_OUTROS], name=serie.index.name), name=serie.name)
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        outros = outros.astype(serie.dtype)
+    resultado = pd.concat([topo, outros])
+    # Um valor chamado "Outros" no próprio arquivo é somado à fatia agregada
+    if not resultado.index.is_unique:
+        resultado = resultado.groupby(level=0, sort=False).sum()
+    return resultado, len(serie) - limite
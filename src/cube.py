@@ -0,0 +1,150 @@
+# Cubo OLAP pré-agregado: data × dimensões de baixa cardinalidade, com as somas de cada célula.
+# Materializado uma vez por dataset; métricas e gráficos saem de roll-ups sobre ele.
+import numpy as np
+import pandas as pd
+
+# Dimensões com mais valores distintos que isso ficam fora do cubo (agrupadas à parte)
+LIMITE_CARDINALIDADE_CUBO = 64
+# Células possíveis (produto das cardinalidades) além das quais novas dimensões ficam de fora;
+# mantém o cubo pequeno e a chave composta dentro de int64
+LIMITE_CELULAS_CUBO = 500_000
+# Medida com a quantidade de linhas de cada célula
+MEDIDA_LINHAS = 'linhas'
+# A data entra no cubo pelo dia; havendo horários, a hora vira esta dimensão (24 valores)
+DIMENSAO_HORA = '__hora'
+HORAS_DIA = 24
+
+# Códigos inteiros e valores distintos ordenados; categóricas reaproveitam os próprios códigos
+def fatorar(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), pd.Index(serie.cat.categories)
+    codigos, unicos = pd.factorize(serie, sort=True)
+    return codigos, pd.Index(unicos)
+
+# Ordena uma série pelo índice como o groupby(sort=True) faria; chaves de tipos misturados
+# (35 e 'SP' numa planilha) não se comparam, e a ordenação de factorize põe números antes de textos
+def ordenar_por_indice(serie):
+    if serie.index.is_monotonic_increasing:
+        return serie
+    codigos, _ = pd.factorize(serie.index, sort=True)
+    return serie.iloc[np.argsort(codigos, kind="stable")]
+
+# Dias da coluna de datas e, se algum valor tiver horário, os códigos da hora (-1 nas datas vazias);
+# sem a normalização cada timestamp distinto viraria uma célula e o cubo não reduziria nada
+def separar_dia_hora(datas):
+    dias = datas.dt.normalize()
+    if not (datas - dias).dropna().any():
+        return dias, None
+    horas = datas.dt.hour.fillna(-1).to_numpy(dtype=np.int8)
+    return dias, (horas, pd.Index(range(HORAS_DIA)))
+
+# Indica se mais uma dimensão de `tamanho` valores ainda cabe no cubo
+def cabe_no_cubo(tamanhos, tamanho):
+    return len(tamanhos) == 0 or np.prod([t + 1 for t in tamanhos], dtype=float) * (tamanho + 1) <= LIMITE_CELULAS_CUBO
+
+# Agrupa as linhas pelas combinações de códigos e soma as medidas de cada célula.
+# `fatores`: {coluna: (códigos, únicos)}; `medidas`: {papel: valores}; `dimensoes`: {coluna: [papéis]}.
+# Códigos -1 (vazios) formam células próprias, para que os totais continuem completos.
+def materializar_cubo(fatores, medidas, dimensoes, col_data=None, nomes=None, tipos=None):
+    tamanhos = [len(unicos) + 1 for _, unicos in fatores.values()]
+    linhas = len(next(iter(medidas.values())))
+    if fatores:
+        chave = np.ravel_multi_index([codigos + 1 for codigos, _ in fatores.values()], tamanhos)
+        celulas, unicas = pd.factorize(chave)
+    else:
+        celulas, unicas = np.zeros(linhas, dtype=np.intp), np.zeros(min(linhas, 1), dtype=np.intp)
+    tabela = {}
+    posicoes = np.unravel_index(unicas, tamanhos) if fatores else []
+    for (col, (_, unicos)), codigos in zip(fatores.items(), posicoes):
+        codigos = codigos.astype(np.intp) - 1
+        if isinstance(unicos, pd.DatetimeIndex):
+            tabela[col] = unicos.take(codigos, allow_fill=True, fill_value=pd.NaT)
+        else:
+            tabela[col] = pd.Categorical.from_codes(codigos, categories=unicos)
+    for papel, valores in medidas.items():
+        tabela[papel] = np.bincount(celulas, weights=valores, minlength=len(unicas))
+    return {
+        'tabela': pd.DataFrame(tabela),
+        'dimensoes': dimensoes,
+        'data': col_data,
+        'nomes': nomes or {},
+        'tipos': tipos or {},
+    }
+
+# Cubo a partir de uma tabela já agrupada por `chaves` (uma linha por combinação), como a devolvida
+# pelos motores SQL e Polars; `medidas` liga cada medida à coluna da tabela com a sua soma
+def materializar_grupos(tabela, chaves, medidas, dimensoes, col_data=None, nomes=None, tipos=None):
+    fatores = {}
+    for col in chaves:
+        codigos, unicos = fatorar(tabela[col])
+        if pd.api.types.is_datetime64_any_dtype(unicos):
+            unicos = pd.DatetimeIndex(unicos).as_unit("ns")
+        fatores[col] = (codigos, unicos)
+    valores = {papel: tabela[coluna].fillna(0).to_numpy(dtype=float) for papel, coluna in medidas.items()}
+    return materializar_cubo(fatores, valores, dimensoes, col_data, nomes, tipos)
+
+# Reagrupa uma tabela do cubo pelas dimensões indicadas (as demais são somadas)
+def reagrupar_cubo(cubo, tabela, manter, medidas=None):
+    dimensoes = {col: papeis for col, papeis in cubo['dimensoes'].items() if col in manter}
+    col_data = cubo['data'] if cubo['data'] in manter else None
+    fatores = {col: fatorar(tabela[col]) for col in ([col_data] if col_data else []) + list(dimensoes)}
+    medidas = {papel: tabela[papel].to_numpy(dtype=float) for papel in (medidas or _medidas(cubo))}
+    return materializar_cubo(fatores, medidas, dimensoes, col_data, cubo['nomes'], cubo['tipos'])
+
+def _medidas(cubo):
+    return [col for col in cubo['tabela'].columns if col not in cubo['dimensoes'] and col != cubo['data']]
+
+def _colunas_dimensao(cubo):
+    return ([cubo['data']] if cubo['data'] else []) + list(cubo['dimensoes'])
+
+# Tipo de uma medida presente em dois cubos: inteiro só se os dois lados forem do mesmo tipo
+def _combinar_tipos(tipo_a, tipo_b):
+    if tipo_a is None or tipo_b is None or tipo_a == tipo_b:
+        return tipo_a or tipo_b
+    return "float64"
+
+# União de dois cubos sobre as dimensões em comum; equivale a materializar os dados concatenados.
+# Medidas que só um dos lados tem (coluna ausente no outro arquivo) contam como zero no outro,
+# então a ordem dos cubos não altera o resultado
+def combinar_cubos(a, b):
+    comuns = [col for col in _colunas_dimensao(a) if col in _colunas_dimensao(b)]
+    medidas = sorted(set(_medidas(a)) | set(_medidas(b)))
+    tabela = pd.concat([a['tabela'], b['tabela']], ignore_index=True)
+    tabela[medidas] = tabela[medidas].fillna(0)
+    nomes = {**b['nomes'], **a['nomes']}
+    tipos = {papel: _combinar_tipos(a['tipos'].get(papel), b['tipos'].get(papel)) for papel in set(a['tipos']) | set(b['tipos'])}
+    return reagrupar_cubo({**a, 'nomes': nomes, 'tipos': tipos}, tabela, comuns, medidas)
+
+# Roll-up de uma medida sobre uma coluna do cubo (equivale a groupby(...).sum() nos dados brutos)
+def rolar_cubo(cubo, coluna, medida='col_vendas'):
+    tabela = cubo['tabela']
+    resultado = tabela.groupby(coluna, observed=True, sort=True)[medida].sum()
+    if isinstance(resultado.index, pd.CategoricalIndex):
+        resultado.index = resultado.index.astype(resultado.index.categories.dtype)
+        resultado = ordenar_por_indice(resultado)
+    resultado.index.name = coluna
+    resultado.name = cubo['nomes'].get(medida, medida)
+    return _restaurar_tipo(resultado, cubo['tipos'].get(medida))
+
+# Subcubo com as células da máscara; os roll-ups sobre ele equivalem a filtrar os dados brutos
+def fatiar_cubo(cubo, mascara):
+    return {**cubo, 'tabela': cubo['tabela'][mascara].reset_index(drop=True)}
+
+# Total de uma medida sobre o cubo inteiro
+def total_cubo(cubo, medida):
+    total = cubo['tabela'][medida].sum()
+    tipo = cubo['tipos'].get(medida)
+    return np.dtype(tipo).type(total) if tipo and pd.api.types.is_integer_dtype(tipo) else total
+
+# Roll-ups das dimensões do cubo que não estão em `manter`, por papel
+def rolar_dimensoes(cubo, manter=()):
+    return {
+        papel: rolar_cubo(cubo, col)
+        for col, papeis in cubo['dimensoes'].items() if col not in manter
+        for papel in papeis
+    }
+
+def _restaurar_tipo(serie, tipo):
+    if tipo and pd.api.types.is_integer_dtype(tipo):
+        return serie.astype(tipo)
+    return serie
@@ -0,0 +1,141 @@
+# Conjuntos incrementais: os agregados parciais ficam em disco e cada novo arquivo (ex.: um por
+# dia e por loja) é anexado a eles, sem reprocessar o histórico já carregado
+import os
+import pickle
+import re
+import threading
+import time
+from pathlib import Path
+import pandas as pd
+from src.aggregator import parciais_vazios, extrair_parciais, combinar_parciais
+from src.cache import hash_bytes
+from src.utils import colunas_resolvidas
+
+DIRETORIO_CONJUNTOS = Path(__file__).resolve().parent.parent / ".cache" / "conjuntos"
+
+_lock = threading.Lock()
+
+def _caminho(nome):
+    return DIRETORIO_CONJUNTOS / (re.sub(r"[^\w-]+", "_", nome.strip()) + ".pkl")
+
+def listar_conjuntos():
+    if not DIRETORIO_CONJUNTOS.exists():
+        return []
+    return sorted(caminho.stem for caminho in DIRETORIO_CONJUNTOS.glob("*.pkl"))
+
+def carregar_conjunto(nome):
+    try:
+        with open(_caminho(nome), "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+def _salvar_conjunto(conjunto):
+    caminho = _caminho(conjunto["nome"])
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_suffix(".pkl.tmp")
+    with open(temporario, "wb") as f:
+        pickle.dump(conjunto, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporario, caminho)
+
+# Conjunto vazio; colunas e opções de cálculo são fixadas pelo primeiro arquivo anexado
+def novo_conjunto(nome, colunas, opcoes):
+    return {
+        "nome": nome,
+        "colunas": colunas,
+        "opcoes": opcoes,
+        "parciais": parciais_vazios(),
+        "datas": pd.DatetimeIndex([]),
+        "arquivos": [],
+    }
+
+# Hash do conjunto: muda a cada arquivo anexado (chave para os caches de métricas e filtros)
+def hash_conjunto(conjunto):
+    return hash_bytes(("\x1f".join([conjunto["nome"]] + [a["hash"] for a in conjunto["arquivos"]])).encode("utf-8"))
+
+def ja_anexado(conjunto, hash_arquivo):
+    return any(a["hash"] == hash_arquivo for a in conjunto["arquivos"])
+
+# Renomeia as colunas do novo arquivo para os nomes usados no conjunto, papel a papel
+def alinhar_colunas(df, colunas_arquivo, colunas_conjunto):
+    papeis_arquivo = {papel for papel, col in colunas_arquivo.items() if col}
+    papeis_conjunto = {papel for papel, col in colunas_conjunto.items() if col}
+    if papeis_arquivo != papeis_conjunto:
+        diferentes = sorted(papeis_arquivo ^ papeis_conjunto)
+        raise ValueError(f"O arquivo não tem as mesmas colunas do conjunto: {', '.join(diferentes)}.")
+    renomear = {colunas_arquivo[papel]: colunas_conjunto[papel] for papel in papeis_arquivo}
+    return df.rename(columns=renomear)[colunas_resolvidas(colunas_conjunto)]
+
+# Dias presentes nos agregados (lidos do cubo, sem precisar das linhas)
+def datas_parciais(parciais):
+    cubo = parciais.get("cubo")
+    if cubo is None or not cubo["data"]:
+        return pd.DatetimeIndex([])
+    datas = cubo["tabela"][cubo["data"]]
+    if not pd.api.types.is_datetime64_any_dtype(datas):
+        return pd.DatetimeIndex([])
+    return pd.DatetimeIndex(datas.dropna().dt.normalize().unique()).sort_values()
+
+# Dias do novo arquivo que o conjunto já cobre (possível contagem em dobro)
+def datas_sobrepostas(conjunto, datas):
+    return conjunto["datas"].intersection(datas)
+
+# Remove do DataFrame as linhas dos dias indicados
+def descartar_datas(df, col_data, datas):
+    if len(datas) == 0 or not col_data:
+        return df, 0
+    repetidas = df[col_data].dt.normalize().isin(datas)
+    return df[~repetidas], int(repetidas.sum())
+
+# Agregados do novo arquivo calculados com as opções do conjunto. Com o DataFrame em memória as
+# colunas são alinhadas por papel; em streaming os nomes precisam coincidir.
+# Devolve também o DataFrame alinhado (None em streaming) para um eventual descarte de dias.
+def parciais_para_anexo(conjunto, carga):
+    colunas = conjunto["colunas"]
+    if carga["df"] is None:
+        if carga["colunas"] != colunas:
+            raise ValueError("Em streaming o arquivo precisa ter exatamente as mesmas colunas do conjunto.")
+        return carga["parciais"], None
+    df = alinhar_colunas(carga["df"], carga["colunas"], colunas)
+    opcoes = conjunto["opcoes"]
+    return extrair_parciais(df, colunas, opcoes["topk_aproximado"], opcoes["precisao_hll"]), df
+
+# Anexa só as linhas de dias que o conjunto ainda não cobre
+def anexar_sem_repetidas(conjunto, hash_arquivo, nome_arquivo, df, sobrepostas):
+    df, descartadas = descartar_datas(df, conjunto["colunas"]["col_data"], sobrepostas)
+    opcoes = conjunto["opcoes"]
+    parciais = extrair_parciais(df, conjunto["colunas"], opcoes["topk_aproximado"], opcoes["precisao_hll"])
+    return anexar(conjunto, hash_arquivo, nome_arquivo, parciais, descartadas)
+
+# Combina os agregados do novo arquivo com os do conjunto e grava o resultado; o custo
+# depende do tamanho do arquivo novo e dos agregados, não do histórico bruto
+def anexar(conjunto, hash_arquivo, nome_arquivo, parciais, linhas_descartadas=0):
+    datas = datas_parciais(parciais)
+    with _lock:
+        conjunto["parciais"] = combinar_parciais(conjunto["parciais"], parciais)
+        conjunto["datas"] = conjunto["datas"].union(datas)
+        conjunto["arquivos"].append({
+            "hash": hash_arquivo,
+            "nome": nome_arquivo,
+            "linhas": parciais["linhas"],
+            "linhas_descartadas": linhas_descartadas,
+            "inicio": datas.min() if len(datas) else None,
+            "fim": datas.max() if len(datas) else None,
+            "anexado_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        _salvar_conjunto(conjunto)
+    return conjunto
+
+# Resumo dos arquivos anexados, para exibição
+def resumo_arquivos(conjunto):
+    return pd.DataFrame([
+        {
+            "Arquivo": a["nome"],
+            "Linhas": a["linhas"],
+            "Descartadas": a["linhas_descartadas"],
+            "Início": a["inicio"].date() if a["inicio"] is not None else None,
+            "Fim": a["fim"].date() if a["fim"] is not None else None,
+            "Anexado em": a["anexado_em"],
+        }
+        for a in conjunto["arquivos"]
+    ])
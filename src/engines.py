@@ -0,0 +1,104 @@
+# Motores de cálculo das métricas: pandas (padrão), DuckDB (SQL) e Polars (plano lazy).
+# Os três produzem os mesmos agregados parciais, então as métricas coincidem.
+import time
+import pandas as pd
+import pyarrow.parquet as pq
+from src.aggregator import extrair_parciais
+from src.cache import CacheLRU
+from src.ingest import hash_upload, extensao, abrir_tabela_colunar, ler_upload
+from src.metrics import montar_metricas
+from src.polars_engine import polars_disponivel, ler_upload_polars, carregar_upload_polars
+from src.sql_engine import duckdb_disponivel, ler_upload_sql, carregar_upload_sql
+
+MOTORES_CALCULO = ["auto", "pandas", "duckdb", "polars"]
+# No modo auto, arquivos com pelo menos esta quantidade (estimada) de linhas saem do pandas
+LIMITE_LINHAS_MOTOR = 2_000_000
+# Formatos que DuckDB e Polars leem direto
+EXTENSOES_MOTORES = ["csv", "parquet", "feather", "arrow"]
+# Uploads (hash e motor) que um motor não conseguiu agregar: nos reruns vão direto para o pandas
+LIMITE_FALHAS_MOTOR = 256
+
+_falhas_motor = CacheLRU(LIMITE_FALHAS_MOTOR)
+
+def motor_disponivel(motor):
+    return {"pandas": True, "duckdb": duckdb_disponivel(), "polars": polars_disponivel()}.get(motor, False)
+
+# Quantidade de linhas estimada sem ler o arquivo inteiro (CSV: pela amostra do início)
+def estimar_linhas(arquivo):
+    formato = extensao(arquivo.name)
+    arquivo.seek(0)
+    if formato == "parquet":
+        linhas = pq.ParquetFile(arquivo).metadata.num_rows
+    elif formato == "csv":
+        amostra = arquivo.read(1024 * 1024)
+        linhas = int(arquivo.size * amostra.count(b"\n") / max(len(amostra), 1))
+    elif formato in ("feather", "arrow"):
+        linhas = abrir_tabela_colunar(arquivo)[0].num_rows
+    else:
+        linhas = 0
+    arquivo.seek(0)
+    return linhas
+
+# Motor efetivo: DuckDB e Polars só entram se instalados e para formatos que leem direto;
+# no auto, arquivos grandes vão para o primeiro disponível
+def escolher_motor_calculo(arquivo, motor="auto"):
+    if extensao(arquivo.name) not in EXTENSOES_MOTORES:
+        return "pandas"
+    if motor != "auto":
+        return motor if motor_disponivel(motor) else "pandas"
+    if estimar_linhas(arquivo) < LIMITE_LINHAS_MOTOR:
+        return "pandas"
+    return next((m for m in ("duckdb", "polars") if motor_disponivel(m)), "pandas")
+
+# Erros de leitura de cada motor que levam de volta ao pandas (ValueError: datas em formatos mistos)
+def _erros_motor(motor):
+    if motor == "duckdb":
+        import duckdb
+        return (ValueError, duckdb.Error)
+    if motor == "polars":
+        import polars as pl
+        return (ValueError, pl.exceptions.PolarsError)
+    return (ValueError,)
+
+# Agrega o upload com DuckDB ou Polars; devolve (carga, None) ou (None, motivo) quando o motor não
+# consegue ler o arquivo. A falha fica registrada pelo hash, para não repetir a tentativa a cada rerun
+def carregar_com_motor(arquivo, motor):
+    chave = f"{hash_upload(arquivo)}:{motor}"
+    falha = _falhas_motor.get(chave)
+    if falha is not None:
+        return None, falha
+    try:
+        carga = carregar_upload_sql(arquivo) if motor == "duckdb" else carregar_upload_polars(arquivo)
+    except _erros_motor(motor) as e:
+        falha = str(e) if isinstance(e, ValueError) else f"{motor} não conseguiu ler o arquivo ({type(e).__name__})."
+        _falhas_motor.put(chave, falha, tamanho=1)
+        return None, falha
+    return carga, None
+
+def _ler_pandas(arquivo, chave):
+    carga = ler_upload(arquivo, chave)
+    return {**carga, "parciais": extrair_parciais(carga["df"], carga["colunas"])}
+
+# Mede cada motor instalado sobre o mesmo arquivo, da leitura às métricas, sem os caches em memória
+def comparar_motores_calculo(arquivo):
+    chave = hash_upload(arquivo)
+    # O pandas vai por último: ele grava o cache em Parquet que os outros motores também leriam
+    leitores = {"duckdb": ler_upload_sql, "polars": ler_upload_polars, "pandas": _ler_pandas}
+    resultados = []
+    for motor, ler in leitores.items():
+        if not motor_disponivel(motor):
+            continue
+        inicio = time.perf_counter()
+        try:
+            carga = ler(arquivo, chave)
+        except _erros_motor(motor) if motor != "pandas" else () as e:
+            resultados.append({"Motor": f"{motor} (falhou: {type(e).__name__})", "Tempo (s)": None, "Linhas": None, "Total de vendas": None})
+            continue
+        metricas = montar_metricas(carga["parciais"], carga["colunas"])
+        resultados.append({
+            "Motor": motor,
+            "Tempo (s)": round(time.perf_counter() - inicio, 3),
+            "Linhas": metricas["linhas"],
+            "Total de vendas": metricas["total_vendas"],
+        })
+    return pd.DataFrame(resultados)
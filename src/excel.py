@@ -0,0 +1,84 @@
+# Leitura de planilhas XLSX: calamine (nativo) ou openpyxl em modo somente leitura
+import importlib.util
+import time
+import pandas as pd
+from openpyxl import load_workbook
+
+# Motores disponíveis; "openpyxl" é o caminho original, com o modelo de objetos completo
+MOTORES_XLSX = ["auto", "calamine", "openpyxl-streaming", "openpyxl"]
+# Abaixo deste tamanho a leitura completa com openpyxl já é rápida
+LIMITE_XLSX_STREAMING_MB = 2
+
+def calamine_disponivel():
+    return importlib.util.find_spec("python_calamine") is not None
+
+# Motor efetivo para o arquivo, considerando o tamanho e o que está instalado
+def escolher_motor(tamanho_bytes, motor="auto"):
+    if motor == "calamine" and not calamine_disponivel():
+        motor = "auto"
+    if motor != "auto":
+        return motor
+    if tamanho_bytes < LIMITE_XLSX_STREAMING_MB * 1024 * 1024:
+        return "openpyxl"
+    return "calamine" if calamine_disponivel() else "openpyxl-streaming"
+
+def _nomes_cabecalho(linha):
+    return [str(valor).strip() if valor is not None else f"Unnamed: {i}" for i, valor in enumerate(linha)]
+
+# Cabeçalho da primeira aba, lido em modo somente leitura
+def cabecalho_xlsx(buffer):
+    workbook = load_workbook(buffer, read_only=True, data_only=True)
+    try:
+        return _nomes_cabecalho(next(workbook.worksheets[0].iter_rows(values_only=True), ()))
+    finally:
+        workbook.close()
+
+# Percorre a primeira aba em modo somente leitura, sem montar o workbook inteiro.
+# `selecionar` recebe o cabeçalho e devolve os nomes de colunas a manter.
+def iterar_blocos_xlsx(buffer, tamanho_bloco, selecionar=None):
+    workbook = load_workbook(buffer, read_only=True, data_only=True)
+    try:
+        linhas = workbook.worksheets[0].iter_rows(values_only=True)
+        cabecalho = _nomes_cabecalho(next(linhas, ()))
+        nomes = selecionar(cabecalho) if selecionar else cabecalho
+        indices = [cabecalho.index(nome) for nome in nomes]
+        if not indices:
+            # Nenhuma coluna reconhecida: um bloco vazio, sem percorrer as linhas
+            yield pd.DataFrame()
+            return
+        valores = [[] for _ in indices]
+        for linha in linhas:
+            for destino, indice in zip(valores, indices):
+                destino.append(linha[indice] if indice < len(linha) else None)
+            if len(valores[0]) >= tamanho_bloco:
+                yield pd.DataFrame(dict(zip(nomes, valores)))
+                valores = [[] for _ in indices]
+        if valores[0]:
+            yield pd.DataFrame(dict(zip(nomes, valores)))
+    finally:
+        workbook.close()
+
+# Lê a primeira aba com o motor escolhido, apenas com as colunas selecionadas
+def ler_xlsx(buffer, motor, selecionar=None):
+    if motor == "openpyxl-streaming":
+        return pd.concat(list(iterar_blocos_xlsx(buffer, 100_000, selecionar)), ignore_index=True)
+    engine = "calamine" if motor == "calamine" else "openpyxl"
+    if selecionar is None:
+        return pd.read_excel(buffer, engine=engine, sheet_name=0)
+    cabecalho = pd.read_excel(buffer, engine=engine, sheet_name=0, nrows=0).columns.str.strip().tolist()
+    buffer.seek(0)
+    nomes = set(selecionar(cabecalho))
+    df = pd.read_excel(buffer, engine=engine, sheet_name=0, usecols=lambda c: str(c).strip() in nomes)
+    return df
+
+# Mede o tempo de leitura de cada motor instalado sobre o mesmo arquivo
+def comparar_motores_xlsx(arquivo):
+    resultados = []
+    for motor in MOTORES_XLSX[1:]:
+        if motor == "calamine" and not calamine_disponivel():
+            continue
+        arquivo.seek(0)
+        inicio = time.perf_counter()
+        df = ler_xlsx(arquivo, motor)
+        resultados.append({"Motor": motor, "Tempo (s)": round(time.perf_counter() - inicio, 3), "Linhas": len(df)})
+    return pd.DataFrame(resultados)
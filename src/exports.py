@@ -0,0 +1,57 @@
+# Exportação das tabelas do dashboard (CSV e XLSX) gerada só quando o download é pedido;
+# o arquivo pronto fica em cache pelo hash do conteúdo da tabela
+import importlib.util
+import io
+import pandas as pd
+from openpyxl import Workbook
+from src.cache import CacheLRU, hash_bytes
+
+ORCAMENTO_CACHE_EXPORTACOES_MB = 64
+
+_cache_exportacoes = CacheLRU(ORCAMENTO_CACHE_EXPORTACOES_MB * 1024 * 1024)
+
+def obter_cache_exportacoes():
+    return _cache_exportacoes
+
+def xlsxwriter_disponivel():
+    return importlib.util.find_spec("xlsxwriter") is not None
+
+# Hash do conteúdo da tabela (valores, nomes e tipos das colunas)
+def chave_tabela(df):
+    conteudo = pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()
+    return hash_bytes(conteudo + repr([(str(col), str(tipo)) for col, tipo in df.dtypes.items()]).encode("utf-8"))
+
+def _gerar_csv(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+# XLSX com xlsxwriter quando instalado; senão openpyxl em modo write_only, que grava as linhas
+# em fluxo sem montar o modelo de células da planilha
+def _gerar_xlsx(df):
+    output = io.BytesIO()
+    if xlsxwriter_disponivel():
+        with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+            df.to_excel(writer, index=False, sheet_name="Dados")
+        return output.getvalue()
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet("Dados")
+    aba.append([str(col) for col in df.columns])
+    valores = df.astype(object).where(df.notna(), None)
+    for linha in valores.itertuples(index=False, name=None):
+        aba.append(linha)
+    planilha.save(output)
+    return output.getvalue()
+
+_GERADORES = {"csv": _gerar_csv, "xlsx": _gerar_xlsx}
+
+# Bytes do arquivo exportado; gerados uma vez por conteúdo de tabela e formato
+def exportar_tabela(df, formato):
+    chave = f"{chave_tabela(df)}:{formato}"
+    dados = _cache_exportacoes.get(chave)
+    if dados is None:
+        dados = _GERADORES[formato](df)
+        _cache_exportacoes.put(chave, dados, tamanho=len(dados))
+    return dados
+
+# Função sem argumentos para o data= do st.download_button: nada é gerado até o clique
+def exportacao_sob_demanda(df, formato):
+    return lambda: exportar_tabela(df, formato)
@@ -0,0 +1,69 @@
+# Cache das figuras Plotly: a figura de um gráfico só é montada de novo quando o agregado que ela
+# desenha (ou os parâmetros do gráfico) mudam; reruns com os mesmos dados reaproveitam o objeto pronto
+import threading
+import time
+import numpy as np
+import pandas as pd
+from src.cache import CacheLRU, hash_bytes
+
+# Orçamento de memória das figuras guardadas (estimado pelos dados dos traços de cada figura)
+ORCAMENTO_CACHE_FIGURAS_MB = 64
+# Atributos dos traços que carregam os dados; o layout entra como um custo fixo por figura
+_ATRIBUTOS_DADOS = ("x", "y", "z", "text", "hovertext", "customdata", "values", "labels", "ids")
+_BYTES_LAYOUT = 16 * 1024
+_BYTES_POR_VALOR = 8
+
+_cache_figuras = CacheLRU(ORCAMENTO_CACHE_FIGURAS_MB * 1024 * 1024)
+_lock = threading.Lock()
+_tempos = {"construcao": 0.0, "economizado": 0.0}
+
+def obter_cache_figuras():
+    return _cache_figuras
+
+# Chave da figura: hash do conteúdo do agregado (valores, índice, nome e tipos) e dos parâmetros do gráfico
+def chave_figura(dados, parametros):
+    if isinstance(dados, (pd.Series, pd.DataFrame)):
+        conteudo = pd.util.hash_pandas_object(dados, index=True).to_numpy().tobytes()
+        tipos = repr((getattr(dados, "name", None), dados.index.name, str(getattr(dados, "dtype", None)), str(dados.index.dtype)))
+    else:
+        conteudo, tipos = repr(dados).encode("utf-8"), ""
+    return hash_bytes(conteudo + tipos.encode("utf-8") + repr(parametros).encode("utf-8"))
+
+# Tamanho aproximado da figura pelos arrays dos traços, sem serializá-la
+def tamanho_figura(figura):
+    total = _BYTES_LAYOUT
+    for traco in figura.data:
+        for atributo in _ATRIBUTOS_DADOS:
+            valores = traco[atributo] if atributo in traco else None
+            if valores is None or isinstance(valores, str):
+                continue
+            quantidade = np.size(valores) if isinstance(valores, np.ndarray) else len(valores)
+            total += max(getattr(valores, "nbytes", 0), quantidade * _BYTES_POR_VALOR)
+    return total
+
+# Devolve a figura guardada para o agregado ou a monta com `construir()` na primeira vez;
+# o tempo de montagem fica registrado para contabilizar o que cada acerto economiza
+def figura_em_cache(dados, parametros, construir):
+    chave = chave_figura(dados, parametros)
+    entrada = _cache_figuras.get(chave)
+    if entrada is not None:
+        with _lock:
+            _tempos["economizado"] += entrada["tempo"]
+        return entrada["figura"]
+    inicio = time.perf_counter()
+    figura = construir()
+    tempo = time.perf_counter() - inicio
+    with _lock:
+        _tempos["construcao"] += tempo
+    _cache_figuras.put(chave, {"figura": figura, "tempo": tempo}, tamanho=tamanho_figura(figura))
+    return figura
+
+# Acertos, falhas e tempos de montagem gastos e economizados
+def estatisticas_figuras():
+    with _lock:
+        tempos = dict(_tempos)
+    return {
+        **_cache_figuras.estatisticas(),
+        "tempo_construcao": tempos["construcao"],
+        "tempo_economizado": tempos["economizado"],
+    }
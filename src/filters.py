@@ -0,0 +1,94 @@
+# Filtros globais do dashboard (período, estado, canal, segmento): fatiam o cubo pré-agregado
+# e o índice de linhas, sem refiltrar nem reagrupar o DataFrame bruto
+import numpy as np
+import pandas as pd
+from src.aggregator import parciais_vazios, extrair_parciais, indexar_linhas, agregar_linhas
+from src.cache import CacheLRU
+from src.cube import MEDIDA_LINHAS, fatiar_cubo
+from src.metrics import chave_metricas
+
+# Dimensões oferecidas no painel de filtros (além do período)
+DIMENSOES_FILTRO = ['col_estado', 'col_canal_venda', 'col_segmento']
+
+# Orçamento de memória das bases de filtro (agregados completos + índice de linhas)
+ORCAMENTO_CACHE_FILTROS_MB = 512
+
+_cache_bases = CacheLRU(ORCAMENTO_CACHE_FILTROS_MB * 1024 * 1024)
+
+def obter_cache_filtros():
+    return _cache_bases
+
+# Base dos filtros: agregados do dataset inteiro e, quando o DataFrame está em memória, o índice de linhas.
+# Em streaming os agregados já vêm prontos em `parciais`.
+def preparar_base(hash_dataset, df, colunas, parciais=None, opcoes=None):
+    opcoes = opcoes or {}
+    chave = chave_metricas(hash_dataset, colunas, opcoes=opcoes)
+    base = _cache_bases.get(chave)
+    if base is None:
+        if parciais is None:
+            parciais = extrair_parciais(df, colunas, opcoes.get("topk_aproximado", False), opcoes.get("precisao_hll"))
+        base = {
+            'parciais': parciais,
+            'linhas': indexar_linhas(df, colunas, parciais) if df is not None else None,
+        }
+        _cache_bases.put(chave, base)
+    return base
+
+# Valores disponíveis para cada filtro: só colunas presentes no cubo podem ser filtradas
+def opcoes_filtros(base, colunas):
+    cubo = base['parciais'].get('cubo')
+    opcoes = {}
+    if cubo is None:
+        return opcoes
+    tabela = cubo['tabela']
+    col_data = cubo['data']
+    if col_data and pd.api.types.is_datetime64_any_dtype(tabela[col_data]) and tabela[col_data].notna().any():
+        opcoes['col_data'] = (tabela[col_data].min().date(), tabela[col_data].max().date())
+    for papel in DIMENSOES_FILTRO:
+        col = colunas.get(papel)
+        if col in cubo['dimensoes']:
+            opcoes[papel] = sorted(tabela[col].dropna().unique().tolist())
+    return opcoes
+
+# Valores aceitos pelo filtro de um papel (período inclusivo nas duas pontas)
+def _aceitos(valores, papel, filtro):
+    if papel == 'col_data':
+        inicio, fim = pd.Timestamp(filtro[0]), pd.Timestamp(filtro[1]) + pd.Timedelta(days=1)
+        return np.asarray((valores >= inicio) & (valores < fim))
+    return np.asarray(pd.Index(valores).isin(filtro))
+
+# Máscara sobre códigos: o filtro é avaliado uma vez por valor distinto e não por linha
+def _mascara_codigos(codigos, unicos, papel, filtro):
+    return np.append(_aceitos(unicos, papel, filtro), False)[codigos]
+
+def _mascara_cubo(cubo, colunas, filtros):
+    tabela = cubo['tabela']
+    mascara = np.ones(len(tabela), dtype=bool)
+    for papel, filtro in filtros.items():
+        serie = tabela[colunas[papel]]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            mascara &= _mascara_codigos(serie.cat.codes.to_numpy(), serie.cat.categories, papel, filtro)
+        else:
+            mascara &= _aceitos(serie, papel, filtro)
+    return mascara
+
+def _mascara_linhas(indice, colunas, filtros):
+    mascara = np.ones(len(indice['pesos']), dtype=bool)
+    for papel, filtro in filtros.items():
+        codigos, unicos = indice['filtros'][colunas[papel]]
+        mascara &= _mascara_codigos(codigos, unicos, papel, filtro)
+    return mascara
+
+# Agregados parciais restritos aos filtros: totais, série temporal e dimensões do cubo saem do
+# subcubo; as dimensões fora do cubo (clientes, produtos...) vêm do índice de linhas, se houver
+def filtrar_base(base, colunas, filtros):
+    parciais = base['parciais']
+    if not filtros:
+        return parciais
+    cubo = fatiar_cubo(parciais['cubo'], _mascara_cubo(parciais['cubo'], colunas, filtros))
+    filtrados = parciais_vazios()
+    filtrados['cubo'] = cubo
+    filtrados['linhas'] = int(cubo['tabela'][MEDIDA_LINHAS].sum())
+    if base['linhas'] is not None:
+        filtrados['por_dimensao'] = agregar_linhas(base['linhas'], _mascara_linhas(base['linhas'], colunas, filtros))
+    return filtrados
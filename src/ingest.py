@@ -0,0 +1,256 @@
+# Módulo de ingestão de arquivos com cache por hash do conteúdo
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src import parquet_cache
+from src.aggregator import parciais_vazios, extrair_parciais, combinar_parciais
+from src.cache import CacheLRU, hash_bytes
+from src.excel import escolher_motor, ler_xlsx, iterar_blocos_xlsx, cabecalho_xlsx
+from src.schema import obter_esquema, registrar_esquema, tipos_leitura_csv, nomes_cabecalho_csv
+from src.utils import (
+    converter_tipos, colunas_resolvidas, codificar_categorias, normalizar_financeiros, normalizar_chaves, inferir_formato_data
+)
+
+# Orçamento de memória do cache de uploads já processados
+ORCAMENTO_CACHE_UPLOADS_MB = 1024
+# Linhas por bloco na leitura em streaming
+TAMANHO_BLOCO_LINHAS = 200_000
+# CSVs acima deste tamanho são lidos em streaming automaticamente
+LIMITE_STREAMING_MB = 200
+
+# Extensões aceitas no upload
+EXTENSOES_TEXTO = ["csv", "xlsx"]
+EXTENSOES_COLUNARES = ["parquet", "feather", "arrow"]
+EXTENSOES_ACEITAS = EXTENSOES_TEXTO + EXTENSOES_COLUNARES
+
+_cache_uploads = CacheLRU(ORCAMENTO_CACHE_UPLOADS_MB * 1024 * 1024)
+# Hashes guardados por file_id (cada entrada conta 1 no orçamento do LRU)
+LIMITE_HASHES_UPLOAD = 256
+# Evita recalcular o hash do mesmo upload a cada rerun
+_hash_por_file_id = CacheLRU(LIMITE_HASHES_UPLOAD)
+
+def obter_cache_uploads():
+    return _cache_uploads
+
+# Hash do conteúdo do upload, reaproveitado enquanto o arquivo não muda
+def hash_upload(arquivo):
+    file_id = getattr(arquivo, "file_id", None)
+    chave = _hash_por_file_id.get(file_id) if file_id else None
+    if chave is not None:
+        return chave
+    with arquivo.getbuffer() as buffer:
+        chave = hash_bytes(buffer)
+    if file_id:
+        _hash_por_file_id.put(file_id, chave, tamanho=1)
+    return chave
+
+def extensao(nome):
+    return nome.lower().rsplit(".", 1)[-1]
+
+def eh_colunar(nome):
+    return extensao(nome) in EXTENSOES_COLUNARES
+
+# Leitura do arquivo de texto já podada para as colunas do esquema.
+# Retorna o DataFrame e o esquema do cabeçalho.
+def ler_arquivo(arquivo, nome, motor_xlsx="openpyxl"):
+    if nome.lower().endswith(".csv"):
+        esquema = obter_esquema(nomes_cabecalho_csv(arquivo))
+        df = pd.read_csv(arquivo, usecols=esquema["leitura"], dtype=tipos_leitura_csv(esquema))
+        return df, esquema
+    esquemas = []
+    def selecionar(cabecalho):
+        esquemas.append(obter_esquema(cabecalho))
+        return esquemas[0]["leitura"]
+    df = ler_xlsx(arquivo, motor_xlsx, selecionar=selecionar)
+    return df, esquemas[0]
+
+# Nomes do cabeçalho sem ler os dados, para reconciliar esquemas entre arquivos
+def nomes_cabecalho(arquivo):
+    arquivo.seek(0)
+    formato = extensao(arquivo.name)
+    if formato == "csv":
+        return nomes_cabecalho_csv(arquivo)
+    if formato == "xlsx":
+        nomes = cabecalho_xlsx(arquivo)
+    elif formato == "parquet":
+        nomes = pq.ParquetFile(arquivo).schema_arrow.names
+    else:
+        buffer = pa.py_buffer(arquivo.getbuffer())
+        try:
+            nomes = pa.ipc.open_file(buffer).schema.names
+        except pa.ArrowInvalid:
+            nomes = pa.ipc.open_stream(buffer).schema.names
+    arquivo.seek(0)
+    return nomes
+
+# Tabela Arrow do upload colunar; IPC/Feather é lido sem cópia a partir do buffer
+def abrir_tabela_colunar(arquivo):
+    arquivo.seek(0)
+    if extensao(arquivo.name) == "parquet":
+        fonte = pq.ParquetFile(arquivo)
+        esquema = obter_esquema(fonte.schema_arrow.names)
+        return fonte.read(columns=esquema["leitura"]), esquema
+    buffer = pa.py_buffer(arquivo.getbuffer())
+    try:
+        fonte = pa.ipc.open_file(buffer)
+    except pa.ArrowInvalid:
+        fonte = pa.ipc.open_stream(buffer)
+    esquema = obter_esquema(fonte.schema.names)
+    return fonte.read_all().select(esquema["leitura"]), esquema
+
+def _para_pandas(tabela):
+    df = tabela.to_pandas(split_blocks=True, self_destruct=True)
+    df.columns = df.columns.str.strip()
+    return df
+
+# Etapa de tipagem comum a todas as origens; layouts conhecidos já trazem o formato de data
+def _tipar(df, esquema, formato_data=None):
+    colunas = esquema["colunas"]
+    col_data = colunas['col_data']
+    formato_data = formato_data or esquema["formato_data"]
+    if formato_data is None and col_data and col_data in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col_data]):
+        formato_data = inferir_formato_data(df[col_data])
+    # Vendas ficam com normalizar_financeiros, que conta os valores que não puderam ser lidos
+    df = converter_tipos(df, col_data, None, formato_data)
+    df, invalidos = normalizar_financeiros(df, colunas)
+    df = normalizar_chaves(df, colunas)
+    return df, invalidos, formato_data
+
+# Lê, detecta colunas e converte tipos; o resultado fica em cache pelo hash do conteúdo
+# (em memória e, para CSV/XLSX, também em Parquet no disco)
+def carregar_upload(arquivo, motor_xlsx="auto"):
+    chave = hash_upload(arquivo)
+    entrada = _cache_uploads.get(chave)
+    if entrada is not None:
+        return {**entrada, "cache": True}
+    entrada = ler_upload(arquivo, chave, motor_xlsx)
+    _cache_uploads.put(chave, entrada)
+    return {**entrada, "cache": False}
+
+# Leitura e tipagem sem o cache em memória (usada também pelos processos de leitura paralela)
+def ler_upload(arquivo, chave, motor_xlsx="auto"):
+    inicio = time.perf_counter()
+    motor = None
+    esquema_conhecido = True
+    if parquet_cache.existe(chave) and not eh_colunar(arquivo.name):
+        colunas = parquet_cache.ler_colunas(chave)
+        df = normalizar_chaves(parquet_cache.carregar(chave, colunas_resolvidas(colunas)), colunas)
+        # As categorias já vêm codificadas do Parquet
+        df, economia = codificar_categorias(df, colunas)
+        invalidos = parquet_cache.ler_invalidos(chave)
+        origem = "disco"
+    else:
+        if eh_colunar(arquivo.name):
+            tabela, esquema = abrir_tabela_colunar(arquivo)
+            df = _para_pandas(tabela)
+            origem = "colunar"
+        else:
+            if extensao(arquivo.name) == "xlsx":
+                motor = escolher_motor(arquivo.size, motor_xlsx)
+            arquivo.seek(0)
+            df, esquema = ler_arquivo(arquivo, arquivo.name, motor)
+            df.columns = df.columns.str.strip()
+            origem = "arquivo"
+        colunas = esquema["colunas"]
+        esquema_conhecido = esquema["conhecido"]
+        df, invalidos, formato_data = _tipar(df, esquema)
+        df, economia = codificar_categorias(df, colunas)
+        if not esquema_conhecido:
+            registrar_esquema(esquema, df, formato_data)
+        if origem == "arquivo":
+            parquet_cache.salvar(chave, df, colunas, invalidos)
+    entrada = {
+        "hash": chave,
+        "df": df,
+        "colunas": colunas,
+        "origem": origem,
+        "esquema_conhecido": esquema_conhecido,
+        "motor_xlsx": motor,
+        "memoria_bytes": int(df.memory_usage(index=True, deep=True).sum()),
+        "memoria_economizada": economia,
+        "valores_invalidos": invalidos,
+        "tempo_leitura": time.perf_counter() - inicio,
+    }
+    return entrada
+
+def deve_usar_streaming(arquivo):
+    return arquivo.name.lower().endswith(".csv") and arquivo.size > LIMITE_STREAMING_MB * 1024 * 1024
+
+# Blocos já tipados do upload, vindos do cache em disco quando disponível
+def _iterar_blocos(arquivo, chave, tamanho_bloco):
+    if parquet_cache.existe(chave) and not eh_colunar(arquivo.name):
+        colunas = parquet_cache.ler_colunas(chave)
+        # Os inválidos da leitura original vêm com o primeiro bloco
+        invalidos = parquet_cache.ler_invalidos(chave)
+        for bloco in parquet_cache.iterar_blocos(chave, colunas_resolvidas(colunas), tamanho_bloco):
+            yield normalizar_chaves(bloco, colunas), colunas, invalidos
+            invalidos = {}
+        return
+    escritor = None
+    if eh_colunar(arquivo.name):
+        tabela, esquema = abrir_tabela_colunar(arquivo)
+        fonte = (_para_pandas(pa.Table.from_batches([lote])) for lote in tabela.to_batches(max_chunksize=tamanho_bloco))
+    else:
+        arquivo.seek(0)
+        if extensao(arquivo.name) == "xlsx":
+            esquemas = []
+            def selecionar(cabecalho):
+                esquemas.append(obter_esquema(cabecalho))
+                return esquemas[0]["leitura"]
+            fonte = iterar_blocos_xlsx(arquivo, tamanho_bloco, selecionar=selecionar)
+            esquema = None
+        else:
+            esquema = obter_esquema(nomes_cabecalho_csv(arquivo))
+            fonte = pd.read_csv(arquivo, usecols=esquema["leitura"], dtype=tipos_leitura_csv(esquema), chunksize=tamanho_bloco)
+        escritor = parquet_cache.EscritorParquet(chave)
+    formato_data = None
+    invalidos_total = {}
+    for bloco in fonte:
+        if esquema is None:
+            esquema = esquemas[0]
+        bloco.columns = bloco.columns.str.strip()
+        # O formato de data inferido no primeiro bloco vale para os seguintes
+        bloco, invalidos, formato_data = _tipar(bloco, esquema, formato_data)
+        for col, quantidade in invalidos.items():
+            invalidos_total[col] = invalidos_total.get(col, 0) + quantidade
+        if escritor is not None:
+            escritor.escrever(bloco)
+        yield bloco, esquema["colunas"], invalidos
+    if esquema is not None and not esquema["conhecido"] and formato_data is not None:
+        registrar_esquema(esquema, bloco, formato_data)
+    if escritor is not None:
+        if esquema is None:
+            escritor.descartar()
+        else:
+            escritor.concluir(esquema["colunas"], invalidos_total)
+
+# Lê o arquivo em blocos e mantém apenas os agregados parciais; o pico de memória
+# depende do tamanho do bloco e não do tamanho do arquivo
+def carregar_upload_em_blocos(arquivo, tamanho_bloco=TAMANHO_BLOCO_LINHAS, aproximado=False, precisao_hll=None):
+    chave = hash_upload(arquivo)
+    chave_cache = f"{chave}:blocos:{'aproximado' if aproximado else 'exato'}:hll-{precisao_hll or 0}"
+    entrada = _cache_uploads.get(chave_cache)
+    if entrada is not None:
+        return {**entrada, "cache": True}
+    inicio = time.perf_counter()
+    colunas = None
+    parciais = parciais_vazios()
+    blocos = 0
+    invalidos = {}
+    for bloco, colunas, invalidos_bloco in _iterar_blocos(arquivo, chave, tamanho_bloco):
+        parciais = combinar_parciais(parciais, extrair_parciais(bloco, colunas, aproximado, precisao_hll))
+        for col, quantidade in invalidos_bloco.items():
+            invalidos[col] = invalidos.get(col, 0) + quantidade
+        blocos += 1
+    entrada = {
+        "hash": chave,
+        "df": None,
+        "colunas": colunas or {},
+        "parciais": parciais,
+        "blocos": blocos,
+        "valores_invalidos": invalidos,
+        "tempo_leitura": time.perf_counter() - inicio,
+    }
+    _cache_uploads.put(chave_cache, entrada)
+    return {**entrada, "cache": False}
@@ -1,108 +1,143 @@
 # Módulo de métricas e agrupamentos para o dashboard
+import json
 import pandas as pd
+from src.aggregator import extrair_parciais
+from src.cache import CacheLRU, hash_bytes
+from src.cube import MEDIDA_LINHAS, rolar_cubo, rolar_dimensoes, total_cubo
+from src.sketches import HyperLogLog
+from src.timeseries import (
+    MESES, DIAS_SEMANA, serie_diaria, rolar_periodos, derivar_dimensoes_data, ordenar_cronologicamente, rotular_horas
+)
 
-def calcular_metricas(df, colunas):
+# Métricas de Top 5 e totais de distintos por dimensão
+TOP_DIMENSOES = {
+    'col_estado': ('top_estados', 'total_estados'),
+    'col_cliente': ('top_clientes', 'total_clientes'),
+    'col_produto': ('top_produtos', 'total_produtos'),
+    'col_vendedor': ('top_vendedores', 'total_vendedores'),
+}
+
+# Distribuições completas de vendas por dimensão
+DISTRIBUICOES = {
+    'col_estado': 'vendas_por_estado',
+    'col_canal_venda': 'vendas_por_canal',
+    'col_categoria_produto': 'vendas_por_categoria',
+    'col_mes': 'vendas_por_mes',
+    'col_dia_semana': 'vendas_por_dia_semana',
+    'col_forma_pagamento': 'vendas_por_pagamento',
+    'col_segmento': 'vendas_por_segmento',
+}
+
+# Totais financeiros
+SOMAS = {
+    'col_vendas': 'total_vendas',
+    'col_receita_bruta': 'receita_bruta',
+    'col_receita_liquida': 'receita_liquida',
+    'col_impostos': 'total_impostos',
+    'col_lucro_bruto': 'lucro_bruto',
+    'col_lucro_liquido': 'lucro_liquido',
+}
+
+# Orçamento de memória do cache de métricas, compartilhado entre sessões
+ORCAMENTO_CACHE_METRICAS_MB = 256
+
+_cache_metricas = CacheLRU(ORCAMENTO_CACHE_METRICAS_MB * 1024 * 1024)
+
+def obter_cache_metricas():
+    return _cache_metricas
+
+def calcular_metricas(df, colunas, aproximado=False, precisao_hll=None):
+    return montar_metricas(extrair_parciais(df, colunas, aproximado, precisao_hll), colunas)
+
+# Chave do cache: conteúdo do dataset, mapeamento de colunas, estado dos filtros e opções de cálculo
+def chave_metricas(hash_dataset, colunas, filtros=None, opcoes=None):
+    assinatura = json.dumps([hash_dataset, colunas, filtros, opcoes], sort_keys=True, default=str)
+    return hash_bytes(assinatura.encode("utf-8"))
+
+# Devolve as métricas memorizadas ou as calcula com `calcular()` na primeira vez
+def metricas_em_cache(hash_dataset, colunas, calcular, filtros=None, opcoes=None):
+    chave = chave_metricas(hash_dataset, colunas, filtros, opcoes)
+    resultados = _cache_metricas.get(chave)
+    if resultados is None:
+        resultados = calcular()
+        _cache_metricas.put(chave, resultados)
+    return resultados
+
+# Totais, série por data e distribuições: roll-ups do cubo somados aos agregados mantidos fora dele
+def consultar_parciais(parciais):
+    somas = dict(parciais['somas'])
+    por_data = parciais['por_data']
+    por_dimensao = dict(parciais['por_dimensao'])
+    cubo = parciais.get('cubo')
+    if cubo is not None:
+        for papel in cubo['nomes']:
+            if papel != MEDIDA_LINHAS:
+                somas[papel] = total_cubo(cubo, papel)
+        por_dimensao.update(rolar_dimensoes(cubo))
+        if cubo['data']:
+            por_data = rolar_cubo(cubo, cubo['data'], 'col_vendas' if 'col_vendas' in cubo['nomes'] else MEDIDA_LINHAS)
+    return somas, por_data, por_dimensao
+
+# Monta as métricas do dashboard a partir dos agregados parciais
+def montar_metricas(parciais, colunas):
     # Inicializa variáveis
     resultados = {}
-    # Total de vendas
     col_vendas = colunas.get('col_vendas')
-    resultados['total_vendas'] = df[col_vendas].sum() if col_vendas and col_vendas in df.columns else None
-    # Número de dias
     col_data = colunas.get('col_data')
-    resultados['numero_dias'] = df[col_data].nunique() if col_data and col_data in df.columns else None
+    somas, por_data, por_dimensao = consultar_parciais(parciais)
+    # Tamanho do cubo frente às linhas brutas
+    resultados['linhas'] = parciais['linhas']
+    resultados['celulas_cubo'] = len(parciais['cubo']['tabela']) if parciais.get('cubo') is not None else None
+    # Totais financeiros
+    for papel, chave in SOMAS.items():
+        resultados[chave] = somas.get(papel)
+    # Número de dias
+    resultados['numero_dias'] = len(por_data) if por_data is not None else None
     # Vendas por dia
     if resultados['total_vendas'] is not None and resultados['numero_dias']:
         resultados['vendas_por_dia'] = resultados['total_vendas'] / resultados['numero_dias']
     else:
         resultados['vendas_por_dia'] = None
-    # Top estados
-    col_estado = colunas.get('col_estado')
-    if col_estado and col_vendas and col_estado in df.columns and col_vendas in df.columns:
-        resultados['top_estados'] = df.groupby(col_estado)[col_vendas].sum().nlargest(5)
-        resultados['total_estados'] = len(df[col_estado].dropna().unique())
-    else:
-        resultados['top_estados'] = None
-        resultados['total_estados'] = None
-    # Top clientes
-    col_cliente = colunas.get('col_cliente')
-    if col_cliente and col_vendas and col_cliente in df.columns and col_vendas in df.columns:
-        resultados['top_clientes'] = df.groupby(col_cliente)[col_vendas].sum().nlargest(5)
-        resultados['total_clientes'] = len(df[col_cliente].dropna().unique())
-    else:
-        resultados['top_clientes'] = None
-        resultados['total_clientes'] = None
-    # Top produtos
-    col_produto = colunas.get('col_produto')
-    if col_produto and col_vendas and col_produto in df.columns and col_vendas in df.columns:
-        resultados['top_produtos'] = df.groupby(col_produto)[col_vendas].sum().nlargest(5)
-        resultados['total_produtos'] = len(df[col_produto].dropna().unique())
-    else:
-        resultados['top_produtos'] = None
-        resultados['total_produtos'] = None
-    # Top vendedores
-    col_vendedor = colunas.get('col_vendedor')
-    if col_vendedor and col_vendas and col_vendedor in df.columns and col_vendas in df.columns:
-        resultados['top_vendedores'] = df.groupby(col_vendedor)[col_vendas].sum().nlargest(5)
-        resultados['total_vendedores'] = len(df[col_vendedor].dropna().unique())
-    else:
-        resultados['top_vendedores'] = None
-        resultados['total_vendedores'] = None
-    # Vendas por canal
-    col_canal_venda = colunas.get('col_canal_venda')
-    if col_canal_venda and col_vendas and col_canal_venda in df.columns and col_vendas in df.columns:
-        resultados['vendas_por_canal'] = df.groupby(col_canal_venda)[col_vendas].sum()
-    else:
-        resultados['vendas_por_canal'] = None
-    # Vendas por categoria
-    col_categoria_produto = colunas.get('col_categoria_produto')
-    if col_categoria_produto and col_vendas and col_categoria_produto in df.columns and col_vendas in df.columns:
-        resultados['vendas_por_categoria'] = df.groupby(col_categoria_produto)[col_vendas].sum()
-    else:
-        resultados['vendas_por_categoria'] = None
-    # Vendas por mês
-    col_mes = colunas.get('col_mes')
-    if col_mes and col_vendas and col_mes in df.columns and col_vendas in df.columns:
-        resultados['vendas_por_mes'] = df.groupby(col_mes)[col_vendas].sum()
-    else:
-        resultados['vendas_por_mes'] = None
-    # Vendas por dia da semana
-    col_dia_semana = colunas.get('col_dia_semana')
-    if col_dia_semana and col_vendas and col_dia_semana in df.columns and col_vendas in df.columns:
-        resultados['vendas_por_dia_semana'] = df.groupby(col_dia_semana)[col_vendas].sum()
-    else:
-        resultados['vendas_por_dia_semana'] = None
-    # Receita bruta/liquida
-    col_receita_bruta = colunas.get('col_receita_bruta')
-    col_receita_liquida = colunas.get('col_receita_liquida')
-    resultados['receita_bruta'] = df[col_receita_bruta].sum() if col_receita_bruta and col_receita_bruta in df.columns else None
-    resultados['receita_liquida'] = df[col_receita_liquida].sum() if col_receita_liquida and col_receita_liquida in df.columns else None
-    # Total impostos
-    col_impostos = colunas.get('col_impostos')
-    resultados['total_impostos'] = df[col_impostos].sum() if col_impostos and col_impostos in df.columns else None
-    # Lucro bruto
-    col_lucro_bruto = colunas.get('col_lucro_bruto')
-    resultados['lucro_bruto'] = df[col_lucro_bruto].sum() if col_lucro_bruto and col_lucro_bruto in df.columns else None
-    # Lucro líquido
-    col_lucro_liquido = colunas.get('col_lucro_liquido')
-    resultados['lucro_liquido'] = df[col_lucro_liquido].sum() if col_lucro_liquido and col_lucro_liquido in df.columns else None
-    # Vendas por forma de pagamento
-    col_forma_pagamento = colunas.get('col_forma_pagamento')
-    if col_forma_pagamento and col_vendas and col_forma_pagamento in df.columns and col_vendas in df.columns:
-        resultados['vendas_por_pagamento'] = df.groupby(col_forma_pagamento)[col_vendas].sum()
-    else:
-        resultados['vendas_por_pagamento'] = None
-
-    # Vendas por segmento
-    col_segmento = colunas.get('col_segmento')
-    if col_segmento and col_vendas and col_segmento in df.columns and col_vendas in df.columns:
-        resultados['vendas_por_segmento'] = df.groupby(col_segmento)[col_vendas].sum()
-    else:
-        resultados['vendas_por_segmento'] = None
+    # Top 5 (exato ou pelo sketch Space-Saving) e total de distintos (exato ou HyperLogLog)
+    resultados['topk_aproximado'] = bool(parciais['top_k'])
+    resultados['erro_topk'] = {}
+    resultados['erro_distintos'] = {}
+    for papel, (chave_top, chave_total) in TOP_DIMENSOES.items():
+        sketch = parciais['top_k'].get(papel)
+        vendas_por_valor = por_dimensao.get(papel)
+        if sketch is not None:
+            resultados[chave_top] = sketch.top(5, nome=col_vendas, nome_indice=colunas.get(papel))
+            resultados['erro_topk'][chave_top] = sketch.erro_maximo(5)
+        else:
+            resultados[chave_top] = vendas_por_valor.nlargest(5) if vendas_por_valor is not None else None
+        distintos = parciais['distintos'].get(papel)
+        if isinstance(distintos, HyperLogLog):
+            resultados[chave_total] = distintos.estimativa()
+            resultados['erro_distintos'][chave_total] = distintos.erro_relativo()
+        elif distintos is not None:
+            resultados[chave_total] = len(distintos)
+        else:
+            resultados[chave_total] = len(vendas_por_valor) if vendas_por_valor is not None else None
+    # Distribuições por dimensão
+    for papel, chave in DISTRIBUICOES.items():
+        resultados[chave] = por_dimensao.get(papel)
+    # Mês e dia da semana em ordem de calendário; a hora sai da dimensão de hora do cubo. Sem essas
+    # colunas no arquivo, derivados da série por data
+    resultados['vendas_por_mes'] = ordenar_cronologicamente(resultados['vendas_por_mes'], MESES)
+    resultados['vendas_por_dia_semana'] = ordenar_cronologicamente(resultados['vendas_por_dia_semana'], DIAS_SEMANA)
+    resultados['vendas_por_hora'] = rotular_horas(por_dimensao.get('col_hora'))
+    if por_data is not None and 'col_vendas' in somas:
+        for papel, serie in derivar_dimensoes_data(por_data).items():
+            chave = DISTRIBUICOES.get(papel, 'vendas_por_hora')
+            if resultados[chave] is None:
+                resultados[chave] = serie
 
-    # Agrupamento semanal
-    if col_data and col_vendas and col_data in df.columns and col_vendas in df.columns:
-        resultados['df_semanal'] = df.set_index(col_data).resample("W")[col_vendas].sum()
+    # Série diária agregada uma vez; semana, mês, trimestre, ano etc. são roll-ups dela
+    if por_data is not None and 'col_vendas' in somas:
+        resultados['vendas_por_periodo'] = rolar_periodos(serie_diaria(por_data))
+        resultados['df_semanal'] = resultados['vendas_por_periodo'].get('Semana')
     else:
+        resultados['vendas_por_periodo'] = None
         resultados['df_semanal'] = None
 
     # Dados suficientes para relatório
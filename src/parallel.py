@@ -0,0 +1,114 @@
+# Upload de vários arquivos: leitura e tipagem em processos paralelos, esquemas reconciliados
+# por papel e resultados reduzidos a agregados parciais combinados
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+import multiprocessing
+import pandas as pd
+from src.aggregator import parciais_vazios, extrair_parciais, combinar_parciais
+from src.cache import hash_bytes
+from src.ingest import hash_upload, nomes_cabecalho, ler_upload, obter_cache_uploads
+from src.schema import obter_esquema
+
+_executor = None
+
+# Pool reaproveitado entre reruns; "spawn" evita herdar as threads do servidor do Streamlit
+def obter_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+# Upload em memória com a interface usada pela ingestão (nome, tamanho, getbuffer)
+class ArquivoEmMemoria(io.BytesIO):
+    def __init__(self, dados, nome):
+        super().__init__(dados)
+        self.name = nome
+        self.size = len(dados)
+
+# Colunas comuns aos arquivos: cada papel usa o nome do primeiro arquivo em que foi detectado
+def reconciliar_colunas(lista_colunas):
+    canonicas = {}
+    for colunas in lista_colunas:
+        for papel, col in colunas.items():
+            if not canonicas.get(papel):
+                canonicas[papel] = col
+    return canonicas
+
+# Executado em um processo de leitura: lê, tipa, leva cada papel à sua coluna canônica e
+# devolve só os agregados parciais (bem menores que o DataFrame)
+def processar_arquivo(dados, nome, chave, motor_xlsx, canonicas, aproximado, precisao_hll):
+    inicio = time.perf_counter()
+    carga = ler_upload(ArquivoEmMemoria(dados, nome), chave, motor_xlsx)
+    colunas = carga["colunas"]
+    # Uma coluna por papel, com o nome canônico: a mesma coluna de origem pode atender a vários
+    # papéis (Receita_Bruta como vendas e como receita bruta), o que um rename não comporta
+    df = pd.DataFrame({
+        canonicas[papel]: carga["df"][col] for papel, col in colunas.items() if col and canonicas.get(papel)
+    }, index=carga["df"].index)
+    colunas_arquivo = {papel: (col if colunas.get(papel) else None) for papel, col in canonicas.items()}
+    return {
+        "nome": nome,
+        "hash": chave,
+        "linhas": len(df),
+        "tempo_leitura": carga["tempo_leitura"],
+        "tempo_total": time.perf_counter() - inicio,
+        "valores_invalidos": carga["valores_invalidos"],
+        "ausentes": [papel for papel, col in canonicas.items() if col and not colunas.get(papel)],
+        "parciais": extrair_parciais(df, colunas_arquivo, aproximado, precisao_hll),
+    }
+
+# Lê vários uploads em paralelo e combina os agregados. Arquivos já processados com o mesmo
+# esquema e as mesmas opções vêm do cache e não voltam ao pool.
+def carregar_varios(arquivos, motor_xlsx="auto", aproximado=False, precisao_hll=None):
+    inicio = time.perf_counter()
+    cache = obter_cache_uploads()
+    unicos = {hash_upload(arquivo): arquivo for arquivo in arquivos}
+    canonicas = reconciliar_colunas(obter_esquema(nomes_cabecalho(arquivo))["colunas"] for arquivo in unicos.values())
+    opcoes = f"{'aproximado' if aproximado else 'exato'}:hll-{precisao_hll or 0}:{hash_bytes(repr(sorted(canonicas.items())).encode('utf-8'))}"
+    resultados = {}
+    pendentes = {}
+    for chave, arquivo in unicos.items():
+        resultado = cache.get(f"{chave}:parciais:{opcoes}")
+        if resultado is not None:
+            resultados[chave] = {**resultado, "cache": True}
+            continue
+        pendentes[chave] = obter_executor().submit(
+            processar_arquivo, bytes(arquivo.getbuffer()), arquivo.name, chave, motor_xlsx, canonicas, aproximado, precisao_hll
+        )
+    for chave, futuro in pendentes.items():
+        resultado = futuro.result()
+        cache.put(f"{chave}:parciais:{opcoes}", resultado)
+        resultados[chave] = {**resultado, "cache": False}
+    ordenados = [resultados[chave] for chave in unicos]
+    invalidos = {}
+    for resultado in ordenados:
+        for col, quantidade in resultado["valores_invalidos"].items():
+            invalidos[col] = invalidos.get(col, 0) + quantidade
+    return {
+        "hash": hash_bytes("\x1f".join(sorted(unicos)).encode("utf-8")),
+        "df": None,
+        "colunas": canonicas,
+        "parciais": reduce(combinar_parciais, (r["parciais"] for r in ordenados), parciais_vazios()),
+        "arquivos": ordenados,
+        "duplicados": len(arquivos) - len(unicos),
+        "valores_invalidos": invalidos,
+        "tempo_leitura": time.perf_counter() - inicio,
+        "cache": all(r["cache"] for r in ordenados),
+    }
+
+# Tempo e linhas de cada arquivo, para exibição
+def resumo_leitura(carga):
+    return pd.DataFrame([
+        {
+            "Arquivo": r["nome"],
+            "Linhas": r["linhas"],
+            "Leitura (s)": round(r["tempo_leitura"], 3),
+            "Total no processo (s)": round(r["tempo_total"], 3),
+            "Colunas ausentes": ", ".join(r["ausentes"]),
+            "Cache": "sim" if r["cache"] else "não",
+        }
+        for r in carga["arquivos"]
+    ])
@@ -0,0 +1,153 @@
+# Cache em disco dos uploads já convertidos, em Parquet, indexado pelo hash do conteúdo
+import json
+import os
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DIRETORIO_CACHE = Path(__file__).resolve().parent.parent / ".cache" / "uploads"
+# Orçamento do cache em disco; acima dele saem os uploads usados há mais tempo (pelo mtime)
+ORCAMENTO_CACHE_DISCO_MB = 4096
+
+def _caminho_parquet(chave):
+    return DIRETORIO_CACHE / f"{chave}.parquet"
+
+def _caminho_colunas(chave):
+    return DIRETORIO_CACHE / f"{chave}.json"
+
+def _caminho_invalidos(chave):
+    return DIRETORIO_CACHE / f"{chave}.invalidos.json"
+
+# Marca o uso do Parquet: o mtime é a ordem de remoção do orçamento
+def _tocar(chave):
+    try:
+        os.utime(_caminho_parquet(chave))
+    except OSError:
+        pass
+
+# Caminho do Parquet para leitores externos (DuckDB, Polars), contando como uso
+def caminho(chave):
+    _tocar(chave)
+    return _caminho_parquet(chave)
+
+# Apaga o Parquet e os arquivos de colunas e inválidos que o acompanham
+def remover(chave):
+    for arquivo in (_caminho_parquet(chave), _caminho_colunas(chave), _caminho_invalidos(chave)):
+        try:
+            arquivo.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+# Remove os uploads menos usados até o cache caber no orçamento; `manter` é o que acabou de ser gravado
+def aplicar_orcamento(manter=None):
+    entradas = []
+    for arquivo in DIRETORIO_CACHE.glob("*.parquet"):
+        try:
+            estado = arquivo.stat()
+        except OSError:
+            continue
+        entradas.append((estado.st_mtime, estado.st_size, arquivo.stem))
+    uso = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, chave in sorted(entradas):
+        if uso <= ORCAMENTO_CACHE_DISCO_MB * 1024 * 1024:
+            break
+        if chave != manter:
+            remover(chave)
+            uso -= tamanho
+
+def existe(chave):
+    return _caminho_parquet(chave).exists() and _caminho_colunas(chave).exists()
+
+def ler_colunas(chave):
+    with open(_caminho_colunas(chave), encoding="utf-8") as f:
+        return json.load(f)
+
+# Valores financeiros inválidos da leitura original; o Parquet já guarda os números convertidos
+def ler_invalidos(chave):
+    try:
+        with open(_caminho_invalidos(chave), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _salvar_json(caminho, conteudo):
+    temporario = caminho.with_suffix(".json.tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(conteudo, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+def _salvar_colunas(chave, colunas, invalidos=None):
+    _salvar_json(_caminho_invalidos(chave), {col: int(quantidade) for col, quantidade in (invalidos or {}).items()})
+    _salvar_json(_caminho_colunas(chave), colunas)
+
+# Grava o DataFrame já tipado; falhas de gravação apenas deixam de alimentar o cache
+def salvar(chave, df, colunas, invalidos=None):
+    try:
+        DIRETORIO_CACHE.mkdir(parents=True, exist_ok=True)
+        temporario = _caminho_parquet(chave).with_suffix(".parquet.tmp")
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temporario)
+        os.replace(temporario, _caminho_parquet(chave))
+        _salvar_colunas(chave, colunas, invalidos)
+        aplicar_orcamento(manter=chave)
+        return True
+    except Exception:
+        return False
+
+# Lê somente as colunas resolvidas, com memory map do arquivo
+def carregar(chave, nomes_colunas=None):
+    tabela = pq.read_table(caminho(chave), columns=nomes_colunas, memory_map=True)
+    return tabela.to_pandas(split_blocks=True, self_destruct=True)
+
+# Percorre o Parquet em blocos de linhas
+def iterar_blocos(chave, nomes_colunas, tamanho_bloco):
+    arquivo = pq.ParquetFile(caminho(chave), memory_map=True)
+    for lote in arquivo.iter_batches(batch_size=tamanho_bloco, columns=nomes_colunas):
+        yield lote.to_pandas()
+
+# Grava blocos sucessivos em um único Parquet durante a leitura em streaming
+class EscritorParquet:
+    def __init__(self, chave):
+        self.chave = chave
+        self.ativo = True
+        self._escritor = None
+        self._schema = None
+        self._temporario = _caminho_parquet(chave).with_suffix(".parquet.tmp")
+
+    def escrever(self, df):
+        if not self.ativo:
+            return
+        try:
+            if self._escritor is None:
+                DIRETORIO_CACHE.mkdir(parents=True, exist_ok=True)
+                tabela = pa.Table.from_pandas(df, preserve_index=False)
+                self._schema = tabela.schema
+                self._escritor = pq.ParquetWriter(self._temporario, self._schema)
+            else:
+                tabela = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            self._escritor.write_table(tabela)
+        except Exception:
+            # Tipos divergentes entre blocos: desiste do cache deste arquivo
+            self.descartar()
+
+    def concluir(self, colunas, invalidos=None):
+        if not self.ativo or self._escritor is None:
+            return False
+        try:
+            self._escritor.close()
+            os.replace(self._temporario, _caminho_parquet(self.chave))
+            _salvar_colunas(self.chave, colunas, invalidos)
+            aplicar_orcamento(manter=self.chave)
+            return True
+        except Exception:
+            self.descartar()
+            return False
+
+    def descartar(self):
+        self.ativo = False
+        if self._escritor is not None:
+            try:
+                self._escritor.close()
+            except Exception:
+                pass
+        if self._temporario.exists():
+            self._temporario.unlink()
@@ -0,0 +1,236 @@
+# Motor Polars: leitura, tipagem e agregados parciais em um único plano lazy. Só as colunas
+# resolvidas são lidas (projeção no scan), as agregações rodam em todos os núcleos e apenas os
+# resultados pequenos (cubo e distribuições) voltam ao pandas para montar_metricas.
+import importlib.util
+import io
+import time
+import pandas as pd
+from src import parquet_cache
+from src.aggregator import parciais_vazios, planejar_agregados, escolher_dimensoes_cubo
+from src.cube import MEDIDA_LINHAS, DIMENSAO_HORA, HORAS_DIA, materializar_grupos, ordenar_por_indice
+from src.ingest import hash_upload, extensao, eh_colunar, nomes_cabecalho, obter_cache_uploads
+from src.schema import obter_esquema
+from src.utils import FORMATOS_DATA, COLUNAS_FINANCEIRAS, inferir_formato_data, canonizar_chaves
+
+# Linhas do início do arquivo usadas para inferir o formato das datas
+LINHAS_AMOSTRA_DATAS = 50_000
+
+def polars_disponivel():
+    return importlib.util.find_spec("polars") is not None
+
+# Formato strftime do pandas no dialeto do Polars (frações de segundo)
+def _formato_polars(formato):
+    return formato.replace(".%f", "%.f")
+
+# Mesma normalização de converter_numero_br ("R$ 1.234,56", "(1.234,56)", "1234.56")
+def _numero_br(expressao):
+    import polars as pl
+    limpo = expressao.str.strip_chars().str.replace_all("[R$\\s\u00a0]", "")
+    negativo = limpo.str.starts_with("(") & limpo.str.ends_with(")")
+    textos = limpo.str.strip_chars("()")
+    # Milhar americano ("1,234.56"): remove as vírgulas; vírgula antes de ponto fora dele fica inválida
+    textos = (
+        pl.when(textos.str.contains("^-?\\d{1,3}((,\\d{3})+\\.\\d+|(,\\d{3}){2,})$"))
+        .then(textos.str.replace_all(",", "", literal=True))
+        .otherwise(textos)
+    )
+    ambiguo = textos.str.contains(",.*\\.")
+    # Vírgula decimal (padrão brasileiro) ou pontos apenas de milhar: remove os pontos
+    sem_pontos = (
+        pl.when(textos.str.contains(",", literal=True) | textos.str.contains("^-?\\d{1,3}(\\.\\d{3})+$"))
+        .then(textos.str.replace_all(".", "", literal=True))
+        .otherwise(textos)
+    )
+    numeros = sem_pontos.str.replace_all(",", ".", literal=True).cast(pl.Float64, strict=False)
+    numeros = pl.when(ambiguo).then(None).otherwise(numeros)
+    return pl.when(negativo).then(-numeros).otherwise(numeros)
+
+# Datas em texto: o formato inferido e depois os demais, na mesma ordem de converter_datas
+def _data(expressao, formato):
+    import polars as pl
+    formatos = [formato] + [f for f in FORMATOS_DATA if f != formato] if formato else FORMATOS_DATA
+    textos = expressao.str.strip_chars()
+    return pl.coalesce([textos.str.to_datetime(_formato_polars(f), strict=False, exact=True) for f in formatos])
+
+# Conversão de uma coluna financeira lida como texto, como converter_numero_br: a normalização
+# brasileira em todos os valores, com a coluna inteira quando todos são inteiros
+def _financeiro(fonte, nome):
+    import polars as pl
+    textos = pl.col(nome).str.strip_chars()
+    inteira = (
+        fonte.select(textos.drop_nulls().unique())
+        .filter(pl.col(nome) != "")
+        .select(pl.col(nome).str.contains("^[+-]?\\d+$").all())
+        .collect()
+        .item()
+    )
+    if inteira:
+        return textos.cast(pl.Int64, strict=False)
+    return _numero_br(pl.col(nome))
+
+# Scan lazy do upload (Parquet do cache em disco, Parquet/Arrow enviados ou CSV) já podado às
+# colunas do esquema, com os nomes sem espaços; devolve também as colunas resolvidas e o esquema
+def _abrir_fonte(arquivo, chave):
+    import polars as pl
+    if parquet_cache.existe(chave) and not eh_colunar(arquivo.name):
+        colunas = parquet_cache.ler_colunas(chave)
+        return pl.scan_parquet(parquet_cache.caminho(chave)), colunas, None
+    esquema = obter_esquema(nomes_cabecalho(arquivo))
+    arquivo.seek(0)
+    buffer = io.BytesIO(arquivo.getbuffer())
+    formato = extensao(arquivo.name)
+    if formato == "parquet":
+        fonte = pl.scan_parquet(buffer)
+    elif eh_colunar(arquivo.name):
+        fonte = pl.scan_ipc(buffer)
+    else:
+        # Data e colunas financeiras entram como texto: o tipo inferido pelo início do arquivo quebraria
+        # a leitura quando um "R$ 1.234,56" aparece adiante; a conversão fica com _tipar
+        papeis_texto = ["col_data"] + COLUNAS_FINANCEIRAS
+        resolvidas = {esquema["colunas"].get(papel) for papel in papeis_texto if esquema["colunas"].get(papel)}
+        textos = {nome: pl.Utf8 for nome in esquema["leitura"] if nome.strip() in resolvidas}
+        fonte = pl.scan_csv(buffer, schema_overrides=textos, infer_schema_length=10_000)
+    fonte = fonte.select([pl.col(nome).alias(nome.strip()) for nome in esquema["leitura"]])
+    return fonte.cache(), esquema["colunas"], esquema
+
+# Plano tipado: datas e valores financeiros em texto são convertidos só nos valores distintos
+# (como converter_datas e converter_numero_br) e ligados de volta por junção; para cada coluna
+# convertida uma coluna auxiliar marca os valores preenchidos que não puderam ser lidos
+def _tipar(fonte, colunas, esquema):
+    import polars as pl
+    tipos = fonte.collect_schema()
+    financeiras = {colunas.get(papel) for papel in COLUNAS_FINANCEIRAS if colunas.get(papel)}
+    col_data = colunas.get("col_data")
+    plano_tipado = fonte
+    convertidas = []
+    for nome, tipo in tipos.items():
+        original = pl.col(nome)
+        if nome == col_data and tipo == pl.Utf8:
+            amostra = fonte.select(original).head(LINHAS_AMOSTRA_DATAS).collect().to_series().to_pandas()
+            formato = (esquema or {}).get("formato_data") or inferir_formato_data(amostra.dropna().str.strip())
+            convertida = _data(original, formato)
+        elif nome == col_data and tipo == pl.Date:
+            plano_tipado = plano_tipado.with_columns(original.cast(pl.Datetime))
+            continue
+        elif nome in financeiras and tipo == pl.Utf8:
+            convertida = _financeiro(fonte, nome)
+        else:
+            continue
+        falha = original.is_not_null() & (original.str.strip_chars() != "") & convertida.is_null()
+        distintos = fonte.select(original.unique()).with_columns(
+            convertida.alias(f"__convertido_{nome}"), falha.alias(f"__falha_{nome}")
+        )
+        plano_tipado = (
+            plano_tipado.join(distintos, on=nome, how="left", nulls_equal=True)
+            .drop(nome)
+            .rename({f"__convertido_{nome}": nome})
+        )
+        convertidas.append(nome)
+    return plano_tipado, convertidas
+
+# Agregados parciais em duas passadas lazy: estatísticas (cardinalidades, valores não lidos)
+# e, com as dimensões do cubo escolhidas, o cubo e as dimensões restantes em um collect_all
+def _extrair_parciais_polars(plano_tipado, convertidas, colunas):
+    import polars as pl
+    tipos = plano_tipado.collect_schema()
+    plano = planejar_agregados(colunas, [nome for nome in tipos if not nome.startswith("__falha_")])
+    parciais = parciais_vazios()
+    col_vendas = plano['vendas']
+    col_data = plano['data']
+    inteiros = [col for col in plano['somas'].values() if tipos[col].is_integer()]
+    # A data entra no cubo pelo dia; com horários, a hora vira uma dimensão à parte
+    data_temporal = bool(col_data) and tipos[col_data] == pl.Datetime
+    estatisticas = plano_tipado.select(
+        [pl.len().alias("__linhas")]
+        + [pl.col(col).drop_nulls().n_unique().alias(f"__distintos_{col}") for col in plano['dimensoes']]
+        + [pl.col(col).count().alias(f"__preenchidos_{col}") for col in inteiros]
+        + ([pl.col(col_data).dt.truncate("1d").drop_nulls().n_unique().alias("__datas")] if data_temporal else [])
+        + ([(pl.col(col_data) != pl.col(col_data).dt.truncate("1d")).any().alias("__com_hora")] if data_temporal else [])
+        + ([pl.col(col_data).drop_nulls().n_unique().alias("__datas")] if col_data and not data_temporal else [])
+        + [pl.col(f"__falha_{nome}").sum().alias(f"__falhas_{nome}") for nome in convertidas]
+    ).collect().row(0, named=True)
+    if col_data and f"__falhas_{col_data}" in estatisticas and estatisticas[f"__falhas_{col_data}"]:
+        raise ValueError(f"{estatisticas[f'__falhas_{col_data}']} datas em formatos mistos na coluna {col_data}.")
+    invalidos = {col: 0 for col in plano['somas'].values()}
+    invalidos.update({nome: estatisticas[f"__falhas_{nome}"] for nome in convertidas if nome != col_data})
+    parciais['linhas'] = estatisticas["__linhas"]
+    cardinalidades = {col: estatisticas[f"__distintos_{col}"] for col in plano['dimensoes']}
+    com_hora = bool(estatisticas.get("__com_hora"))
+    no_cubo = escolher_dimensoes_cubo(
+        plano, cardinalidades, estatisticas["__datas"] * (HORAS_DIA if com_hora else 1) if col_data else None
+    )
+    # Medidas: contagem de linhas e colunas financeiras numéricas (vazios contam como zero)
+    medidas = {MEDIDA_LINHAS: pl.len()}
+    nomes = {MEDIDA_LINHAS: "count"}
+    tipos_medidas = {MEDIDA_LINHAS: "int64"}
+    for papel, col in plano['somas'].items():
+        medidas[papel] = pl.col(col).cast(pl.Float64).fill_null(0).sum()
+        nomes[papel] = col
+        inteiro = col in inteiros and estatisticas[f"__preenchidos_{col}"] == parciais['linhas']
+        tipos_medidas[papel] = "int64" if inteiro else "float64"
+    agregacoes = [expressao.alias(f"__m_{papel}") for papel, expressao in medidas.items()]
+    chaves = [pl.col(col) for col in no_cubo]
+    if com_hora:
+        chaves = [pl.col(col_data).dt.hour().alias(DIMENSAO_HORA)] + chaves
+    if col_data:
+        chaves = [pl.col(col_data).dt.truncate("1d") if data_temporal else pl.col(col_data)] + chaves
+    consultas = [plano_tipado.group_by(chaves).agg(agregacoes) if chaves else plano_tipado.select(agregacoes)]
+    fora_do_cubo = [col for col in plano['dimensoes'] if col not in no_cubo]
+    for col in fora_do_cubo:
+        consultas.append(
+            plano_tipado.filter(pl.col(col).is_not_null()).group_by(col).agg(medidas['col_vendas'].alias("__soma")).sort(col)
+        )
+    resultados = pl.collect_all(consultas)
+    tabela = resultados[0].to_pandas()
+    dimensoes_cubo = {col: plano['dimensoes'][col] for col in no_cubo}
+    if com_hora:
+        dimensoes_cubo = {DIMENSAO_HORA: ['col_hora'], **dimensoes_cubo}
+    # Chaves das dimensões na mesma forma canônica da leitura pelo pandas
+    for col in no_cubo:
+        tabela[col] = canonizar_chaves(tabela[col])
+    parciais['cubo'] = materializar_grupos(
+        tabela, ([col_data] if col_data else []) + list(dimensoes_cubo), {papel: f"__m_{papel}" for papel in medidas},
+        dimensoes_cubo, col_data, nomes, tipos_medidas
+    )
+    # Dimensões fora do cubo (alta cardinalidade)
+    for col, somas in zip(fora_do_cubo, resultados[1:]):
+        # Categóricas (Parquet do cache em disco) voltam como texto, como nas dimensões do pandas
+        chaves = somas[col].cast(pl.Utf8) if somas[col].dtype in (pl.Categorical, pl.Enum) else somas[col]
+        chaves = canonizar_chaves(chaves.to_pandas())
+        serie = pd.Series(somas["__soma"].to_numpy(), index=pd.Index(chaves, name=col), name=col_vendas)
+        serie = ordenar_por_indice(serie)
+        if tipos_medidas['col_vendas'] == "int64":
+            serie = serie.astype("int64")
+        for papel in plano['dimensoes'][col]:
+            parciais['por_dimensao'][papel] = serie
+    return parciais, invalidos
+
+# Carrega o upload pelo Polars e devolve só os agregados; o resultado fica no cache de uploads
+def carregar_upload_polars(arquivo):
+    chave = hash_upload(arquivo)
+    cache = obter_cache_uploads()
+    entrada = cache.get(f"{chave}:polars")
+    if entrada is not None:
+        return {**entrada, "cache": True}
+    entrada = ler_upload_polars(arquivo, chave)
+    cache.put(f"{chave}:polars", entrada)
+    return {**entrada, "cache": False}
+
+# Leitura e agregação pelo Polars sem o cache em memória (usada também na comparação de motores)
+def ler_upload_polars(arquivo, chave):
+    inicio = time.perf_counter()
+    fonte, colunas, esquema = _abrir_fonte(arquivo, chave)
+    plano_tipado, convertidas = _tipar(fonte, colunas, esquema)
+    parciais, invalidos = _extrair_parciais_polars(plano_tipado, convertidas, colunas)
+    if esquema is None:
+        # Parquet do cache em disco: os inválidos são os da leitura original
+        invalidos.update(parquet_cache.ler_invalidos(chave))
+    return {
+        "hash": chave,
+        "df": None,
+        "colunas": colunas,
+        "parciais": parciais,
+        "motor_calculo": "polars",
+        "valores_invalidos": invalidos,
+        "tempo_leitura": time.perf_counter() - inicio,
+    }
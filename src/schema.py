@@ -0,0 +1,100 @@
+# Cache persistente de esquemas: layouts de cabeçalho já vistos pulam detecção e inferência
+import json
+import os
+import threading
+from pathlib import Path
+import pandas as pd
+from src.cache import hash_bytes
+from src.utils import COLUNAS_FINANCEIRAS, detectar_colunas, colunas_resolvidas
+
+ARQUIVO_ESQUEMAS = Path(__file__).resolve().parent.parent / ".cache" / "esquemas.json"
+
+_esquemas = None
+_lock = threading.Lock()
+
+# Assinatura do layout: nomes e ordem exatos do cabeçalho
+def assinatura_cabecalho(nomes):
+    return hash_bytes("\x1f".join(str(nome) for nome in nomes).encode("utf-8"))
+
+def _carregar_esquemas():
+    global _esquemas
+    if _esquemas is None:
+        try:
+            with open(ARQUIVO_ESQUEMAS, encoding="utf-8") as f:
+                _esquemas = json.load(f)
+        except (OSError, ValueError):
+            _esquemas = {}
+    return _esquemas
+
+def _salvar_esquemas():
+    try:
+        # Preserva o que outros processos gravaram desde a última leitura
+        with open(ARQUIVO_ESQUEMAS, encoding="utf-8") as f:
+            _esquemas.update({k: v for k, v in json.load(f).items() if k not in _esquemas})
+    except (OSError, ValueError):
+        pass
+    try:
+        ARQUIVO_ESQUEMAS.parent.mkdir(parents=True, exist_ok=True)
+        # Temporário por processo: a leitura paralela pode registrar esquemas ao mesmo tempo
+        temporario = ARQUIVO_ESQUEMAS.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(_esquemas, f, ensure_ascii=False)
+        os.replace(temporario, ARQUIVO_ESQUEMAS)
+    except OSError:
+        pass
+
+# Esquema do cabeçalho: reaproveitado se o layout já foi visto, senão resolvido agora.
+# "leitura" guarda os nomes originais das colunas a ler (poda de colunas).
+def obter_esquema(nomes):
+    nomes = [str(nome) for nome in nomes]
+    assinatura = assinatura_cabecalho(nomes)
+    with _lock:
+        conhecido = _carregar_esquemas().get(assinatura)
+    if conhecido is not None:
+        return {**conhecido, "assinatura": assinatura, "conhecido": True}
+    nomes_limpos = {nome.strip(): nome for nome in nomes}
+    colunas = detectar_colunas(list(nomes_limpos))
+    return {
+        "assinatura": assinatura,
+        "colunas": colunas,
+        "leitura": [nomes_limpos[c] for c in colunas_resolvidas(colunas)],
+        "tipos": {},
+        "formato_data": None,
+        "conhecido": False,
+    }
+
+# Guarda os tipos escolhidos e o formato de data para as próximas cargas do mesmo layout
+def registrar_esquema(esquema, df, formato_data):
+    registro = {
+        "colunas": esquema["colunas"],
+        "leitura": esquema["leitura"],
+        "tipos": {col: str(df[col].dtype) for col in df.columns},
+        "formato_data": formato_data,
+    }
+    with _lock:
+        _carregar_esquemas()[esquema["assinatura"]] = registro
+        _salvar_esquemas()
+    return {**registro, "assinatura": esquema["assinatura"], "conhecido": True}
+
+# Tipos a passar direto ao leitor: dimensões que já se mostraram categóricas
+def tipos_leitura(esquema):
+    nomes_originais = {nome.strip(): nome for nome in esquema["leitura"]}
+    return {
+        nomes_originais[col]: "category"
+        for col, tipo in esquema["tipos"].items()
+        if tipo == "category" and col in nomes_originais
+    }
+
+# Tipos da leitura de CSV: data e colunas financeiras como texto, para que a conversão não dependa
+# do que o leitor inferiu em cada bloco, e as dimensões categóricas de tipos_leitura
+def tipos_leitura_csv(esquema):
+    colunas = esquema["colunas"]
+    textos = {colunas.get(papel) for papel in ['col_data'] + COLUNAS_FINANCEIRAS if colunas.get(papel)}
+    return {**tipos_leitura(esquema), **{nome: str for nome in esquema["leitura"] if nome.strip() in textos}}
+
+# Nomes do cabeçalho do CSV sem ler o restante do arquivo
+def nomes_cabecalho_csv(arquivo):
+    arquivo.seek(0)
+    nomes = pd.read_csv(arquivo, nrows=0).columns.tolist()
+    arquivo.seek(0)
+    return nomes
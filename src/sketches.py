@@ -0,0 +1,153 @@
+# Estruturas aproximadas de memória limitada para dados de alta cardinalidade
+import numpy as np
+import pandas as pd
+
+# Linhas por fatia ao alimentar os sketches a partir de um DataFrame inteiro
+TAMANHO_FATIA = 200_000
+
+# Space-Saving ponderado: mantém no máximo `capacidade` chaves com a soma estimada de vendas.
+# Para toda chave monitorada vale  contagem - erro <= valor real <= contagem,
+# e o erro de qualquer chave é no máximo total / capacidade.
+class SpaceSaving:
+    def __init__(self, capacidade=1000):
+        self.capacidade = capacidade
+        self.total = 0.0
+        self.contagens = pd.Series(dtype=float)
+        self.erros = pd.Series(dtype=float)
+
+    # Contagem atribuída a chaves fora do sketch (zero enquanto houver espaço livre)
+    def minimo(self):
+        if len(self.contagens) < self.capacidade:
+            return 0.0
+        return float(self.contagens.min())
+
+    # Incorpora somas já agregadas por chave (ex.: o resultado de um bloco)
+    def atualizar_agregado(self, somas):
+        somas = somas[somas > 0].astype(float)
+        bloco = SpaceSaving(self.capacidade)
+        bloco.contagens = somas
+        bloco.erros = pd.Series(0.0, index=somas.index)
+        bloco.total = float(somas.sum())
+        # O bloco é exato: chaves ausentes nele contribuem com zero
+        self._absorver(bloco, minimo_outro=0.0)
+        return self
+
+    # Incorpora pares (chave, peso) em fatias, sem materializar todas as chaves de uma vez;
+    # pesos negativos (devoluções) são ignorados
+    def atualizar(self, chaves, pesos, tamanho_fatia=TAMANHO_FATIA):
+        pesos = pd.Series(np.clip(np.nan_to_num(np.asarray(pesos, dtype=float)), 0, None), index=chaves.index)
+        for inicio in range(0, len(chaves), tamanho_fatia):
+            fatia = slice(inicio, inicio + tamanho_fatia)
+            somas = pesos.iloc[fatia].groupby(chaves.iloc[fatia], observed=True).sum()
+            if isinstance(somas.index, pd.CategoricalIndex):
+                somas.index = somas.index.astype(somas.index.categories.dtype)
+            self.atualizar_agregado(somas)
+        return self
+
+    # União de dois sketches (resumos combináveis): chaves ausentes em um lado
+    # recebem a contagem mínima daquele lado como contagem e como erro
+    def combinar(self, outro):
+        resultado = SpaceSaving(max(self.capacidade, outro.capacidade))
+        resultado.contagens, resultado.erros, resultado.total = self.contagens, self.erros, self.total
+        resultado._absorver(outro, minimo_outro=outro.minimo())
+        return resultado
+
+    def _absorver(self, outro, minimo_outro):
+        minimo_proprio = self.minimo()
+        chaves = self.contagens.index.union(outro.contagens.index)
+        contagens = self.contagens.reindex(chaves, fill_value=minimo_proprio) + outro.contagens.reindex(chaves, fill_value=minimo_outro)
+        erros = self.erros.reindex(chaves, fill_value=minimo_proprio) + outro.erros.reindex(chaves, fill_value=minimo_outro)
+        contagens = contagens.nlargest(self.capacidade)
+        self.contagens = contagens
+        self.erros = erros[contagens.index]
+        self.total += outro.total
+
+    # As n chaves de maior contagem estimada
+    def top(self, n=5, nome=None, nome_indice=None):
+        top = self.contagens.nlargest(n).rename(nome)
+        top.index.name = nome_indice
+        return top
+
+    # Maior erro possível entre as n primeiras chaves e o limite teórico total / capacidade
+    def erro_maximo(self, n=5):
+        if len(self.contagens) == 0:
+            return 0.0
+        return float(self.erros[self.contagens.nlargest(n).index].max())
+
+    def limite_erro(self):
+        return self.total / self.capacidade
+
+# Precisão padrão do HyperLogLog: 2^14 registradores, erro padrão de ~0,8%
+PRECISAO_HLL = 14
+
+# Quantidade de bits significativos de cada inteiro sem sinal (vetorizado)
+def _bit_length(valores):
+    valores = valores.copy()
+    comprimento = np.zeros(len(valores), dtype=np.uint8)
+    for deslocamento in (32, 16, 8, 4, 2, 1):
+        maiores = valores >= np.uint64(1 << deslocamento)
+        comprimento[maiores] += deslocamento
+        valores[maiores] >>= np.uint64(deslocamento)
+    comprimento += (valores > 0).astype(np.uint8)
+    return comprimento
+
+# Hash dos valores com os números numa forma canônica: um bloco com vazios lê a coluna numérica
+# como float, e 5 e 5.0 precisam cair no mesmo registrador para que blocos e arquivo inteiro coincidam
+def _hash_canonico(valores):
+    if pd.api.types.is_integer_dtype(valores.dtype):
+        valores = valores.astype(np.int64)
+    elif pd.api.types.is_float_dtype(valores.dtype):
+        numeros = valores.to_numpy(dtype=float)
+        inteiros = np.isfinite(numeros) & (numeros == np.round(numeros)) & (np.abs(numeros) < 2.0 ** 63)
+        hashes = np.empty(len(numeros), dtype=np.uint64)
+        hashes[inteiros] = pd.util.hash_array(numeros[inteiros].astype(np.int64))
+        hashes[~inteiros] = pd.util.hash_array(numeros[~inteiros])
+        return hashes
+    return pd.util.hash_pandas_object(valores, index=False).to_numpy()
+
+# HyperLogLog: contagem aproximada de distintos em memória fixa (2^precisao bytes).
+# Sketches com a mesma precisão se combinam pelo máximo de cada registrador.
+class HyperLogLog:
+    def __init__(self, precisao=PRECISAO_HLL):
+        self.precisao = precisao
+        self.registradores = np.zeros(1 << precisao, dtype=np.uint8)
+
+    # Incorpora os valores não nulos da série. Só os valores distintos são hasheados
+    # (em categóricas, apenas as categorias presentes), o que não altera o resultado;
+    # inteiros lidos como float têm o mesmo hash do int64, então o tipo de cada bloco não importa.
+    def atualizar(self, serie):
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            presentes = np.unique(serie.cat.codes.to_numpy())
+            valores = pd.Series(serie.cat.categories[presentes[presentes >= 0]])
+        else:
+            valores = pd.Series(serie.dropna().unique())
+        if len(valores) == 0:
+            return self
+        hashes = _hash_canonico(valores)
+        bits_resto = 64 - self.precisao
+        indices = (hashes >> np.uint64(bits_resto)).astype(np.int64)
+        resto = hashes & np.uint64((1 << bits_resto) - 1)
+        posicoes = (bits_resto - _bit_length(resto) + 1).astype(np.uint8)
+        np.maximum.at(self.registradores, indices, posicoes)
+        return self
+
+    def combinar(self, outro):
+        if outro.precisao != self.precisao:
+            raise ValueError("Sketches HyperLogLog com precisões diferentes não podem ser combinados.")
+        resultado = HyperLogLog(self.precisao)
+        resultado.registradores = np.maximum(self.registradores, outro.registradores)
+        return resultado
+
+    def estimativa(self):
+        m = len(self.registradores)
+        alfa = 0.7213 / (1 + 1.079 / m)
+        bruta = alfa * m * m / np.sum(np.ldexp(1.0, -self.registradores.astype(np.int64)))
+        zerados = int(np.count_nonzero(self.registradores == 0))
+        # Correção para cardinalidades pequenas (contagem linear)
+        if bruta <= 2.5 * m and zerados > 0:
+            return int(round(m * np.log(m / zerados)))
+        return int(round(bruta))
+
+    # Erro padrão relativo da estimativa
+    def erro_relativo(self):
+        return float(1.04 / np.sqrt(len(self.registradores)))
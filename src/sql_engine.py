@@ -0,0 +1,239 @@
+# Backend SQL embutido (DuckDB): os mesmos agregados parciais de extrair_parciais calculados por
+# consultas vetorizadas e multi-thread direto sobre o CSV/Parquet, sem montar um DataFrame pandas.
+# As métricas finais continuam saindo de montar_metricas, por isso coincidem com o backend pandas.
+import importlib.util
+import os
+import tempfile
+import time
+import pandas as pd
+from src import parquet_cache
+from src.aggregator import parciais_vazios, planejar_agregados, escolher_dimensoes_cubo
+from src.cube import MEDIDA_LINHAS, DIMENSAO_HORA, HORAS_DIA, materializar_grupos, ordenar_por_indice
+from src.ingest import hash_upload, eh_colunar, abrir_tabela_colunar, obter_cache_uploads
+from src.schema import obter_esquema, nomes_cabecalho_csv
+from src.utils import FORMATOS_DATA, COLUNAS_FINANCEIRAS, inferir_formato_data, canonizar_chaves
+
+def duckdb_disponivel():
+    return importlib.util.find_spec("duckdb") is not None
+
+def _id(nome):
+    return '"' + str(nome).replace('"', '""') + '"'
+
+def _texto(valor):
+    return "'" + str(valor).replace("'", "''") + "'"
+
+# Mesma normalização de converter_numero_br ("R$ 1.234,56", "(1.234,56)", "1234.56"), em SQL;
+# `limpo` é o texto já sem "R$" e espaços
+def _sql_numero_br(limpo):
+    sem_parenteses = f"trim({limpo}, '()')"
+    # Milhar americano ("1,234.56"): remove as vírgulas; vírgula antes de ponto fora dele fica inválida
+    sem_parenteses = (
+        f"CASE WHEN regexp_full_match({sem_parenteses}, '-?\\d{{1,3}}((,\\d{{3}})+\\.\\d+|(,\\d{{3}}){{2,}})') "
+        f"THEN replace({sem_parenteses}, ',', '') ELSE {sem_parenteses} END"
+    )
+    sem_milhar = (
+        f"CASE WHEN regexp_matches({sem_parenteses}, ',.*\\.') THEN NULL "
+        f"WHEN contains({sem_parenteses}, ',') OR regexp_full_match({sem_parenteses}, '-?\\d{{1,3}}(\\.\\d{{3}})+') "
+        f"THEN replace({sem_parenteses}, '.', '') ELSE {sem_parenteses} END"
+    )
+    numero = f"TRY_CAST(replace({sem_milhar}, ',', '.') AS DOUBLE)"
+    return f"CASE WHEN starts_with({limpo}, '(') AND ends_with({limpo}, ')') THEN -{numero} ELSE {numero} END"
+
+# Datas em texto: o formato inferido e depois os demais, na mesma ordem de converter_datas
+def _sql_data(expressao, formato):
+    formatos = [formato] + [f for f in FORMATOS_DATA if f != formato] if formato else FORMATOS_DATA
+    return "COALESCE(" + ", ".join(f"TRY_STRPTIME(trim({expressao}), {_texto(f)})" for f in formatos) + ")"
+
+# Abre a fonte do upload na conexão (Parquet do cache em disco, Arrow ou CSV em arquivo temporário)
+# e devolve a relação, as colunas resolvidas, o esquema e o arquivo temporário a remover
+def _abrir_fonte(con, arquivo, chave):
+    if parquet_cache.existe(chave) and not eh_colunar(arquivo.name):
+        colunas = parquet_cache.ler_colunas(chave)
+        caminho = str(parquet_cache.caminho(chave))
+        return f"read_parquet({_texto(caminho)})", colunas, None, None
+    if eh_colunar(arquivo.name):
+        tabela, esquema = abrir_tabela_colunar(arquivo)
+        con.register("fonte_arrow", tabela)
+        return "fonte_arrow", esquema["colunas"], esquema, None
+    esquema = obter_esquema(nomes_cabecalho_csv(arquivo))
+    temporario = tempfile.NamedTemporaryFile(suffix=".csv", delete=False)
+    with temporario, arquivo.getbuffer() as buffer:
+        temporario.write(buffer)
+    # Data e colunas financeiras entram como texto: o tipo deduzido pela amostra do início quebraria
+    # a leitura quando um "R$ 1.234,56" aparece adiante; a conversão fica com _criar_tabela_tipada.
+    # O dialeto é o do pandas.read_csv (vírgula, aspas duplas), sem depender do que a amostra mostra
+    papeis_texto = ["col_data"] + COLUNAS_FINANCEIRAS
+    resolvidas = {esquema["colunas"].get(papel) for papel in papeis_texto if esquema["colunas"].get(papel)}
+    textos = [nome for nome in esquema["leitura"] if nome.strip() in resolvidas]
+    tipos = ", types={" + ", ".join(f"{_texto(nome)}: 'VARCHAR'" for nome in textos) + "}" if textos else ""
+    return f"read_csv({_texto(temporario.name)}, header=true, delim=',', quote='\"', escape='\"'{tipos})", esquema["colunas"], esquema, temporario.name
+
+# Conversão de uma coluna financeira lida como texto, como converter_numero_br: a normalização
+# brasileira em todos os valores, com a coluna inteira quando todos são inteiros
+def _sql_financeiro(con, coluna):
+    inteira, = con.sql(
+        f"SELECT coalesce(bool_and(regexp_full_match(trim(v), '[+-]?\\d+')), true) "
+        f"FROM (SELECT DISTINCT {_id(coluna)} AS v FROM bruto WHERE {_id(coluna)} IS NOT NULL AND trim({_id(coluna)}) <> '')"
+    ).fetchone()
+    if inteira:
+        return "TRY_CAST(trim(v) AS BIGINT)"
+    return _sql_numero_br("limpo")
+
+# Converte uma coluna de texto valor a valor (como converter_datas e converter_numero_br, só os
+# distintos são convertidos) e guarda a tabela de conversão com a quantidade de linhas de cada valor
+def _converter_distintos(con, tabela, coluna, expressao):
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE {tabela} AS SELECT v, n, {expressao} AS convertido FROM ("
+        f"SELECT {_id(coluna)} AS v, count(*) AS n, regexp_replace(trim({_id(coluna)}), '[R$\\s\u00a0]', '', 'g') AS limpo "
+        f"FROM bruto WHERE {_id(coluna)} IS NOT NULL GROUP BY {_id(coluna)})"
+    )
+    return con.sql(f"SELECT coalesce(sum(n), 0) FROM {tabela} WHERE convertido IS NULL AND trim(v) <> ''").fetchone()[0]
+
+# Tabela tipada: o arquivo é lido uma única vez, com as colunas podadas ao esquema e os nomes sem
+# espaços; datas e valores financeiros em texto são convertidos pelas tabelas de distintos.
+# Retorna os valores financeiros inválidos por coluna, como normalizar_financeiros.
+def _criar_tabela_tipada(con, fonte, colunas, esquema):
+    tipos_fonte = {linha[0]: linha[1] for linha in con.sql(f"DESCRIBE SELECT * FROM {fonte}").fetchall()}
+    nomes = {nome.strip(): nome for nome in (esquema["leitura"] if esquema else tipos_fonte)}
+    selecao = ", ".join(f"{_id(original)} AS {_id(nome)}" for nome, original in nomes.items())
+    con.execute(f"CREATE OR REPLACE TEMP TABLE bruto AS SELECT {selecao} FROM {fonte}")
+    financeiras = {colunas.get(papel) for papel in COLUNAS_FINANCEIRAS if colunas.get(papel)}
+    col_data = colunas.get("col_data")
+    expressoes = []
+    juncoes = []
+    invalidos = {}
+    for i, (nome, original) in enumerate(nomes.items()):
+        tipo = tipos_fonte.get(original, "")
+        expressao = f"bruto.{_id(nome)}"
+        conversao = f"conversao_{i}"
+        if nome == col_data and tipo == "VARCHAR":
+            amostra = con.sql(f"SELECT DISTINCT trim({_id(nome)}) FROM bruto WHERE {_id(nome)} IS NOT NULL LIMIT 5000").df().iloc[:, 0]
+            formato = (esquema or {}).get("formato_data") or inferir_formato_data(amostra)
+            nao_lidas = _converter_distintos(con, conversao, nome, _sql_data("v", formato))
+            if nao_lidas:
+                raise ValueError(f"{nao_lidas} datas em formatos mistos na coluna {nome}.")
+            expressao = f"{conversao}.convertido"
+        elif nome == col_data and tipo.startswith(("DATE", "TIMESTAMP")):
+            expressao = f"CAST({expressao} AS TIMESTAMP)"
+        elif nome in financeiras and tipo == "VARCHAR":
+            invalidos[nome] = _converter_distintos(con, conversao, nome, _sql_financeiro(con, nome))
+            expressao = f"{conversao}.convertido"
+        elif nome in financeiras:
+            invalidos[nome] = 0
+        if expressao.startswith(conversao):
+            juncoes.append(f" LEFT JOIN {conversao} ON bruto.{_id(nome)} = {conversao}.v")
+        expressoes.append(f"{expressao} AS {_id(nome)}")
+    con.execute(f"CREATE OR REPLACE TEMP TABLE tipados AS SELECT {', '.join(expressoes)} FROM bruto{''.join(juncoes)}")
+    con.execute("DROP TABLE bruto")
+    return invalidos
+
+# Agregados parciais por SQL: cardinalidades, cubo (data × dimensões pequenas) e as demais
+# dimensões agrupadas à parte, em consultas executadas com todos os núcleos
+def _extrair_parciais_sql(con, colunas):
+    tipos = {linha[0]: linha[1] for linha in con.sql("DESCRIBE tipados").fetchall()}
+    plano = planejar_agregados(colunas, list(tipos))
+    parciais = parciais_vazios()
+    col_vendas = plano['vendas']
+    col_data = plano['data']
+    # Inteiros sem vazios mantêm o tipo (como no pandas); com vazios viram float
+    inteiros = [col for col in plano['somas'].values() if tipos[col] in ("TINYINT", "SMALLINT", "INTEGER", "BIGINT")]
+    contagens = [f"count(DISTINCT {_id(col)})" for col in plano['dimensoes']]
+    contagens += [f"count({_id(col)})" for col in inteiros]
+    # A data entra no cubo pelo dia; com horários, a hora vira uma dimensão à parte
+    data_temporal = col_data and tipos[col_data].startswith("TIMESTAMP")
+    if data_temporal:
+        contagens.append(f"coalesce(bool_or({_id(col_data)} <> date_trunc('day', {_id(col_data)})), false)")
+        contagens.append(f"count(DISTINCT date_trunc('day', {_id(col_data)}))")
+    elif col_data:
+        contagens += ["false", f"count(DISTINCT {_id(col_data)})"]
+    resultado = con.sql(f"SELECT {', '.join(['count(*)'] + contagens)} FROM tipados").fetchone()
+    parciais['linhas'] = resultado[0]
+    cardinalidades = dict(zip(plano['dimensoes'], resultado[1:]))
+    preenchidos = dict(zip(inteiros, resultado[1 + len(cardinalidades):]))
+    com_hora = bool(col_data and resultado[-2])
+    tamanho_data = resultado[-1] * (HORAS_DIA if com_hora else 1) if col_data else None
+    no_cubo = escolher_dimensoes_cubo(plano, cardinalidades, tamanho_data)
+    # Medidas: contagem de linhas e colunas financeiras numéricas (vazios contam como zero)
+    medidas = {MEDIDA_LINHAS: "count(*)"}
+    nomes = {MEDIDA_LINHAS: "count"}
+    tipos_medidas = {MEDIDA_LINHAS: "int64"}
+    for papel, col in plano['somas'].items():
+        inteiro = col in inteiros
+        medidas[papel] = f"CAST(sum({_id(col)}) AS DOUBLE)" if inteiro else f"fsum(COALESCE({_id(col)}, 0))"
+        nomes[papel] = col
+        tipos_medidas[papel] = "int64" if inteiro and preenchidos[col] == parciais['linhas'] else "float64"
+    chaves = {col: _id(col) for col in no_cubo}
+    if com_hora:
+        chaves = {DIMENSAO_HORA: f"hour({_id(col_data)})", **chaves}
+    if col_data:
+        dia = f"date_trunc('day', {_id(col_data)})" if data_temporal else _id(col_data)
+        chaves = {col_data: dia, **chaves}
+    selecao = [f"{expressao} AS {_id(col)}" for col, expressao in chaves.items()]
+    selecao += [f"{expressao} AS {_id('m_' + papel)}" for papel, expressao in medidas.items()]
+    agrupamento = f" GROUP BY {', '.join(str(i + 1) for i in range(len(chaves)))}" if chaves else ""
+    tabela = con.sql(f"SELECT {', '.join(selecao)} FROM tipados{agrupamento}").df()
+    dimensoes_cubo = {col: plano['dimensoes'][col] for col in no_cubo}
+    if com_hora:
+        dimensoes_cubo = {DIMENSAO_HORA: ['col_hora'], **dimensoes_cubo}
+    # Chaves das dimensões na mesma forma canônica da leitura pelo pandas
+    for col in no_cubo:
+        tabela[col] = canonizar_chaves(tabela[col])
+    parciais['cubo'] = materializar_grupos(
+        tabela, list(chaves), {papel: f"m_{papel}" for papel in medidas}, dimensoes_cubo, col_data, nomes, tipos_medidas
+    )
+    # Dimensões fora do cubo (alta cardinalidade)
+    for col, papeis in plano['dimensoes'].items():
+        if col in no_cubo:
+            continue
+        somas = con.sql(
+            f"SELECT {_id(col)} AS chave, {medidas['col_vendas']} AS soma FROM tipados "
+            f"WHERE {_id(col)} IS NOT NULL GROUP BY {_id(col)} ORDER BY {_id(col)}"
+        ).df()
+        chaves = canonizar_chaves(somas["chave"])
+        serie = pd.Series(somas["soma"].to_numpy(), index=pd.Index(chaves, name=col), name=col_vendas)
+        serie = ordenar_por_indice(serie)
+        if tipos_medidas['col_vendas'] == "int64":
+            serie = serie.astype("int64")
+        for papel in papeis:
+            parciais['por_dimensao'][papel] = serie
+    return parciais
+
+# Carrega o upload pelo DuckDB e devolve só os agregados (como a leitura em streaming);
+# o resultado fica no cache de uploads pelo hash do conteúdo
+def carregar_upload_sql(arquivo):
+    chave = hash_upload(arquivo)
+    cache = obter_cache_uploads()
+    entrada = cache.get(f"{chave}:sql")
+    if entrada is not None:
+        return {**entrada, "cache": True}
+    entrada = ler_upload_sql(arquivo, chave)
+    cache.put(f"{chave}:sql", entrada)
+    return {**entrada, "cache": False}
+
+# Leitura e agregação pelo DuckDB sem o cache em memória (usada também na comparação de motores)
+def ler_upload_sql(arquivo, chave):
+    import duckdb
+    inicio = time.perf_counter()
+    con = duckdb.connect()
+    temporario = None
+    try:
+        con.execute(f"SET threads TO {os.cpu_count() or 1}")
+        fonte, colunas, esquema, temporario = _abrir_fonte(con, arquivo, chave)
+        invalidos = _criar_tabela_tipada(con, fonte, colunas, esquema)
+        if esquema is None:
+            # Parquet do cache em disco: os inválidos são os da leitura original
+            invalidos.update(parquet_cache.ler_invalidos(chave))
+        parciais = _extrair_parciais_sql(con, colunas)
+    finally:
+        con.close()
+        if temporario:
+            os.remove(temporario)
+    return {
+        "hash": chave,
+        "df": None,
+        "colunas": colunas,
+        "parciais": parciais,
+        "motor_calculo": "duckdb",
+        "valores_invalidos": invalidos,
+        "tempo_leitura": time.perf_counter() - inicio,
+    }
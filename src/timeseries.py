@@ -0,0 +1,161 @@
+# Séries temporais do dashboard: a série de vendas é reduzida uma vez a uma base diária e todas
+# as granularidades (semana, mês, trimestre, ano, semana ISO, dia do mês) saem dessa série pequena;
+# mês, dia da semana e hora também são derivados da série por data
+import numpy as np
+import pandas as pd
+from src.utils import normalizar_nome_coluna
+
+# Granularidades oferecidas no gráfico de tendência e a regra de agrupamento de cada uma
+GRANULARIDADES_TEMPO = {
+    "Dia": None,
+    "Semana": "W",
+    "Semana ISO": "semana_iso",
+    "Mês": "MS",
+    "Trimestre": "QS",
+    "Ano": "YS",
+    "Dia do mês": "dia_mes",
+}
+
+# Soma por dia (a série por data pode ter horários distintos no mesmo dia)
+def serie_diaria(por_data):
+    if not isinstance(por_data.index, pd.DatetimeIndex):
+        return por_data
+    dias = por_data.index.normalize()
+    if dias.equals(por_data.index) and dias.is_monotonic_increasing and dias.is_unique:
+        return por_data
+    return por_data.groupby(dias).sum()
+
+# Roll-up da série diária para uma granularidade; períodos sem vendas entram com zero
+def rolar_periodo(diaria, granularidade):
+    regra = GRANULARIDADES_TEMPO[granularidade]
+    if regra is None:
+        return diaria
+    if regra == "semana_iso":
+        iso = diaria.index.isocalendar()
+        semanal = diaria.groupby([iso["year"].to_numpy(), iso["week"].to_numpy()]).sum()
+        semanal.index = pd.Index([f"{ano}-W{semana:02d}" for ano, semana in semanal.index], name=granularidade)
+        return semanal
+    if regra == "dia_mes":
+        por_dia = diaria.groupby(diaria.index.day).sum()
+        por_dia.index.name = granularidade
+        return por_dia
+    return diaria.resample(regra).sum()
+
+# Todas as granularidades a partir da mesma série diária
+def rolar_periodos(diaria):
+    if not isinstance(diaria.index, pd.DatetimeIndex):
+        return {"Dia": diaria}
+    return {granularidade: rolar_periodo(diaria, granularidade) for granularidade in GRANULARIDADES_TEMPO}
+
+# Rótulos das dimensões derivadas da data, já na ordem cronológica
+MESES = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+DIAS_SEMANA = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+HORAS = [f"{hora:02d}h" for hora in range(24)]
+
+# Soma dos valores por código (int8) na ordem dos rótulos; só entram os códigos observados
+def _somar_por_rotulo(codigos, valores, rotulos, nome_indice, serie):
+    somas = np.bincount(codigos, weights=valores, minlength=len(rotulos))
+    observados = np.bincount(codigos, minlength=len(rotulos)) > 0
+    resultado = pd.Series(somas[observados], index=pd.Index(np.array(rotulos)[observados], name=nome_indice), name=serie.name)
+    return resultado.astype(serie.dtype) if pd.api.types.is_integer_dtype(serie.dtype) else resultado
+
+# Mês, dia da semana e (se houver horário) hora derivados da série por data em uma passada
+# vetorizada; a série já vem agregada por data, então o custo não depende das linhas brutas
+def derivar_dimensoes_data(por_data):
+    if not isinstance(por_data.index, pd.DatetimeIndex):
+        return {}
+    validos = por_data.index.notna()
+    datas = por_data.index[validos]
+    valores = np.nan_to_num(por_data.to_numpy(dtype=float)[validos])
+    derivadas = {
+        'col_mes': _somar_por_rotulo((datas.month - 1).to_numpy(np.int8), valores, MESES, "Mês", por_data),
+        'col_dia_semana': _somar_por_rotulo(datas.dayofweek.to_numpy(np.int8), valores, DIAS_SEMANA, "Dia da Semana", por_data),
+    }
+    if (datas != datas.normalize()).any():
+        derivadas['col_hora'] = _somar_por_rotulo(datas.hour.to_numpy(np.int8), valores, HORAS, "Hora", por_data)
+    return derivadas
+
+# Distribuição por hora vinda do cubo (índice 0–23) com os rótulos do gráfico
+def rotular_horas(por_hora):
+    if por_hora is None or len(por_hora) == 0:
+        return None
+    serie = por_hora.sort_index()
+    serie.index = pd.Index([HORAS[int(hora)] for hora in serie.index], name="Hora")
+    return serie
+
+# Posição cronológica de nomes ou números de mês/dia da semana vindos do arquivo
+def _posicao(valor, rotulos):
+    texto = normalizar_nome_coluna(valor)
+    for posicao, rotulo in enumerate(rotulos):
+        if texto.startswith(normalizar_nome_coluna(rotulo)[:3]):
+            return posicao
+    try:
+        return int(float(texto))
+    except ValueError:
+        return None
+
+# Reordena uma distribuição por mês ou dia da semana já existente na ordem do calendário
+# (o agrupamento a deixa em ordem alfabética); valores não reconhecidos mantêm a ordem atual
+def ordenar_cronologicamente(serie, rotulos):
+    if serie is None or len(serie) == 0:
+        return serie
+    posicoes = [_posicao(valor, rotulos) for valor in serie.index]
+    if any(posicao is None for posicao in posicoes):
+        return serie
+    return serie.iloc[np.argsort(posicoes, kind="stable")]
+
+# Orçamento de pontos enviados ao navegador por série temporal e, acima deste total, traços WebGL
+PONTOS_MAXIMOS_SERIE = 1500
+LIMITE_PONTOS_WEBGL = 1000
+
+# Largest-Triangle-Three-Buckets: reduz a série a `limite` pontos mantendo o primeiro, o último e,
+# em cada balde, o ponto que forma o maior triângulo com o escolhido antes e a média do próximo
+# balde (picos e vales sobrevivem, ao contrário de uma média ou de pegar um ponto a cada N)
+def lttb(serie, limite):
+    total = len(serie)
+    if limite is None or limite < 3 or total <= limite:
+        return serie
+    if isinstance(serie.index, pd.DatetimeIndex):
+        x = serie.index.asi8.astype(float)
+    elif pd.api.types.is_numeric_dtype(serie.index):
+        x = serie.index.to_numpy(dtype=float)
+    else:
+        x = np.arange(total, dtype=float)
+    y = np.nan_to_num(serie.to_numpy(dtype=float))
+    passo = (total - 2) / (limite - 2)
+    bordas = np.floor(np.arange(limite - 1) * passo).astype(np.int64) + 1
+    bordas[-1] = total - 1
+    escolhidos = np.empty(limite, dtype=np.int64)
+    escolhidos[0], escolhidos[-1] = 0, total - 1
+    anterior = 0
+    for balde in range(limite - 2):
+        inicio, fim = bordas[balde], bordas[balde + 1]
+        proximo_fim = bordas[balde + 2] if balde + 2 < len(bordas) else total
+        media_x = x[fim:proximo_fim].mean()
+        media_y = y[fim:proximo_fim].mean()
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(areas.argmax())
+        escolhidos[balde + 1] = anterior
+    return serie.iloc[escolhidos]
+
+# Trecho da série entre os extremos de uma seleção no gráfico. Eixos de datas e numéricos trazem
+# os próprios valores; num eixo de rótulos a caixa vem em posições dos pontos desenhados (a série
+# `exibida`, já reduzida), e os rótulos do primeiro e do último ponto dentro dela delimitam o trecho
+def recortar_intervalo(serie, extremos, exibida=None):
+    if not extremos or len(extremos) != 2:
+        return None
+    indice = serie.index
+    if isinstance(indice, pd.DatetimeIndex):
+        inicio, fim = sorted(pd.Timestamp(valor) for valor in extremos)
+        return serie.loc[inicio:fim]
+    inicio, fim = sorted(float(valor) for valor in extremos)
+    if pd.api.types.is_numeric_dtype(indice):
+        return serie[(indice >= inicio) & (indice <= fim)]
+    exibida = serie if exibida is None else exibida
+    dentro = exibida.index[max(int(np.ceil(inicio)), 0):int(np.floor(fim)) + 1]
+    if len(dentro) == 0:
+        return serie.iloc[:0]
+    return serie.iloc[indice.get_loc(dentro[0]):indice.get_loc(dentro[-1]) + 1]
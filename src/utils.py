@@ -1,4 +1,7 @@
 # Funções utilitárias para detecção de colunas e manipulação de DataFrame
+import re
+import unicodedata
+import numpy as np
 import pandas as pd
 
 def detectar_coluna(df, possiveis_nomes):
@@ -12,10 +15,254 @@ def detectar_coluna(df, possiveis_nomes):
                 return col
     return None
 
+# Formatos de data testados na inferência, em ordem de preferência (dia antes do mês)
+FORMATOS_DATA = [
+    "%d/%m/%Y", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%y",
+    "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S.%f",
+    "%d-%m-%Y", "%d-%m-%Y %H:%M:%S", "%d.%m.%Y", "%Y/%m/%d",
+]
+TAMANHO_AMOSTRA_DATAS = 500
+
+# Infere o formato exato a partir de uma amostra espalhada pela coluna
+def inferir_formato_data(serie):
+    valores = serie.dropna()
+    if len(valores) == 0:
+        return None
+    posicoes = np.unique(np.linspace(0, len(valores) - 1, min(TAMANHO_AMOSTRA_DATAS, len(valores))).astype(int))
+    amostra = valores.iloc[posicoes].astype(str)
+    for formato in FORMATOS_DATA:
+        if pd.to_datetime(amostra, format=formato, errors="coerce").notna().all():
+            return formato
+    return None
+
+# Converte apenas os valores distintos (poucas datas repetidas em milhões de linhas)
+# e mapeia o resultado de volta; o formato inferido resolve quase tudo em uma
+# passada vetorizada e o que sobrar (formatos mistos) passa pelos demais formatos
+def converter_datas(serie, formato=None):
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    if not (pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie)):
+        return pd.to_datetime(serie, dayfirst=True, errors="coerce")
+    codigos, unicos = pd.factorize(serie)
+    unicos = pd.Series(unicos, dtype=object).astype(str).str.strip()
+    formato = formato or inferir_formato_data(unicos)
+    datas = pd.Series(pd.NaT, index=unicos.index, dtype="datetime64[ns]")
+    pendentes = unicos
+    for tentativa in [formato] + [f for f in FORMATOS_DATA if f != formato]:
+        if tentativa is None or len(pendentes) == 0:
+            continue
+        convertidas = pd.to_datetime(pendentes, format=tentativa, errors="coerce")
+        datas[convertidas.index] = convertidas
+        pendentes = pendentes[convertidas.isna()]
+    if len(pendentes) > 0:
+        datas[pendentes.index] = pd.to_datetime(pendentes, format="mixed", dayfirst=True, errors="coerce")
+    convertida = pd.Series(datas.to_numpy().take(codigos), index=serie.index, name=serie.name)
+    convertida[codigos < 0] = pd.NaT
+    return convertida
+
+# Colunas financeiras (valores monetários somados nas métricas)
+COLUNAS_FINANCEIRAS = [
+    'col_vendas', 'col_receita_bruta', 'col_receita_liquida',
+    'col_impostos', 'col_lucro_bruto', 'col_lucro_liquido',
+]
+_PADRAO_MILHAR = r"^-?\d{1,3}(\.\d{3})+$"
+# Milhar com vírgula e ponto decimal (padrão americano): "1,234.56" ou "1,234,567"
+_PADRAO_MILHAR_VIRGULA = r"^-?\d{1,3}((,\d{3})+\.\d+|(,\d{3}){2,})$"
+
+# Normaliza textos como "R$ 1.234,56", "(1.234,56)" ou "1234.56" em números, sem laço por linha
+def _normalizar_textos_numericos(textos):
+    textos = textos.str.replace("[R$\\s\u00a0]", "", regex=True)
+    negativo = textos.str.startswith("(") & textos.str.endswith(")")
+    textos = textos.str.strip("()")
+    # Milhar americano: remove as vírgulas; vírgula antes de ponto fora desse padrão é ambígua e fica inválida
+    milhar_virgula = textos.str.match(_PADRAO_MILHAR_VIRGULA)
+    textos = textos.where(~milhar_virgula, textos.str.replace(",", "", regex=False))
+    ambiguo = textos.str.contains(",.*\\.", regex=True)
+    com_virgula = textos.str.contains(",", regex=False)
+    so_milhar = textos.str.match(_PADRAO_MILHAR)
+    # Vírgula decimal (padrão brasileiro) ou pontos apenas de milhar: remove os pontos
+    sem_pontos = textos.str.replace(".", "", regex=False)
+    textos = textos.where(~(com_virgula | so_milhar), sem_pontos).str.replace(",", ".", regex=False)
+    numeros = pd.to_numeric(textos.where(~ambiguo), errors="coerce")
+    return numeros.where(~negativo, -numeros)
+
+# Converte uma coluna para número; retorna a série e quantos valores não puderam ser lidos
+def converter_numero_br(serie):
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie, 0
+    preenchidos = serie.notna()
+    codigos, unicos = pd.factorize(serie)
+    if len(unicos) < len(serie) / 2:
+        # Muitos valores repetidos: normaliza só os distintos e mapeia de volta
+        numeros_unicos = _normalizar_textos_numericos(pd.Series(unicos, dtype=object).astype(str).str.strip())
+        numeros = pd.Series(numeros_unicos.to_numpy(dtype=float).take(codigos), index=serie.index, name=serie.name)
+        numeros[codigos < 0] = np.nan
+    else:
+        numeros = _normalizar_textos_numericos(serie.astype(str).str.strip()).astype(float)
+        numeros[~preenchidos] = np.nan
+    vazios = serie.astype(str).str.strip().eq("") & preenchidos
+    falhas = int((numeros.isna() & preenchidos & ~vazios).sum())
+    # Texto só com inteiros (coluna lida como texto) fica int64, como o leitor a teria inferido
+    if len(unicos) and not numeros.isna().any() and pd.Series(unicos, dtype=object).astype(str).str.strip().str.fullmatch(r"[+-]?\d+").all():
+        numeros = numeros.astype(np.int64)
+    return numeros, falhas
+
+# Normaliza todas as colunas financeiras detectadas; retorna as falhas por coluna
+def normalizar_financeiros(df, colunas):
+    falhas = {}
+    for col in dict.fromkeys(colunas.get(papel) for papel in COLUNAS_FINANCEIRAS):
+        if col and col in df.columns:
+            df[col], falhas[col] = converter_numero_br(df[col])
+    return df, falhas
+
+# Dimensões textuais candidatas a codificação categórica
+COLUNAS_CATEGORICAS = [
+    'col_estado', 'col_cliente', 'col_produto', 'col_vendedor', 'col_canal_venda',
+    'col_categoria_produto', 'col_forma_pagamento', 'col_segmento',
+]
+# Proporção máxima de valores distintos por linha para valer a pena codificar
+LIMITE_PROPORCAO_CATEGORICA = 0.5
+
+# Converte as dimensões de baixa cardinalidade em categóricas (códigos inteiros +
+# dicionário ordenado, para manter a ordem dos agrupamentos). Retorna os bytes economizados.
+def codificar_categorias(df, colunas, limite_proporcao=LIMITE_PROPORCAO_CATEGORICA):
+    economia = 0
+    for col in dict.fromkeys(colunas.get(papel) for papel in COLUNAS_CATEGORICAS):
+        if not col or col not in df.columns:
+            continue
+        serie = df[col]
+        antes = serie.memory_usage(index=False, deep=True)
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            if not serie.cat.categories.is_monotonic_increasing:
+                # factorize ordena também categorias de tipos misturados (números antes de textos)
+                df[col] = serie.cat.reorder_categories(pd.factorize(serie.cat.categories, sort=True)[1])
+            continue
+        codigos, categorias = pd.factorize(serie, sort=True)
+        if len(categorias) > limite_proporcao * len(serie):
+            continue
+        df[col] = pd.Categorical.from_codes(codigos, categories=categorias)
+        economia += antes - df[col].memory_usage(index=False, deep=True)
+    return df, int(economia)
+
+# Dimensões cujas chaves seguem uma forma canônica: as categóricas e os rótulos de mês e dia da semana
+COLUNAS_CHAVE = COLUNAS_CATEGORICAS + ['col_mes', 'col_dia_semana']
+# Inteiros escritos sem zeros à esquerda e dentro do int64 ("007" continua texto)
+_PADRAO_INTEIRO = r"-?(0|[1-9]\d{0,17})"
+
+def _chave_canonica(valor):
+    if isinstance(valor, (bool, np.bool_)):
+        return valor
+    if isinstance(valor, (int, np.integer)):
+        return int(valor)
+    if isinstance(valor, (float, np.floating)) and float(valor).is_integer() and abs(valor) < 2.0 ** 63:
+        return int(valor)
+    if isinstance(valor, str) and re.fullmatch(_PADRAO_INTEIRO, valor):
+        return int(valor)
+    return valor
+
+# Forma canônica dos valores distintos de uma dimensão, ou None se já estão nela: códigos inteiros
+# lidos como texto ("2248", de uma leitura categórica) ou como float (2248.0, coluna com vazios) viram int
+def _chaves_canonicas(unicos):
+    tipo = pd.api.types.infer_dtype(unicos, skipna=True)
+    if tipo == "floating":
+        numeros = np.asarray(unicos, dtype=float)
+        if len(numeros) and (np.isfinite(numeros) & (numeros == np.round(numeros)) & (np.abs(numeros) < 2.0 ** 63)).all():
+            return pd.Index(numeros.astype(np.int64))
+        return None
+    if tipo == "string":
+        inteiros = pd.Series(unicos, dtype=object).str.fullmatch(_PADRAO_INTEIRO).to_numpy(dtype=bool)
+        if not inteiros.any():
+            return None
+    elif not tipo.startswith("mixed"):
+        return None
+    canonicas = pd.Index([_chave_canonica(valor) for valor in unicos])
+    return None if canonicas.equals(pd.Index(unicos)) and canonicas.dtype == unicos.dtype else canonicas
+
+# Série da dimensão com as chaves na forma canônica, para que o mesmo código não vire duas chaves
+# entre arquivos (ou blocos) lidos com tipos diferentes; só os valores distintos são examinados
+def canonizar_chaves(serie):
+    categorica = isinstance(serie.dtype, pd.CategoricalDtype)
+    if categorica:
+        codigos, unicos = serie.cat.codes.to_numpy(), serie.cat.categories
+    elif pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie) or pd.api.types.is_float_dtype(serie):
+        codigos, unicos = pd.factorize(serie)
+        unicos = pd.Index(unicos)
+    else:
+        return serie
+    canonicas = _chaves_canonicas(unicos)
+    if canonicas is None:
+        return serie
+    # Chaves que passam a coincidir (2248 e "2248" na mesma coluna) se juntam num único código
+    novos, canonicas = pd.factorize(canonicas, sort=True)
+    codigos = np.where(codigos >= 0, novos.take(codigos, mode="clip"), -1)
+    if categorica or ((codigos < 0).any() and pd.api.types.is_integer_dtype(canonicas)):
+        valores = pd.Categorical.from_codes(codigos, categories=canonicas)
+    else:
+        valores = canonicas.to_numpy().take(codigos)
+        if (codigos < 0).any():
+            valores = valores.astype(object)
+            valores[codigos < 0] = np.nan
+    return pd.Series(valores, index=serie.index, name=serie.name)
+
+# Aplica a forma canônica às dimensões detectadas
+def normalizar_chaves(df, colunas):
+    for col in dict.fromkeys(colunas.get(papel) for papel in COLUNAS_CHAVE):
+        if col and col in df.columns:
+            df[col] = canonizar_chaves(df[col])
+    return df
+
 # Função para conversão condicional de tipos
-def converter_tipos(df, col_data, col_vendas):
+def converter_tipos(df, col_data, col_vendas, formato_data=None):
     if col_data and col_data in df.columns:
-        df[col_data] = pd.to_datetime(df[col_data], dayfirst=True, errors="coerce")
+        df[col_data] = converter_datas(df[col_data], formato_data)
     if col_vendas and col_vendas in df.columns:
-        df[col_vendas] = pd.to_numeric(df[col_vendas], errors="coerce")
+        df[col_vendas], _ = converter_numero_br(df[col_vendas])
     return df
+
+# Papéis de coluna e os nomes aceitos para cada um
+SINONIMOS_COLUNAS = {
+    'col_data': ["dia", "data", "date", "dt", "data_venda", "data venda", "data_compra"],
+    'col_vendas': ["vendas", "valor", "valor_venda", "faturamento", "receita", "total", "sales", "amount", "receita_bruta"],
+    'col_estado': ["estado", "uf", "regiao"],
+    'col_dia_semana': ["dia_semana"],
+    'col_cliente': ["cliente", "nome_cliente"],
+    'col_produto': ["produto", "nome_produto"],
+    'col_vendedor': ["vendedor"],
+    'col_canal_venda': ["canal", "canal_venda"],
+    'col_categoria_produto': ["categoria", "categoria_produto"],
+    'col_mes': ["mes", "mês"],
+    'col_receita_bruta': ["receita_bruta"],
+    'col_receita_liquida': ["receita_liquida"],
+    'col_impostos': ["impostos", "total_impostos"],
+    'col_lucro_bruto': ["lucro_bruto"],
+    'col_lucro_liquido': ["lucro_liquido"],
+    'col_forma_pagamento': ["forma_pagamento"],
+    'col_segmento': ["segmento"],
+}
+
+# Nome comparável: sem acentos, minúsculo e com espaços/sublinhados unificados
+def normalizar_nome_coluna(nome):
+    sem_acento = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[\s_]+", "_", sem_acento.strip().lower())
+
+# Índice pré-construído: nome normalizado -> [(papel, prioridade do sinônimo)]
+INDICE_SINONIMOS = {}
+for _papel, _nomes in SINONIMOS_COLUNAS.items():
+    for _prioridade, _nome in enumerate(_nomes):
+        INDICE_SINONIMOS.setdefault(normalizar_nome_coluna(_nome), []).append((_papel, _prioridade))
+
+# Detecta todas as colunas principais em uma única passada pelos nomes
+# (aceita o DataFrame ou diretamente a lista de nomes do cabeçalho)
+def detectar_colunas(df):
+    nomes = df.columns if hasattr(df, "columns") else df
+    melhores = {}
+    for col in nomes:
+        for papel, prioridade in INDICE_SINONIMOS.get(normalizar_nome_coluna(col), ()):
+            if papel not in melhores or prioridade < melhores[papel][0]:
+                melhores[papel] = (prioridade, col)
+    return {papel: melhores[papel][1] if papel in melhores else None for papel in SINONIMOS_COLUNAS}
+
+# Nomes distintos das colunas efetivamente detectadas
+def colunas_resolvidas(colunas):
+    return list(dict.fromkeys(c for c in colunas.values() if c))
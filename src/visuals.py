@@ -3,56 +3,88 @@ import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 import requests
-import io
 import pandas as pd
+from src.figures import figura_em_cache
+from src.exports import exportacao_sob_demanda
+from src.timeseries import PONTOS_MAXIMOS_SERIE, LIMITE_PONTOS_WEBGL, lttb, recortar_intervalo
+from src.chart_data import LIMITE_FATIAS, LIMITE_CARDINALIDADE, ROTULO_OUTROS, agrupar_cauda
 
-# Função auxiliar para exportar tabela em Excel
+# Acima desta quantidade de pontos o gráfico de linha mensal é desenhado sem marcadores
+LIMITE_MARCADORES = 60
+
+# Fatias do gráfico com a cauda agrupada em "Outros"; avisa quando a coluna tem valores distintos demais
+def preparar_fatias(serie, descricao):
+    fatias, agrupadas = agrupar_cauda(serie)
+    if len(serie) > LIMITE_CARDINALIDADE:
+        st.warning(
+            f"{descricao}: {len(serie):,} valores distintos. O gráfico mostra os {LIMITE_FATIAS} maiores e soma o restante em "
+            f"\"{ROTULO_OUTROS}\"; verifique se a coluna é mesmo uma categoria."
+        )
+    elif agrupadas:
+        st.caption(f"{agrupadas:,} categorias menores somadas em \"{ROTULO_OUTROS}\".")
+    return fatias
+
+# Traços WebGL (scattergl) quando a série passa do limite; abaixo dele o SVG é mais leve
+def modo_renderizacao(pontos):
+    return "webgl" if pontos > LIMITE_PONTOS_WEBGL else "svg"
+
+# Função auxiliar para exportar tabela em Excel (gerada só no clique)
 def export_table_button_excel(df, label):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Dados')
-    output.seek(0)
     st.download_button(
         label=f"Exportar (Excel)",
-        data=output,
+        data=exportacao_sob_demanda(df, "xlsx"),
         file_name=f"{label.replace(' ', '_').lower()}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        on_click="ignore"
     )
 
-# Função auxiliar para exportar tabela
+# Função auxiliar para exportar tabela (gerada só no clique)
 def export_table_button(df, label):
-    csv = df.to_csv(index=False).encode('utf-8')
     st.download_button(
         label=f"Exportar (CSV)",
-        data=csv,
+        data=exportacao_sob_demanda(df, "csv"),
         file_name=f"{label.replace(' ', '_').lower()}.csv",
-        mime="text/csv"
+        mime="text/csv",
+        on_click="ignore"
     )
 
+# Os arquivos saem do cache de exportações no clique; um rerun sem download não serializa nada
 def export_table_buttons(df, label):
     col_csv, col_excel = st.columns([0.5, 4])
     with col_csv:
-        csv = df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label=f"Exportar (CSV)",
-            data=csv,
-            file_name=f"{label.replace(' ', '_').lower()}.csv",
-            mime="text/csv"
-        )
+        export_table_button(df, label)
     with col_excel:
-        import io
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Dados')
-        output.seek(0)
-        st.download_button(
-            label=f"Exportar (Excel)",
-            data=output,
-            file_name=f"{label.replace(' ', '_').lower()}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        export_table_button_excel(df, label)
+
+# Painel de filtros globais (barra lateral); devolve só os filtros ativos, por papel
+def show_filter_panel(opcoes):
+    filtros = {}
+    if not opcoes:
+        return filtros
+    st.header("Filtros")
+    if 'col_data' in opcoes:
+        inicio, fim = opcoes['col_data']
+        periodo = st.date_input("Período", value=(inicio, fim), min_value=inicio, max_value=fim, format="DD/MM/YYYY")
+        if len(periodo) == 2 and tuple(periodo) != (inicio, fim):
+            filtros['col_data'] = [periodo[0], periodo[1]]
+    for papel, rotulo in (('col_estado', "Estado"), ('col_canal_venda', "Canal de venda"), ('col_segmento', "Segmento")):
+        if papel in opcoes:
+            selecionados = st.multiselect(rotulo, opcoes[papel], placeholder="Todos")
+            if selecionados:
+                filtros[papel] = selecionados
+    return filtros
+
+# Card de total de distintos: exato ou estimativa HyperLogLog com o erro padrão
+def _metric_distintos(rotulo, total, erro=None):
+    if total is None:
+        st.metric(rotulo, "N/D")
+    elif erro is None:
+        st.metric(rotulo, total)
+    else:
+        st.metric(rotulo, f"≈ {total:,}", help=f"Estimativa HyperLogLog: erro padrão de ±{erro:.1%} (±{total * erro:,.0f}).")
 
-def show_metric_cards(total_vendas, vendas_por_dia, numero_dias, total_estados, total_clientes, total_produtos, total_vendedores, receita_bruta, receita_liquida, total_impostos, lucro_bruto, lucro_liquido):
+def show_metric_cards(total_vendas, vendas_por_dia, numero_dias, total_estados, total_clientes, total_produtos, total_vendedores, receita_bruta, receita_liquida, total_impostos, lucro_bruto, lucro_liquido, erro_distintos=None):
+    erro_distintos = erro_distintos or {}
     st.markdown("### Métricas Principais")
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -62,20 +94,22 @@ def show_metric_cards(total_vendas, vendas_por_dia, numero_dias, total_estados,
     with col3:
         st.metric("Período Analisado", f"{numero_dias} dias" if numero_dias is not None else "N/D")
     with col4:
-        st.metric("Total de Estados", total_estados if total_estados is not None else "N/D")
+        _metric_distintos("Total de Estados", total_estados, erro_distintos.get('total_estados'))
     st.markdown("---")
 
     if any([total_clientes, total_produtos, total_vendedores, receita_bruta]):
         st.markdown("### Métricas de Cliente e Produto")
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total de Clientes", total_clientes if total_clientes is not None else "N/D")
+            _metric_distintos("Total de Clientes", total_clientes, erro_distintos.get('total_clientes'))
         with col2:
-            st.metric("Total de Produtos", total_produtos if total_produtos is not None else "N/D")
+            _metric_distintos("Total de Produtos", total_produtos, erro_distintos.get('total_produtos'))
         with col3:
-            st.metric("Total de Vendedores", total_vendedores if total_vendedores is not None else "N/D")
+            _metric_distintos("Total de Vendedores", total_vendedores, erro_distintos.get('total_vendedores'))
         with col4:
             st.metric("Receita Bruta", f"R$ {receita_bruta:,.2f}" if receita_bruta is not None else "N/D")
+        if erro_distintos:
+            st.caption(f"Totais marcados com ≈ são estimativas HyperLogLog (erro padrão de ±{max(erro_distintos.values()):.1%}).")
         st.markdown("---")
 
     if any([receita_liquida, total_impostos, lucro_bruto, lucro_liquido]):
@@ -90,31 +124,61 @@ def show_metric_cards(total_vendas, vendas_por_dia, numero_dias, total_estados,
         with col4:
             st.metric("Lucro Líquido", f"R$ {lucro_liquido:,.2f}" if lucro_liquido is not None else "N/D")
 
-def show_geotemporal_analysis(top_estados, df_semanal, df, col_estado, col_vendas, col_data):
+def show_geotemporal_analysis(top_estados, df_semanal, vendas_por_estado, col_estado, col_vendas, col_data, vendas_por_periodo=None, pontos_maximos=PONTOS_MAXIMOS_SERIE):
     st.markdown("#### Análise Geográfica e Temporal")
     col_graf1, col_graf2, col_graf3 = st.columns(3)
     with col_graf1:
         if top_estados is not None and len(top_estados) > 0:
-            fig_estados = px.bar(x=top_estados.index, y=top_estados.values, title="Top 5 Estados por Volume de Vendas", labels={"x": col_estado or "Estado", "y": "Total de Vendas (R$)"})
-            fig_estados.update_layout(showlegend=False, height=400)
+            fig_estados = figura_em_cache(top_estados, ("top_estados", col_estado), lambda: px.bar(
+                x=top_estados.index, y=top_estados.values, title="Top 5 Estados por Volume de Vendas", labels={"x": col_estado or "Estado", "y": "Total de Vendas (R$)"}
+            ).update_layout(showlegend=False, height=400))
             st.plotly_chart(fig_estados, use_container_width=True)
             st.caption("Gráfico de barras mostrando os 5 estados com maior volume de vendas.")
         else:
             st.info("Sem dados suficientes para o gráfico de Top Estados.")
     with col_graf2:
-        if df_semanal is not None and len(df_semanal) > 0:
-            fig_tendencia = px.line(df_semanal, title="Tendência de Vendas ao Longo do Tempo", labels={"value": "Total de Vendas (R$)", col_data or "Dia": "Data"})
-            fig_tendencia.update_layout(showlegend=False, height=400)
-            st.plotly_chart(fig_tendencia, use_container_width=True)
+        # As granularidades já vêm prontas da série diária: trocar não relê as linhas
+        serie_tendencia = df_semanal
+        if vendas_por_periodo:
+            opcoes = list(vendas_por_periodo)
+            # A escolha também fica numa chave fora do widget: com só a seção ativa montada o radio
+            # some ao trocar de seção e o Streamlit descarta o estado dele
+            escolhida = st.session_state.get("granularidade_escolhida", "Semana")
+            if "granularidade_tendencia" not in st.session_state:
+                st.session_state["granularidade_tendencia"] = escolhida if escolhida in opcoes else opcoes[0]
+            granularidade = st.radio("Granularidade", opcoes, horizontal=True, key="granularidade_tendencia")
+            st.session_state["granularidade_escolhida"] = granularidade
+            serie_tendencia = vendas_por_periodo[granularidade]
+        if serie_tendencia is not None and len(serie_tendencia) > 0:
+            labels_tendencia = {"value": "Total de Vendas (R$)", col_data or "Dia": "Data"}
+            fig_tendencia = figura_em_cache(serie_tendencia, ("tendencia", col_data, pontos_maximos), lambda: px.line(
+                lttb(serie_tendencia, pontos_maximos), title="Tendência de Vendas ao Longo do Tempo", labels=labels_tendencia,
+                render_mode=modo_renderizacao(min(len(serie_tendencia), pontos_maximos))
+            ).update_layout(showlegend=False, height=400))
+            if len(serie_tendencia) > pontos_maximos:
+                # Série reduzida por LTTB: selecionar um trecho traz os pontos originais dele
+                evento = st.plotly_chart(fig_tendencia, use_container_width=True, on_select="rerun", selection_mode="box", key="tendencia_selecao")
+                caixas = evento.selection.box if evento else []
+                trecho = recortar_intervalo(serie_tendencia, caixas[0].get("x"), lttb(serie_tendencia, pontos_maximos)) if caixas else None
+                st.caption(f"Série com {len(serie_tendencia):,} pontos reduzida a {pontos_maximos:,} (LTTB). Selecione um trecho para vê-lo em resolução total.")
+                if trecho is not None and len(trecho) > 0:
+                    fig_trecho = px.line(
+                        lttb(trecho, pontos_maximos), title="Trecho selecionado", labels=labels_tendencia,
+                        render_mode=modo_renderizacao(min(len(trecho), pontos_maximos))
+                    ).update_layout(showlegend=False, height=300)
+                    st.plotly_chart(fig_trecho, use_container_width=True)
+            else:
+                st.plotly_chart(fig_tendencia, use_container_width=True)
             st.caption("Gráfico de linha mostrando a tendência de vendas ao longo do tempo.")
         else:
             st.info("Sem dados de data e vendas para tendência.")
     with col_graf3:
-        if col_estado and col_vendas and col_estado in df.columns and col_vendas in df.columns:
-            df_estados_todos = df.groupby(col_estado)[col_vendas].sum()
-            if len(df_estados_todos) > 0:
-                fig_pizza = px.pie(values=df_estados_todos.values, names=df_estados_todos.index, title="Distribuição de Vendas por Estado")
-                fig_pizza.update_layout(height=400)
+        if vendas_por_estado is not None:
+            if len(vendas_por_estado) > 0:
+                fatias_estado = preparar_fatias(vendas_por_estado, "Estados")
+                fig_pizza = figura_em_cache(fatias_estado, ("pizza_estado",), lambda: px.pie(
+                    values=fatias_estado.values, names=fatias_estado.index, title="Distribuição de Vendas por Estado"
+                ).update_layout(height=400))
                 st.plotly_chart(fig_pizza, use_container_width=True)
                 st.caption("Gráfico de pizza mostrando a distribuição das vendas por estado.")
             else:
@@ -123,36 +187,46 @@ def show_geotemporal_analysis(top_estados, df_semanal, df, col_estado, col_venda
             st.info("Colunas de estado e vendas não disponíveis para a pizza.")
     st.markdown("---")
     st.markdown("##### Tabela Dinâmica - Vendas por Estado")
-    if col_estado and col_vendas and col_estado in df.columns and col_vendas in df.columns:
-        tabela_estado = df.groupby(col_estado)[col_vendas].sum().reset_index().sort_values(col_vendas, ascending=False)
+    if vendas_por_estado is not None:
+        tabela_estado = vendas_por_estado.rename_axis(col_estado).reset_index(name=col_vendas).sort_values(col_vendas, ascending=False)
         st.dataframe(tabela_estado, use_container_width=True)
         export_table_buttons(tabela_estado, "Vendas por Estado")
     else:
         st.info("Não foi possível gerar a tabela dinâmica de estados.")
 
-def show_client_product_analysis(top_clientes, top_produtos, vendas_por_categoria):
+def show_client_product_analysis(top_clientes, top_produtos, vendas_por_categoria, aproximado=False, erro_topk=None):
     st.markdown("#### Análise de Clientes e Produtos")
+    if aproximado:
+        erros = erro_topk or {}
+        st.markdown(
+            ":orange[**Aproximado**] — rankings estimados com sketch Space-Saving. "
+            f"Erro máximo: clientes R$ {erros.get('top_clientes', 0):,.2f}, produtos R$ {erros.get('top_produtos', 0):,.2f}."
+        )
     col_graf1, col_graf2, col_graf3 = st.columns(3)
     with col_graf1:
         if top_clientes is not None and len(top_clientes) > 0:
-            fig_clientes = px.scatter(x=top_clientes.index, y=top_clientes.values, title="Top 5 Clientes por Volume de Compras", labels={"x": "Cliente", "y": "Total de Compras (R$)"}, size=top_clientes.values, color=top_clientes.values, color_continuous_scale='Blues')
-            fig_clientes.update_layout(showlegend=False, height=400)
+            fig_clientes = figura_em_cache(top_clientes, ("top_clientes",), lambda: px.scatter(
+                x=top_clientes.index, y=top_clientes.values, title="Top 5 Clientes por Volume de Compras", labels={"x": "Cliente", "y": "Total de Compras (R$)"}, size=top_clientes.values, color=top_clientes.values, color_continuous_scale='Blues'
+            ).update_layout(showlegend=False, height=400))
             st.plotly_chart(fig_clientes, use_container_width=True)
             st.caption("Gráfico de dispersão dos 5 clientes que mais compraram.")
         else:
             st.info("Sem dados suficientes para o gráfico de Top Clientes.")
     with col_graf2:
         if top_produtos is not None and len(top_produtos) > 0:
-            fig_produtos = px.bar(x=top_produtos.index, y=top_produtos.values, color=top_produtos.index, title="Top 5 Produtos por Volume de Vendas", labels={"x": "Produto", "y": "Total de Vendas (R$)"}, color_discrete_sequence=px.colors.qualitative.Safe)
-            fig_produtos.update_layout(showlegend=False, height=400)
+            fig_produtos = figura_em_cache(top_produtos, ("top_produtos",), lambda: px.bar(
+                x=top_produtos.index, y=top_produtos.values, color=top_produtos.index, title="Top 5 Produtos por Volume de Vendas", labels={"x": "Produto", "y": "Total de Vendas (R$)"}, color_discrete_sequence=px.colors.qualitative.Safe
+            ).update_layout(showlegend=False, height=400))
             st.plotly_chart(fig_produtos, use_container_width=True)
             st.caption("Gráfico de barras dos 5 produtos mais vendidos.")
         else:
             st.info("Sem dados suficientes para o gráfico de Top Produtos.")
     with col_graf3:
         if vendas_por_categoria is not None and len(vendas_por_categoria) > 0:
-            fig_categoria = px.pie(values=vendas_por_categoria.values, names=vendas_por_categoria.index, title="Distribuição de Vendas por Categoria")
-            fig_categoria.update_layout(height=400)
+            fatias_categoria = preparar_fatias(vendas_por_categoria, "Categorias")
+            fig_categoria = figura_em_cache(fatias_categoria, ("pizza_categoria",), lambda: px.pie(
+                values=fatias_categoria.values, names=fatias_categoria.index, title="Distribuição de Vendas por Categoria"
+            ).update_layout(height=400))
             st.plotly_chart(fig_categoria, use_container_width=True)
             st.caption("Gráfico de pizza mostrando a distribuição das vendas por categoria de produto.")
         else:
@@ -254,37 +328,43 @@ def show_commercial_financial_analysis(top_vendedores, vendas_por_canal, vendas_
     col_graf1, col_graf2, col_graf3 = st.columns(3)
     with col_graf1:
         if top_vendedores is not None and len(top_vendedores) > 0:
-            fig_vendedores = px.bar(x=top_vendedores.index, y=top_vendedores.values, color=top_vendedores.index, title="Top 5 Vendedores por Volume de Vendas", labels={"x": "Vendedor", "y": "Total de Vendas (R$)"}, color_discrete_sequence=px.colors.qualitative.Safe)
-            fig_vendedores.update_layout(showlegend=False, height=400)
+            fig_vendedores = figura_em_cache(top_vendedores, ("top_vendedores",), lambda: px.bar(
+                x=top_vendedores.index, y=top_vendedores.values, color=top_vendedores.index, title="Top 5 Vendedores por Volume de Vendas", labels={"x": "Vendedor", "y": "Total de Vendas (R$)"}, color_discrete_sequence=px.colors.qualitative.Safe
+            ).update_layout(showlegend=False, height=400))
             st.plotly_chart(fig_vendedores, use_container_width=True)
             st.caption("Gráfico de barras dos 5 vendedores com maior volume de vendas.")
         else:
             st.info("Sem dados suficientes para o gráfico de Top Vendedores.")
     with col_graf2:
         if vendas_por_canal is not None and len(vendas_por_canal) > 0:
-            fig_canal = px.pie(values=vendas_por_canal.values, names=vendas_por_canal.index, title="Distribuição de Vendas por Canal", hole=0.4, color_discrete_sequence=px.colors.qualitative.Pastel)
-            fig_canal.update_layout(height=400)
+            fatias_canal = preparar_fatias(vendas_por_canal, "Canais")
+            fig_canal = figura_em_cache(fatias_canal, ("pizza_canal",), lambda: px.pie(
+                values=fatias_canal.values, names=fatias_canal.index, title="Distribuição de Vendas por Canal", hole=0.4, color_discrete_sequence=px.colors.qualitative.Pastel
+            ).update_layout(height=400))
             st.plotly_chart(fig_canal, use_container_width=True)
             st.caption("Gráfico de pizza mostrando a distribuição das vendas por canal.")
         else:
             st.info("Sem dados suficientes para a distribuição por canal.")
     with col_graf3:
         if vendas_por_pagamento is not None and len(vendas_por_pagamento) > 0:
-            total_pagamento = vendas_por_pagamento.values.sum()
-            labels = [f"{nome}<br>R$ {valor:,.2f}<br>{valor/total_pagamento*100:.1f}%" for nome, valor in zip(vendas_por_pagamento.index, vendas_por_pagamento.values)]
-            fig_pagamento = px.treemap(
-                names=vendas_por_pagamento.index,
-                parents=[""]*len(vendas_por_pagamento),
-                values=vendas_por_pagamento.values,
-                title="Distribuição de Vendas por Forma de Pagamento",
-                custom_data=[vendas_por_pagamento.values, [f"{v/total_pagamento*100:.1f}%" for v in vendas_por_pagamento.values]]
-            )
-            fig_pagamento.update_traces(
-                textinfo="label+value+percent entry",
-                texttemplate=labels,
-                hovertemplate='<b>%{label}</b><br>Valor: R$ %{value:,.2f}<br>Percentual: %{customdata[1]}'
-            )
-            fig_pagamento.update_layout(height=400)
+            fatias_pagamento = preparar_fatias(vendas_por_pagamento, "Formas de pagamento")
+            def montar_treemap():
+                total_pagamento = fatias_pagamento.values.sum()
+                labels = [f"{nome}<br>R$ {valor:,.2f}<br>{valor/total_pagamento*100:.1f}%" for nome, valor in zip(fatias_pagamento.index, fatias_pagamento.values)]
+                fig = px.treemap(
+                    names=fatias_pagamento.index,
+                    parents=[""]*len(fatias_pagamento),
+                    values=fatias_pagamento.values,
+                    title="Distribuição de Vendas por Forma de Pagamento",
+                    custom_data=[fatias_pagamento.values, [f"{v/total_pagamento*100:.1f}%" for v in fatias_pagamento.values]]
+                )
+                fig.update_traces(
+                    textinfo="label+value+percent entry",
+                    texttemplate=labels,
+                    hovertemplate='<b>%{label}</b><br>Valor: R$ %{value:,.2f}<br>Percentual: %{customdata[1]}'
+                )
+                return fig.update_layout(height=400)
+            fig_pagamento = figura_em_cache(fatias_pagamento, ("treemap_pagamento",), montar_treemap)
             st.plotly_chart(fig_pagamento, use_container_width=True)
             st.caption("Gráfico de treemap mostrando a distribuição das vendas por forma de pagamento.")
         else:
@@ -298,43 +378,56 @@ def show_commercial_financial_analysis(top_vendedores, vendas_por_canal, vendas_
     st.dataframe(tabela_canais, use_container_width=True)
     export_table_buttons(tabela_canais, "Canais")
 
-def show_temporal_segmentation_analysis(vendas_por_mes, vendas_por_dia_semana, vendas_por_segmento):
+def show_temporal_segmentation_analysis(vendas_por_mes, vendas_por_dia_semana, vendas_por_segmento, vendas_por_hora=None):
     st.markdown("#### Análise Temporal e Segmentação")
     col_graf1, col_graf2, col_graf3 = st.columns(3)
     with col_graf1:
         if vendas_por_mes is not None and len(vendas_por_mes) > 0:
-            df_mes = pd.DataFrame({"Mês": vendas_por_mes.index, "Total de Vendas": vendas_por_mes.values})
-            fig_line = px.line(
-                df_mes,
-                x="Mês",
-                y="Total de Vendas",
-                title="Vendas por Mês",
-                markers=True,
-                line_shape="linear",
-                color_discrete_sequence=["#636EFA"]
-            )
-            fig_line.update_traces(marker=dict(color=px.colors.qualitative.Safe, size=10), line_color="#636EFA")
-            fig_line.update_layout(showlegend=False, height=400)
+            def montar_linha_mes():
+                df_mes = pd.DataFrame({"Mês": vendas_por_mes.index, "Total de Vendas": vendas_por_mes.values})
+                fig = px.line(
+                    df_mes,
+                    x="Mês",
+                    y="Total de Vendas",
+                    title="Vendas por Mês",
+                    markers=len(df_mes) <= LIMITE_MARCADORES,
+                    line_shape="linear",
+                    render_mode=modo_renderizacao(len(df_mes)),
+                    color_discrete_sequence=["#636EFA"]
+                )
+                fig.update_traces(marker=dict(color=px.colors.qualitative.Safe, size=10), line_color="#636EFA")
+                return fig.update_layout(showlegend=False, height=400)
+            fig_line = figura_em_cache(vendas_por_mes, ("linha_mes",), montar_linha_mes)
             st.plotly_chart(fig_line, use_container_width=True)
             st.caption("Gráfico de linha mostrando a evolução das vendas por mês.")
         else:
             st.info("Sem dados suficientes para o gráfico de Vendas por Mês.")
     with col_graf2:
         if vendas_por_dia_semana is not None and len(vendas_por_dia_semana) > 0:
-            fig_dia_semana = px.bar(x=vendas_por_dia_semana.values, y=vendas_por_dia_semana.index, title="Vendas por Dia da Semana", labels={"x": "Dia da Semana", "y": "Total de Vendas (R$)"})
-            fig_dia_semana.update_layout(showlegend=False, height=400)
+            barras_dia_semana = preparar_fatias(vendas_por_dia_semana, "Dias da semana")
+            fig_dia_semana = figura_em_cache(barras_dia_semana, ("dia_semana",), lambda: px.bar(
+                x=barras_dia_semana.values, y=barras_dia_semana.index, title="Vendas por Dia da Semana", labels={"x": "Dia da Semana", "y": "Total de Vendas (R$)"}
+            ).update_layout(showlegend=False, height=400))
             st.plotly_chart(fig_dia_semana, use_container_width=True)
             st.caption("Gráfico de barras mostrando as vendas por dia da semana.")
         else:
             st.info("Sem dados suficientes para o gráfico de Vendas por Dia da Semana.")
     with col_graf3:
         if vendas_por_segmento is not None and len(vendas_por_segmento) > 0:
-            fig_segmento = px.pie(values=vendas_por_segmento.values, names=vendas_por_segmento.index, title="Distribuição de Vendas por Segmento de Cliente")
-            fig_segmento.update_layout(height=400)
+            fatias_segmento = preparar_fatias(vendas_por_segmento, "Segmentos")
+            fig_segmento = figura_em_cache(fatias_segmento, ("pizza_segmento",), lambda: px.pie(
+                values=fatias_segmento.values, names=fatias_segmento.index, title="Distribuição de Vendas por Segmento de Cliente"
+            ).update_layout(height=400))
             st.plotly_chart(fig_segmento, use_container_width=True)
             st.caption("Gráfico de pizza mostrando a distribuição das vendas por segmento de cliente.")
         else:
             st.info("Sem dados suficientes para a distribuição por segmento.")
+    if vendas_por_hora is not None and len(vendas_por_hora) > 0:
+        fig_hora = figura_em_cache(vendas_por_hora, ("hora",), lambda: px.bar(
+            x=vendas_por_hora.index, y=vendas_por_hora.values, title="Vendas por Hora do Dia", labels={"x": "Hora", "y": "Total de Vendas (R$)"}
+        ).update_layout(showlegend=False, height=350))
+        st.plotly_chart(fig_hora, use_container_width=True)
+        st.caption("Gráfico de barras mostrando as vendas por hora, derivadas do horário da coluna de data.")
     st.markdown("---")
     st.markdown("##### Tabela Dinâmica - Vendas por Mês, Dia da Semana e Segmento")
     tabela_mes = pd.DataFrame({"Mês": vendas_por_mes.index, "Total Vendas": vendas_por_mes.values}) if vendas_por_mes is not None else pd.DataFrame()
@@ -347,11 +440,12 @@ def show_temporal_segmentation_analysis(vendas_por_mes, vendas_por_dia_semana, v
     st.dataframe(tabela_segmento, use_container_width=True)
     export_table_buttons(tabela_segmento, "Vendas por Segmento")
 
-def plot_visao_geral(df_semanal, vendas_por_dia_semana, df, col_vendas, col_dia_semana, col_data):
+def plot_visao_geral(df_semanal, vendas_por_dia_semana, df, col_vendas, col_dia_semana, col_data, pontos_maximos=PONTOS_MAXIMOS_SERIE):
     st.markdown("#### Visão Geral das Vendas")
     if df_semanal is not None and len(df_semanal) > 0:
-        fig_area = px.area(df_semanal, title="Tendência de Vendas (Área)", labels={"value": "Total de Vendas (R$)", col_data or "Dia": "Data"})
-        fig_area.update_layout(height=350)
+        fig_area = figura_em_cache(df_semanal, ("area", col_data, pontos_maximos), lambda: px.area(
+            lttb(df_semanal, pontos_maximos), title="Tendência de Vendas (Área)", labels={"value": "Total de Vendas (R$)", col_data or "Dia": "Data"}
+        ).update_layout(height=350))
         st.plotly_chart(fig_area, use_container_width=True)
     if vendas_por_dia_semana is not None and len(vendas_por_dia_semana) > 0:
         fig_box = px.box(df, y=col_vendas, x=col_dia_semana, title="Distribuição de Vendas por Dia da Semana (Boxplot)")
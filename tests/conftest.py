@@ -0,0 +1,11 @@
+# Caches em disco (esquemas e uploads convertidos) e em memória isolados por teste
+import pytest
+from src import parquet_cache, schema
+from src.ingest import obter_cache_uploads
+
+@pytest.fixture(autouse=True)
+def cache_isolado(tmp_path, monkeypatch):
+    monkeypatch.setattr(schema, "ARQUIVO_ESQUEMAS", tmp_path / "esquemas.json")
+    monkeypatch.setattr(schema, "_esquemas", None)
+    monkeypatch.setattr(parquet_cache, "DIRETORIO_CACHE", tmp_path / "uploads")
+    obter_cache_uploads().limpar()
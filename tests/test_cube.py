@@ -0,0 +1,47 @@
+# União de parciais de arquivos com colunas diferentes: a ordem dos arquivos não muda as métricas
+import numpy as np
+import pandas as pd
+from src.aggregator import extrair_parciais, combinar_parciais
+from src.metrics import montar_metricas
+
+PAPEIS = [
+    'col_data', 'col_vendas', 'col_estado', 'col_impostos', 'col_cliente', 'col_produto', 'col_vendedor', 'col_canal_venda',
+    'col_segmento', 'col_receita_bruta', 'col_categoria_produto', 'col_mes', 'col_dia_semana', 'col_forma_pagamento',
+    'col_receita_liquida', 'col_lucro_bruto', 'col_lucro_liquido',
+]
+
+def _colunas(**resolvidas):
+    return {papel: resolvidas.get(papel) for papel in PAPEIS}
+
+def test_combinar_parciais_independe_da_ordem():
+    colunas_a = _colunas(col_data='Data', col_vendas='Vendas', col_estado='Estado', col_impostos='Impostos')
+    colunas_b = _colunas(col_data='Data', col_vendas='Vendas', col_estado='Estado')
+    arquivo_a = pd.DataFrame({
+        'Data': pd.to_datetime(['2024-01-01', '2024-01-02']), 'Vendas': [10, 20], 'Estado': ['SP', 'RJ'], 'Impostos': [1, 2]
+    })
+    arquivo_b = pd.DataFrame({'Data': pd.to_datetime(['2024-01-02', '2024-01-03']), 'Vendas': [5.5, 7.0], 'Estado': ['SP', 'MG']})
+    parciais_a, parciais_b = extrair_parciais(arquivo_a, colunas_a), extrair_parciais(arquivo_b, colunas_b)
+    ab = montar_metricas(combinar_parciais(parciais_a, parciais_b), colunas_a)
+    ba = montar_metricas(combinar_parciais(parciais_b, parciais_a), colunas_a)
+    assert ab['total_impostos'] == ba['total_impostos'] == 3
+    assert ab['total_vendas'] == ba['total_vendas'] == 42.5
+    pd.testing.assert_series_equal(ab['vendas_por_estado'].sort_index(), ba['vendas_por_estado'].sort_index())
+    assert np.allclose(ab['df_semanal'].to_numpy(), ba['df_semanal'].to_numpy())
+
+def test_dimensao_com_numeros_e_textos():
+    colunas = _colunas(col_data='Data', col_vendas='Vendas', col_estado='Estado')
+    df = pd.DataFrame({
+        'Data': pd.to_datetime(['2024-01-01', '2024-01-01', '2024-01-02', '2024-01-02']),
+        'Vendas': [1.0, 2.0, 3.0, 4.0], 'Estado': [35, 'SP', 'RJ', 35],
+    })
+    metricas = montar_metricas(extrair_parciais(df, colunas), colunas)
+    pd.testing.assert_series_equal(metricas['vendas_por_estado'], df.groupby('Estado')['Vendas'].sum(), check_index_type=False)
+
+def test_dimensao_fora_do_cubo_com_numeros_e_textos():
+    colunas = _colunas(col_data='Data', col_vendas='Vendas', col_cliente='Cliente')
+    clientes = [i if i % 2 else f"C{i}" for i in range(200)]
+    df = pd.DataFrame({'Data': pd.to_datetime(['2024-01-01'] * 200), 'Vendas': np.arange(200, dtype=float), 'Cliente': clientes})
+    parciais = extrair_parciais(df, colunas)
+    assert parciais['cubo'] is None or 'Cliente' not in parciais['cubo']['dimensoes']
+    metricas = montar_metricas(parciais, colunas)
+    pd.testing.assert_series_equal(metricas['top_clientes'], df.groupby('Cliente')['Vendas'].sum().nlargest(5), check_index_type=False)
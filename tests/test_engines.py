@@ -0,0 +1,57 @@
+# Os motores de cálculo opcionais devolvem as mesmas métricas que a leitura pelo pandas
+import numpy as np
+import pandas as pd
+import pytest
+from src.aggregator import extrair_parciais
+from src.ingest import carregar_upload
+from src.metrics import montar_metricas
+from src.parallel import ArquivoEmMemoria
+
+def _vendas(linhas=3000, semente=0):
+    gerador = np.random.default_rng(semente)
+    return pd.DataFrame({
+        'Data': pd.date_range('2024-01-01', periods=linhas, freq='h').strftime('%d/%m/%Y'),
+        'Vendas': gerador.integers(100, 500_000, linhas) / 100,
+        'Estado': gerador.choice(['SP', 'RJ', 'MG', 'BA'], linhas),
+        'Cliente': gerador.integers(1, 400, linhas),
+    })
+
+def _formato_br(valor):
+    return "R$ " + f"{valor:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+# CSV simples, em formato brasileiro ("R$ 1.234,56") e com textos só no fim (depois da amostra dos leitores)
+@pytest.fixture(params=["simples", "brasileiro", "texto_tardio"])
+def arquivo(request):
+    df = _vendas(30_000 if request.param == "texto_tardio" else 3000)
+    if request.param == "brasileiro":
+        df['Vendas'] = df['Vendas'].map(_formato_br)
+    elif request.param == "texto_tardio":
+        df['Vendas'] = df['Vendas'].astype(str)
+        df.loc[len(df) - 2:, 'Vendas'] = ["R$ 1.234,56", "abc"]
+    return ArquivoEmMemoria(df.to_csv(index=False).encode('utf-8'), f"{request.param}.csv")
+
+def comparar_com_pandas(arquivo, carga_motor):
+    carga = carregar_upload(arquivo)
+    esperado = montar_metricas(extrair_parciais(carga["df"], carga["colunas"]), carga["colunas"])
+    obtido = montar_metricas(carga_motor["parciais"], carga_motor["colunas"])
+    assert obtido['total_vendas'] == pytest.approx(esperado['total_vendas'])
+    assert obtido['total_clientes'] == esperado['total_clientes']
+    for chave in ('top_clientes', 'vendas_por_estado'):
+        pd.testing.assert_series_equal(obtido[chave], esperado[chave], check_dtype=False)
+    assert carga_motor["valores_invalidos"] == carga["valores_invalidos"]
+
+def test_duckdb_igual_ao_pandas(arquivo):
+    pytest.importorskip("duckdb")
+    from src.sql_engine import carregar_upload_sql
+    comparar_com_pandas(arquivo, carregar_upload_sql(arquivo))
+
+def test_polars_igual_ao_pandas(arquivo):
+    pytest.importorskip("polars")
+    from src.polars_engine import carregar_upload_polars
+    comparar_com_pandas(arquivo, carregar_upload_polars(arquivo))
+
+def test_polars_igual_ao_pandas_pelo_cache_em_disco(arquivo):
+    pytest.importorskip("polars")
+    from src.polars_engine import carregar_upload_polars
+    carregar_upload(arquivo)
+    comparar_com_pandas(arquivo, carregar_upload_polars(arquivo))
@@ -0,0 +1,26 @@
+# Cache de figuras: tamanho estimado pelos dados dos traços e reaproveitamento da figura montada
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from src.figures import figura_em_cache, obter_cache_figuras, tamanho_figura
+
+def test_tamanho_acompanha_os_dados():
+    pequena = go.Figure(go.Scatter(x=np.arange(100), y=np.random.rand(100)))
+    grande = go.Figure(go.Scatter(x=np.arange(100000), y=np.random.rand(100000)))
+    mapa = go.Figure(go.Heatmap(z=np.random.rand(300, 300)))
+    assert tamanho_figura(grande) - tamanho_figura(pequena) >= 2 * 8 * (100000 - 100)
+    assert tamanho_figura(mapa) >= 300 * 300 * 8
+    assert tamanho_figura(go.Figure()) > 0
+
+def test_figura_reaproveitada_enquanto_os_dados_nao_mudam():
+    obter_cache_figuras().limpar()
+    serie = pd.Series([3.0, 1.0, 2.0], index=['SP', 'RJ', 'MG'])
+    montagens = []
+    def construir():
+        montagens.append(1)
+        return go.Figure(go.Bar(x=serie.index, y=serie.values))
+    primeira = figura_em_cache(serie, {"tipo": "barras"}, construir)
+    assert figura_em_cache(serie.copy(), {"tipo": "barras"}, construir) is primeira
+    figura_em_cache(serie * 2, {"tipo": "barras"}, construir)
+    assert len(montagens) == 2
+    assert obter_cache_figuras().estatisticas()["uso_bytes"] == 2 * tamanho_figura(primeira)
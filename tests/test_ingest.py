@@ -0,0 +1,87 @@
+# Leitura de uploads com o mesmo layout: a segunda carga (esquema já registrado) não muda o tipo das chaves
+import numpy as np
+import pandas as pd
+import pytest
+from src import schema
+from src.aggregator import extrair_parciais, combinar_parciais
+from src.ingest import carregar_upload, carregar_upload_em_blocos, obter_cache_uploads
+from src.metrics import montar_metricas
+from src.parallel import ArquivoEmMemoria, processar_arquivo, reconciliar_colunas
+
+def _csv(semente, linhas=2000):
+    gerador = np.random.default_rng(semente)
+    df = pd.DataFrame({
+        'Data': pd.date_range('2024-01-01', periods=linhas, freq='h').strftime('%d/%m/%Y'),
+        'Vendas': gerador.integers(1, 100, linhas),
+        'Estado': gerador.choice(['SP', 'RJ', 'MG'], linhas),
+        'Cliente': gerador.integers(1000, 1300, linhas),
+    })
+    return df, ArquivoEmMemoria(df.to_csv(index=False).encode('utf-8'), f"vendas_{semente}.csv")
+
+@pytest.mark.parametrize("precisao_hll", [None, 14])
+def test_anexar_mesmo_layout_nao_duplica_chaves(precisao_hll):
+    parciais, brutos = None, []
+    for semente in range(3):
+        bruto, arquivo = _csv(semente)
+        brutos.append(bruto)
+        carga = carregar_upload(arquivo)
+        novos = extrair_parciais(carga["df"], carga["colunas"], precisao_hll=precisao_hll)
+        parciais = novos if parciais is None else combinar_parciais(parciais, novos)
+    metricas = montar_metricas(parciais, carga["colunas"])
+    esperado = pd.concat(brutos)['Cliente'].nunique()
+    assert abs(metricas['total_clientes'] - esperado) <= (0.03 * esperado if precisao_hll else 0)
+    assert pd.api.types.is_integer_dtype(metricas['top_clientes'].index)
+
+def test_varios_arquivos_mesmo_layout_nao_duplica_chaves():
+    arquivos = [_csv(semente) for semente in range(3)]
+    canonicas = reconciliar_colunas(schema.obter_esquema(bruto.columns)["colunas"] for bruto, _ in arquivos)
+    resultados = [
+        processar_arquivo(arquivo.getvalue(), arquivo.name, str(semente), "auto", canonicas, False, None)
+        for semente, (_, arquivo) in enumerate(arquivos)
+    ]
+    parciais = resultados[0]["parciais"]
+    for resultado in resultados[1:]:
+        parciais = combinar_parciais(parciais, resultado["parciais"])
+    metricas = montar_metricas(parciais, canonicas)
+    brutos = pd.concat([bruto for bruto, _ in arquivos])
+    assert metricas['total_clientes'] == brutos['Cliente'].nunique()
+    pd.testing.assert_series_equal(
+        metricas['top_clientes'], brutos.groupby('Cliente')['Vendas'].sum().nlargest(5), check_names=False
+    )
+
+def test_varios_arquivos_coluna_com_dois_papeis():
+    completo = pd.DataFrame({'Data': ['01/01/2024', '02/01/2024'], 'Vendas': [10, 20], 'Receita_Bruta': [12, 24]})
+    so_receita = pd.DataFrame({'Data': ['03/01/2024', '04/01/2024'], 'Receita_Bruta': [5, 7]})
+    arquivos = [
+        ArquivoEmMemoria(df.to_csv(index=False).encode('utf-8'), nome)
+        for df, nome in [(completo, "completo.csv"), (so_receita, "so_receita.csv")]
+    ]
+    canonicas = reconciliar_colunas(schema.obter_esquema(df.columns)["colunas"] for df in (completo, so_receita))
+    resultados = [
+        processar_arquivo(arquivo.getvalue(), arquivo.name, arquivo.name, "auto", canonicas, False, None) for arquivo in arquivos
+    ]
+    metricas = montar_metricas(combinar_parciais(resultados[0]["parciais"], resultados[1]["parciais"]), canonicas)
+    assert metricas['total_vendas'] == 42
+    assert metricas['receita_bruta'] == 48
+
+def test_streaming_nao_depende_dos_blocos():
+    vendas = ["1.500"] * 3000
+    vendas[2500] = "R$ 2.000,00"
+    bruto = pd.DataFrame({'Data': ['01/02/2024'] * 3000, 'Vendas': vendas, 'Estado': ['SP', 'RJ'] * 1500})
+    arquivo = ArquivoEmMemoria(bruto.to_csv(index=False).encode('utf-8'), "vendas.csv")
+    carga = carregar_upload_em_blocos(arquivo, tamanho_bloco=1000)
+    metricas = montar_metricas(carga["parciais"], carga["colunas"])
+    assert metricas['total_vendas'] == 1500 * 2999 + 2000
+
+def test_invalidos_sobrevivem_ao_cache_em_disco():
+    vendas = [str(v) for v in range(1, 3001)]
+    vendas[2900] = "abc"
+    vendas[2950] = "R$ 1.234,56"
+    bruto = pd.DataFrame({'Data': ['01/02/2024'] * 3000, 'Vendas': vendas})
+    arquivo = ArquivoEmMemoria(bruto.to_csv(index=False).encode('utf-8'), "vendas.csv")
+    primeira = carregar_upload(arquivo)
+    obter_cache_uploads().limpar()
+    segunda = carregar_upload(arquivo)
+    assert segunda["origem"] == "disco"
+    assert primeira["valores_invalidos"] == segunda["valores_invalidos"] == {'Vendas': 1}
+    assert segunda["df"]['Vendas'].iloc[2950] == 1234.56
@@ -0,0 +1,33 @@
+# Orçamento do cache em disco: os uploads usados há mais tempo saem primeiro, com seus arquivos auxiliares
+import os
+import pandas as pd
+from src import parquet_cache
+
+def _salvar(chave, instante):
+    df = pd.DataFrame({'Vendas': range(20000)})
+    assert parquet_cache.salvar(chave, df, {'col_vendas': 'Vendas'}, {'Vendas': 1})
+    arquivo = parquet_cache.DIRETORIO_CACHE / f"{chave}.parquet"
+    os.utime(arquivo, (instante, instante))
+    return arquivo.stat().st_size
+
+def test_orcamento_remove_menos_usados(monkeypatch):
+    tamanho = _salvar('a', 1000)
+    _salvar('b', 2000)
+    _salvar('c', 3000)
+    # Ler "a" conta como uso: passa a ser o mais recente
+    parquet_cache.carregar('a')
+    monkeypatch.setattr(parquet_cache, "ORCAMENTO_CACHE_DISCO_MB", 2.5 * tamanho / (1024 * 1024))
+    _salvar('d', 4000)
+    assert parquet_cache.existe('a') and parquet_cache.existe('d')
+    assert not parquet_cache.existe('b') and not parquet_cache.existe('c')
+    assert parquet_cache.ler_invalidos('b') == {}
+    assert sorted(p.name for p in parquet_cache.DIRETORIO_CACHE.iterdir()) == [
+        'a.invalidos.json', 'a.json', 'a.parquet', 'd.invalidos.json', 'd.json', 'd.parquet',
+    ]
+
+def test_orcamento_mantem_o_arquivo_recem_gravado(monkeypatch):
+    monkeypatch.setattr(parquet_cache, "ORCAMENTO_CACHE_DISCO_MB", 0)
+    _salvar('a', 1000)
+    assert parquet_cache.existe('a')
+    _salvar('b', 2000)
+    assert parquet_cache.existe('b') and not parquet_cache.existe('a')
@@ -0,0 +1,58 @@
+# Sketches de memória limitada: Space-Saving (top-k ponderado) e HyperLogLog (distintos)
+import numpy as np
+import pandas as pd
+import pytest
+from src.sketches import SpaceSaving, HyperLogLog
+from src.utils import canonizar_chaves
+
+def _fluxo_assimetrico(linhas=50_000, chaves=5_000, semente=0):
+    gerador = np.random.default_rng(semente)
+    clientes = pd.Series(np.minimum(gerador.zipf(1.3, linhas), chaves))
+    return clientes, gerador.random(linhas) * 100
+
+def test_space_saving_recupera_top_k():
+    clientes, pesos = _fluxo_assimetrico()
+    sketch = SpaceSaving(200).atualizar(clientes, pesos, tamanho_fatia=5_000)
+    reais = pd.Series(pesos).groupby(clientes).sum()
+    assert list(sketch.top(5).index) == list(reais.nlargest(5).index)
+    monitoradas = sketch.contagens.index
+    assert (sketch.contagens - sketch.erros <= reais[monitoradas] + 1e-6).all()
+    assert (reais[monitoradas] <= sketch.contagens + 1e-6).all()
+    assert sketch.erro_maximo() <= sketch.limite_erro()
+
+def test_space_saving_combinar():
+    clientes, pesos = _fluxo_assimetrico()
+    metade = len(clientes) // 2
+    a = SpaceSaving(200).atualizar(clientes.iloc[:metade], pesos[:metade])
+    b = SpaceSaving(200).atualizar(clientes.iloc[metade:].reset_index(drop=True), pesos[metade:])
+    combinado = a.combinar(b)
+    reais = pd.Series(pesos).groupby(clientes).sum()
+    assert combinado.total == pytest.approx(np.clip(pesos, 0, None).sum())
+    assert list(combinado.top(5).index) == list(reais.nlargest(5).index)
+    assert (reais[combinado.contagens.index] <= combinado.contagens + 1e-6).all()
+    assert list(b.combinar(a).top(5).index) == list(combinado.top(5).index)
+
+def test_hyperloglog_dentro_do_erro():
+    valores = pd.Series(np.arange(200_000)).sample(frac=1.0, random_state=0)
+    sketch = HyperLogLog(14).atualizar(valores)
+    assert abs(sketch.estimativa() - 200_000) <= 3 * sketch.erro_relativo() * 200_000
+
+def test_hyperloglog_combinar_equivale_a_uniao():
+    a = HyperLogLog(12).atualizar(pd.Series(np.arange(0, 60_000)))
+    b = HyperLogLog(12).atualizar(pd.Series(np.arange(40_000, 100_000)))
+    uniao = HyperLogLog(12).atualizar(pd.Series(np.arange(0, 100_000)))
+    np.testing.assert_array_equal(a.combinar(b).registradores, uniao.registradores)
+    np.testing.assert_array_equal(b.combinar(a).registradores, uniao.registradores)
+
+def test_hyperloglog_inteiros_em_outros_tipos():
+    inteiros = HyperLogLog(12).atualizar(pd.Series([1, 2, 3, 2248]))
+    # Coluna com vazios lida como float, categórica e códigos lidos como texto (já canônicos)
+    for serie in (
+        pd.Series([1.0, 2.0, np.nan, 3.0, 2248.0]),
+        pd.Series([1, 2, 3, 2248]).astype("category"),
+        canonizar_chaves(pd.Series(["1", "2", "3", "2248"])),
+    ):
+        np.testing.assert_array_equal(HyperLogLog(12).atualizar(serie).registradores, inteiros.registradores)
+    # Texto que não é código inteiro continua sendo outra chave
+    texto, numero = HyperLogLog(12).atualizar(pd.Series(["007"])), HyperLogLog(12).atualizar(pd.Series([7]))
+    assert texto.combinar(numero).estimativa() == 2
@@ -0,0 +1,36 @@
+# Redução de séries por LTTB e recorte do trecho selecionado no gráfico reduzido
+import numpy as np
+import pandas as pd
+from src.timeseries import lttb, recortar_intervalo
+
+def _serie_diaria(dias=5000):
+    indice = pd.date_range('2020-01-01', periods=dias, freq='D')
+    return pd.Series(np.sin(np.arange(dias) / 50) * 100 + np.arange(dias), index=indice)
+
+def test_lttb_mantem_extremos_e_quantidade_de_pontos():
+    serie = _serie_diaria()
+    serie.iloc[1234] = 1e6
+    reduzida = lttb(serie, 500)
+    assert len(reduzida) == 500
+    assert reduzida.index[0] == serie.index[0] and reduzida.index[-1] == serie.index[-1]
+    assert reduzida.index.is_monotonic_increasing
+    assert serie.index[1234] in reduzida.index
+
+def test_lttb_nao_altera_series_curtas():
+    serie = _serie_diaria(100)
+    assert lttb(serie, 500) is serie
+
+def test_recorte_em_eixo_de_rotulos_usa_os_pontos_desenhados():
+    serie = _serie_diaria()
+    serie.index = pd.Index([f"P{i:05d}" for i in range(len(serie))])
+    reduzida = lttb(serie, 500)
+    trecho = recortar_intervalo(serie, [10, 20], reduzida)
+    assert trecho.index[0] == reduzida.index[10] and trecho.index[-1] == reduzida.index[20]
+    pd.testing.assert_series_equal(trecho, serie.loc[reduzida.index[10]:reduzida.index[20]])
+
+def test_recorte_em_eixo_de_datas_e_numerico():
+    serie = _serie_diaria()
+    trecho = recortar_intervalo(serie, ['2021-01-01', '2021-01-31'])
+    assert len(trecho) == 31
+    numerica = pd.Series(np.arange(100.0), index=np.arange(100) * 10)
+    assert list(recortar_intervalo(numerica, [95, 130]).index) == [100, 110, 120, 130]
@@ -0,0 +1,11 @@
+# Conversão de valores monetários em texto: padrões brasileiro e americano, e o que conta como inválido
+import numpy as np
+import pandas as pd
+from src.utils import converter_numero_br
+
+def test_converter_numero_br_milhar_com_virgula():
+    textos = pd.Series(["R$ 1.234,56", "1,234.56", "(1,234.56)", "1,234,567", "1,5", "1,2.3", "abc", None], dtype=object)
+    numeros, falhas = converter_numero_br(textos)
+    assert np.allclose(numeros[:5].to_numpy(), [1234.56, 1234.56, -1234.56, 1234567, 1.5])
+    assert numeros[5:].isna().all()
+    assert falhas == 2